@@ -1,11 +1,31 @@
-import streamlit as st
+import startup
+
+with startup.phase("import streamlit"):
+    import streamlit as st
+import hashlib
 import json
+import os
 import re
+import uuid
 from datetime import datetime
 
-from prompts import SYSTEM_PROMPT, GENERATION_PROMPT, REFINEMENT_PROMPT
-from document_parser import parse_all_files
-from docx_generator import generate_questionnaire_docx
+with startup.phase("import app modules"):
+    from prompts import (
+        GENERATION_PROMPT_PREFIX, GENERATION_PROMPT_SUFFIX, REFINEMENT_PROMPT_PREFIX, REFINEMENT_PROMPT_PREFIX_COMPACT,
+        REFINEMENT_PROMPT_SUFFIX,
+        REPAIR_PROMPT, REPAIR_SYSTEM_PROMPT, SYSTEM_PROMPT, SYSTEM_PROMPT_COMPACT,
+    )
+    from document_parser import SESSION_QUOTA_BYTES, UploadQuota, assemble_context, parse_all_files
+    from llm_client import PROVIDERS, PROVIDER_GROQ, PROVIDER_STUB, call_llm_with_stats
+    from hedging import LatencyTracker, call_llm_hedged
+    from questionnaire_model import CHOICE_TYPES, SCALE_TYPES, Questionnaire, QuestionType
+    from routing_validator import validate_routing
+    from linter import ERROR, RULE_LABELS, lint_feedback, lint_questionnaire
+    from schema_repair import SchemaError, parse_and_repair, repair_questionnaire
+    from version_history import VersionHistory
+    from session_store import LiveSessions, open_store
+    from question_bank import KIND_LABELS, REUSABLE_KINDS, blocks_prompt, merge_blocks, open_bank, select_blocks
+    from serialization import COMPACT, KEY_LEGEND, LLM, PRETTY, SerializationCache, expand_keys
 
 # ============================================================
 # CONFIG
@@ -44,94 +64,465 @@ st.markdown(
 # ============================================================
 # SESSION STATE
 # ============================================================
-if "questionnaire_json" not in st.session_state:
-    st.session_state.questionnaire_json = None
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-if "project_context" not in st.session_state:
-    st.session_state.project_context = ""
+MAX_CALL_STATS = 20
+SESSION_TTL_SECONDS = float(os.environ.get("QD_SESSION_TTL_DAYS", "7")) * 86400
+LIVE_SESSIONS = int(os.environ.get("QD_LIVE_SESSIONS", "20"))
+XSRF_COOKIE = "_streamlit_xsrf"
+
+
+@st.cache_resource
+def get_session_store():
+    return open_store()
+
+
+store = get_session_store()
+store.purge_if_due(SESSION_TTL_SECONDS)  # throttled: at most once an hour per process
+
+
+@st.cache_resource
+def get_live_sessions():
+    # Shared by all sessions: decoded state of the most recently active ones; the rest reload from the store.
+    return LiveSessions(LIVE_SESSIONS)
+
+
+live_sessions = get_live_sessions()
+
+
+@st.cache_resource
+def get_latency_tracker():
+    # Shared by all sessions: provider latency is not a per-user property.
+    return LatencyTracker()
+
+
+latency_tracker = get_latency_tracker()
+
+
+@st.cache_resource
+def get_question_bank():
+    # Shared by all sessions: the bank is the company's library of validated blocks.
+    return open_bank()
+
+
+question_bank = get_question_bank()
+
+
+def browser_binding() -> str:
+    """Per-browser value that session tokens are bound to: the token in Streamlit's XSRF cookie ("" without it)."""
+    context = getattr(st, "context", None)  # st.context exists from Streamlit 1.37
+    cookie = context.cookies.get(XSRF_COOKIE) if context is not None else None
+    if not isinstance(cookie, str):  # no cookie (XSRF protection off) or a headless test runtime
+        return ""
+    parts = cookie.split("|")
+    if len(parts) == 4 and parts[0] == "2":  # 2|mask|masked_token|timestamp; the mask changes on every response
+        try:
+            mask, masked = bytes.fromhex(parts[1]), bytes.fromhex(parts[2])
+        except ValueError:
+            return ""
+        return bytes(b ^ mask[i % len(mask)] for i, b in enumerate(masked)).hex() if mask else ""
+    return cookie
+
+
+def live() -> dict:
+    """This session's decoded working state: questionnaire, chat, history and the caches derived from them."""
+    return live_sessions.get(st.session_state.session_id)
+
+
+def persist(key: str, value):
+    """Write ``value`` to the session store; session_state keeps only the handle."""
+    st.session_state.handles[key] = store.save(st.session_state.session_id, key, value)
+
+
+def restore(key: str, default=None):
+    handle = st.session_state.handles.get(key)
+    return default if handle is None else store.load(handle, default)
+
+
+def set_step(step: str):
+    st.session_state.generation_step = step
+    persist("generation_step", step)
+
+
+def get_questionnaire():
+    state = live()
+    if "questionnaire_json" not in state:
+        state["questionnaire_json"] = restore("questionnaire_json")
+    return state["questionnaire_json"]
+
+
+def get_chat_history() -> list:
+    state = live()
+    if "chat_history" not in state:
+        state["chat_history"] = restore("chat_history", [])
+    return state["chat_history"]
+
+
+def get_history() -> VersionHistory:
+    state = live()
+    if "history" not in state:
+        saved = restore("history")
+        if saved:
+            history = VersionHistory.from_state(saved)
+        else:
+            history = VersionHistory()
+            if get_questionnaire():
+                history.commit(get_questionnaire(), "Sessão restaurada")
+        state["history"] = history
+    return state["history"]
+
+
+def get_serialized() -> SerializationCache:
+    return live().setdefault("serialized", SerializationCache())
+
+
+def add_chat_message(role: str, content: str):
+    chat = get_chat_history()
+    chat.append({"role": role, "content": content})
+    persist("chat_history", chat)
+
+
+def get_project_context() -> str:
+    return restore("project_context", "")
+
+
+def set_project_context(text: str):
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    if st.session_state.get("context_digest") != digest:
+        persist("project_context", text)
+        st.session_state.context_digest = digest
+
+
+def set_questionnaire(data, label: str):
+    """Make ``data`` the current questionnaire and record it as a new version.
+
+    Raises :class:`SchemaError` for data the model cannot load, before
+    anything reaches the session store (a stored bad state would fail on
+    every reload of the session).
+    """
+    try:
+        questions = len(Questionnaire.from_dict(data)) if isinstance(data, dict) else 0
+    except Exception as e:
+        raise SchemaError(f"Questionário inválido: {e}") from e
+    if not questions:
+        raise SchemaError("O questionário não tem nenhuma pergunta.")
+    history = get_history()
+    history.commit(data, label)
+    live()["questionnaire_json"] = data
+    persist("questionnaire_json", data)
+    persist("history", history.to_state())
+
+
+def checkout_questionnaire(data):
+    """Switch to a version already in the history (undo / redo / restore)."""
+    live()["questionnaire_json"] = data
+    persist("questionnaire_json", data)
+    persist("history", get_history().to_state())
+
+
+if "session_id" not in st.session_state:
+    # Reconnects (or a restarted pod) find their session through the signed ?sid= token and restore it lazily;
+    # a token from another browser, or a bare id, starts a new session.
+    binding = browser_binding()
+    session_id = store.verify(st.query_params.get("sid"), binding) or uuid.uuid4().hex
+    st.query_params["sid"] = store.sign(session_id, binding)
+    st.session_state.session_id = session_id
+    st.session_state.handles = store.handles(session_id)
 if "generation_step" not in st.session_state:
-    st.session_state.generation_step = "setup"
+    st.session_state.generation_step = restore("generation_step", "setup")
 
 
 # ============================================================
-# LLM CLIENTS
+# LLM
 # ============================================================
-def call_groq(api_key: str, prompt: str) -> str:
-    """Call Groq API (free tier: Llama 3.3 70B)."""
-    from groq import Groq
-    client = Groq(api_key=api_key)
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.4,
-        max_tokens=8192,
-    )
-    return response.choices[0].message.content
+def parse_model_output(provider, api_key, text, short_keys=False):
+    """Repair the model output locally; only a broken fragment goes back to the model."""
+    def fix_fragment(fragment):
+        prompt = REPAIR_PROMPT.format(fragment=fragment, error="JSON inválido")
+        return call_and_record(provider, api_key, "Reparo de JSON", prompt, system_prompt=REPAIR_SYSTEM_PROMPT)
 
+    data, fixes = parse_and_repair(text, fix_fragment, expand_keys if short_keys else None)
+    st.session_state.repair_fixes = fixes
+    return data
 
-def call_gemini(api_key: str, prompt: str) -> str:
-    """Call Google Gemini API."""
-    import google.generativeai as genai
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash",
-        system_instruction=SYSTEM_PROMPT,
-        generation_config=genai.GenerationConfig(temperature=0.4, max_output_tokens=8192),
-    )
-    response = model.generate_content(prompt)
-    return response.text
 
+def system_prompt_for(compact: bool) -> str:
+    return SYSTEM_PROMPT_COMPACT if compact else SYSTEM_PROMPT
 
-def call_llm(provider: str, api_key: str, prompt: str) -> str:
-    if provider == "Groq (grátis — recomendado)":
-        return call_groq(api_key, prompt)
-    else:
-        return call_gemini(api_key, prompt)
 
+def is_valid_output(text, short_keys=False) -> bool:
+    """True if ``text`` repairs locally into a questionnaire (no model round trip)."""
+    try:
+        parse_and_repair(text, transform=expand_keys if short_keys else None)
+    except (SchemaError, ValueError):
+        return False
+    return True
 
-def extract_json_from_response(text: str) -> dict:
-    json_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if json_match:
-        return json.loads(json_match.group(1))
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1:
-        return json.loads(text[start : end + 1])
-    raise ValueError("Não foi possível extrair JSON da resposta do modelo.")
 
+def call_and_record(provider, api_key, label, prompt, prefix="", system_prompt=SYSTEM_PROMPT, hedge=None,
+                    short_keys=False, cache_scope=None) -> str:
+    """Call the model and keep per-call prompt size stats for the sidebar.
 
-def generate_questionnaire(provider, api_key, context, settings):
-    prompt = GENERATION_PROMPT.format(
-        project_context=context,
+    With ``hedge`` (``{"provider", "api_key", "delay_ms"}``) the call is raced
+    against that backup provider and the first valid questionnaire wins.
+    ``cache_scope`` marks ``prefix`` as stable for the provider's prefix cache.
+    """
+    if hedge:
+        text, stats = call_llm_hedged(
+            provider, api_key, hedge["provider"], hedge["api_key"], prompt, system_prompt=system_prompt, prefix=prefix,
+            hedge_delay_ms=hedge.get("delay_ms"), tracker=latency_tracker,
+            validate=lambda out: is_valid_output(out, short_keys), cache_scope=cache_scope,
+        )
+    else:
+        text, stats = call_llm_with_stats(provider, api_key, prompt, system_prompt=system_prompt, prefix=prefix,
+                                          cache_scope=cache_scope)
+        latency_tracker.record(provider, total_ms=stats.elapsed_ms)
+    st.session_state.setdefault("llm_calls", []).append((label, stats))
+    del st.session_state.llm_calls[:-MAX_CALL_STATS]
+    return text
+
+
+def generation_prompts(context, settings) -> tuple:
+    """Return ``(prefix, prompt, system_prompt)`` for a generation call."""
+    prefix = GENERATION_PROMPT_PREFIX.format(project_context=context)
+    prompt = GENERATION_PROMPT_SUFFIX.format(
         research_type=settings.get("research_type", "Pesquisa quantitativa"),
         target_audience=settings.get("target_audience", "Não especificado"),
         max_loi=settings.get("max_loi", 15),
         platform=settings.get("platform", "QuestionPro"),
         additional_instructions=settings.get("additional_instructions", "Nenhuma"),
     )
-    return extract_json_from_response(call_llm(provider, api_key, prompt))
+    return prefix, prompt, system_prompt_for(settings.get("compact_prompt", False))
 
 
-def refine_questionnaire(provider, api_key, current_json, feedback):
-    prompt = REFINEMENT_PROMPT.format(
-        current_questionnaire=json.dumps(current_json, ensure_ascii=False, indent=2),
-        feedback=feedback,
-    )
-    return extract_json_from_response(call_llm(provider, api_key, prompt))
+def bank_blocks_for(context, settings) -> list:
+    """Validated screening / NPS / demographics blocks to reuse, if the bank is enabled."""
+    if not settings.get("question_bank"):
+        return []
+    research_type = settings.get("research_type", "")
+    query = " ".join((research_type, settings.get("target_audience", ""), settings.get("additional_instructions", ""), context))
+    return select_blocks(question_bank, research_type, query)
+
+
+def generate_questionnaire(provider, api_key, context, settings):
+    prefix, prompt, system_prompt = generation_prompts(context, settings)
+    blocks = bank_blocks_for(context, settings)
+    st.session_state.bank_blocks = [f"{KIND_LABELS[b.kind]} ({b.title})" for b in blocks]
+    if blocks:
+        prompt += blocks_prompt(blocks)
+    if settings.get("variants", 1) > 1:
+        return generate_best_variant(provider, api_key, prefix, prompt, system_prompt, settings, blocks)
+    live()["variants"] = []
+    # The project context prefix repeats across regenerations of a session; the
+    # refinement prefix (the current questionnaire) changes every turn, so only this one is cached.
+    text = call_and_record(provider, api_key, "Geração", prompt, prefix, system_prompt, settings.get("hedge"),
+                           cache_scope=st.session_state.session_id)
+    return merge_blocks(parse_model_output(provider, api_key, text), blocks)
+
+
+def generate_best_variant(provider, api_key, prefix, prompt, system_prompt, settings, blocks=()):
+    """Generate the variants concurrently, keep them in the session and return the best one."""
+    from variants import generate_variants, score_questionnaire, variant_specs
+
+    hedge = settings.get("hedge") or {}
+    specs = variant_specs(settings["variants"], provider, api_key, hedge.get("provider"), hedge.get("api_key", ""))
+    variants = generate_variants(specs, prompt, system_prompt, prefix, settings.get("max_loi"),
+                                 cache_scope=st.session_state.session_id)
+    if blocks:
+        # Score the questionnaires that will actually be used, bank blocks included.
+        for v in variants:
+            if v.ok:
+                v.data = merge_blocks(v.data, blocks)
+                v.score = score_questionnaire(v.data, settings.get("max_loi"))
+        variants.sort(key=lambda v: -v.score.total if v.ok else float("inf"))
+    for v in variants:
+        if v.stats is not None:
+            st.session_state.setdefault("llm_calls", []).append((f"Variante {v.spec.label}", v.stats))
+            latency_tracker.record(v.stats.provider, total_ms=v.stats.elapsed_ms)
+    del st.session_state.setdefault("llm_calls", [])[:-MAX_CALL_STATS]
+    ok = [v for v in variants if v.ok]
+    if not ok:
+        raise SchemaError(variants[0].error)
+    live()["variants"] = ok
+    st.session_state.repair_fixes = ok[0].fixes
+    return ok[0].data
+
+
+def refine_questionnaire(provider, api_key, current_json, feedback, compact_prompt=False, version=None, hedge=None):
+    # Minified JSON always; abbreviated keys only with the compact prompt.
+    cache = get_serialized()
+    if compact_prompt:
+        prefix = REFINEMENT_PROMPT_PREFIX_COMPACT.format(
+            key_legend=KEY_LEGEND, current_questionnaire=cache.dumps(current_json, version, LLM),
+        )
+    else:
+        prefix = REFINEMENT_PROMPT_PREFIX.format(current_questionnaire=cache.dumps(current_json, version, COMPACT))
+    prompt = REFINEMENT_PROMPT_SUFFIX.format(feedback=feedback)
+    text = call_and_record(provider, api_key, "Refinamento", prompt, prefix, system_prompt_for(compact_prompt), hedge,
+                           short_keys=compact_prompt)
+    return parse_model_output(provider, api_key, text, short_keys=compact_prompt)
 
 
 # ============================================================
 # UI COMPONENTS
 # ============================================================
-def render_questionnaire_preview(q_json):
-    project = q_json.get("project_summary", {})
-    total_q = project.get("total_questions", "—")
-    loi = project.get("estimated_loi_minutes", "—")
-    num_sections = len(q_json.get("sections", []))
+def parse_uploads(uploaded_files) -> list:
+    """Streamlit adapter over the parsing core: surfaces warnings and returns the parse results."""
+    results = parse_all_files(uploaded_files, live().setdefault("upload_quota", UploadQuota(SESSION_QUOTA_BYTES)))
+    for result in results:
+        for warning in result.warnings:
+            st.warning(warning)
+    return results
+
+
+TYPE_EMOJI = {
+    QuestionType.SINGLE_CHOICE: "⏺", QuestionType.MULTIPLE_CHOICE: "☑️", QuestionType.SCALE_NUMERIC: "🔢",
+    QuestionType.SCALE_LIKERT: "📊", QuestionType.NPS: "📈", QuestionType.RANKING: "🏆",
+    QuestionType.OPEN_TEXT: "✏️", QuestionType.MATRIX: "📋",
+}
+
+
+def get_questionnaire_model(q_json) -> Questionnaire:
+    """Return the typed model for ``q_json``, rebuilt only when the questionnaire object changes."""
+    state = live()
+    cached = state.get("questionnaire_model")
+    if cached is None or cached[0] is not q_json:
+        cached = state["questionnaire_model"] = (q_json, Questionnaire.from_dict(q_json))
+    return cached[1]
+
+
+def cached_export(q_json, kind: str, export) -> bytes:
+    """Run ``export(model)`` once per questionnaire object; reruns reuse the bytes."""
+    state = live()
+    cached = state.get("exports")
+    if cached is None or cached[0] is not q_json:
+        cached = state["exports"] = (q_json, {})
+    if kind not in cached[1]:
+        cached[1][kind] = export(get_questionnaire_model(q_json))
+    return cached[1][kind]
+
+
+def render_variant_picker(q_json):
+    variants = live().get("variants") or []
+    if len(variants) < 2:
+        return
+    with st.expander(f"🧪 {len(variants)} variantes geradas — a de maior pontuação está selecionada", expanded=False):
+        st.caption("As variantes ficam só na memória desta sessão; a escolhida é salva ao clicar em \"Usar\".")
+        for v in variants:
+            sc = v.score
+            current = v.data is q_json
+            cols = st.columns([5, 1])
+            with cols[0]:
+                st.markdown(
+                    f"**Variante {v.spec.label}** · {sc.total:.0f} pts · {v.spec.provider} · temperatura {v.spec.temperature}"
+                    f"{' · ✅ atual' if current else ''}"
+                )
+                st.caption(
+                    f"LOI {sc.loi_minutes:.1f} min (ajuste {sc.loi:.0%}) · routing: {sc.routing_issues} problema(s) · "
+                    f"mix de tipos {sc.mix:.0%} · regras: {len(sc.violations)} violação(ões)"
+                )
+            with cols[1]:
+                if st.button("Usar", key=f"variant_{v.spec.label}", disabled=current):
+                    set_questionnaire(v.data, f"Variante {v.spec.label}")
+                    st.session_state.repair_fixes = v.fixes
+                    st.rerun()
+
+
+def render_routing_issues(issues, expanded=False):
+    if not issues:
+        return
+    with st.expander(f"🧭 Routing: {len(issues)} problema(s) encontrado(s)", expanded=expanded):
+        for issue in issues:
+            st.markdown(f"- {issue.message}")
+
+
+def render_lint_findings(findings):
+    if not findings:
+        return
+    errors = sum(f.severity == ERROR for f in findings)
+    with st.expander(f"🔎 Revisão de regras: {len(findings)} apontamento(s), {errors} erro(s)", expanded=False):
+        for f in findings:
+            st.markdown(f"- {'❌' if f.severity == ERROR else '⚠️'} **{RULE_LABELS[f.rule]}** — {f.message}")
+        if st.button("🤖 Pedir ao modelo para corrigir", key="lint_to_model"):
+            # Picked up by the refine tab in this same run.
+            st.session_state.pending_feedback = lint_feedback(findings)
+
+
+def render_duplicates(q_json, model):
+    from duplicates import duplicates_feedback, find_duplicates, merge_duplicates
+
+    groups = find_duplicates(model)
+    if not groups:
+        return
+    extra = sum(len(g.remove) for g in groups)
+    with st.expander(f"🪞 Perguntas quase duplicadas: {len(groups)} grupo(s), {extra} pergunta(s) a mais", expanded=False):
+        for n, group in enumerate(groups):
+            cols = st.columns([5, 1])
+            with cols[0]:
+                for qid, text in zip(group.question_ids, group.texts):
+                    st.markdown(f'<span class="question-badge">{qid}</span> {text}', unsafe_allow_html=True)
+                st.caption(group.suggestion)
+            with cols[1]:
+                if st.button("Unir", key=f"merge_dup_{n}", help=f"Mantém {group.keep} e ajusta o routing."):
+                    set_questionnaire(merge_duplicates(q_json, group), f"Unir duplicadas: {', '.join(group.question_ids)}")
+                    st.rerun()
+        if st.button("🤖 Pedir ao modelo para unir", key="duplicates_to_model"):
+            # Picked up by the refine tab in this same run.
+            st.session_state.pending_feedback = duplicates_feedback(groups)
+
+
+def render_translations(q_json, provider, api_key):
+    """Translate the current questionnaire and offer one DOCX / JSON per language."""
+    from translation import LANGUAGES, SOURCE_LANGUAGE, extract_strings, translate_questionnaire
+
+    targets = st.multiselect("Idiomas", [code for code in LANGUAGES if code != SOURCE_LANGUAGE],
+        default=[code for code in LANGUAGES if code != SOURCE_LANGUAGE], format_func=LANGUAGES.get,
+        help="Só os textos vistos pelo respondente são traduzidos; IDs, códigos, routing e notas não mudam.")
+    if st.button("🌐 Traduzir", disabled=not (targets and api_key)):
+        with st.spinner(f"Traduzindo {len(extract_strings(q_json))} textos únicos..."):
+            memory = live().setdefault("translation_memory", {})
+            results = translate_questionnaire(q_json, targets, provider, api_key, memory=memory)
+        for code, result in results.items():
+            for stats in result.stats:
+                st.session_state.setdefault("llm_calls", []).append((f"Tradução ({LANGUAGES[code]})", stats))
+        del st.session_state.setdefault("llm_calls", [])[:-MAX_CALL_STATS]
+        live()["translations"] = (q_json, results, {})
+
+    cached = live().get("translations")
+    if not cached or cached[0] is not q_json:
+        return
+    from docx_generator import generate_questionnaire_docx
+
+    _, results, docx_cache = cached
+    st.caption("Traduções ficam só na memória desta sessão; baixe os arquivos para guardá-las.")
+    stamp = datetime.now().strftime('%Y%m%d')
+    for code, result in results.items():
+        name = LANGUAGES.get(code, code)
+        if result.errors:
+            st.error(f"{name}: {result.errors[0]}")
+        if result.missing:
+            st.warning(f"{name}: {len(result.missing)} texto(s) ficaram no idioma original.")
+        st.caption(f"{name}: {result.strings} textos únicos, {result.requested} enviados ao modelo em {result.batches} lote(s).")
+        if code not in docx_cache:
+            docx_cache[code] = generate_questionnaire_docx(result.data)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(f"⬇️ {name} (.docx)", data=docx_cache[code], key=f"translation_docx_{code}",
+                file_name=f"questionario_{code}_{stamp}.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", use_container_width=True)
+        with col2:
+            st.download_button(f"⬇️ {name} (.json)", data=json.dumps(result.data, ensure_ascii=False, indent=2),
+                key=f"translation_json_{code}", file_name=f"questionario_{code}_{stamp}.json", mime="application/json",
+                use_container_width=True)
+
+
+def render_questionnaire_preview(q_json, max_loi=None):
+    from loi_estimator import estimate_loi
+
+    model = get_questionnaire_model(q_json)
+    project = model.summary
+    estimate = estimate_loi(model, max_loi=max_loi)
+    total_q = estimate.total_questions
+    loi = estimate.rounded_minutes
+    num_sections = len(model.section_list())
 
     cols = st.columns(3)
     with cols[0]:
@@ -141,37 +532,55 @@ def render_questionnaire_preview(q_json):
     with cols[2]:
         st.markdown(f'<div class="stat-box"><div class="stat-number">{num_sections}</div><div class="stat-label">Seções</div></div>', unsafe_allow_html=True)
 
+    st.caption(
+        f"LOI calculada localmente para quem completa: {estimate.p10_minutes:.0f}–{estimate.p90_minutes:.0f} min "
+        f"conforme o perfil de respostas, até {estimate.worst_minutes:.0f} min no caminho mais longo. "
+        f"O modelo estimou {project.get('estimated_loi_minutes', '—')} min e {project.get('total_questions', '—')} perguntas."
+    )
+    if estimate.exceeds_max:
+        st.warning(f"⏱️ LOI estimada ({estimate.completes_minutes:.1f} min) excede a LOI máxima de {max_loi} min.")
+    render_routing_issues(validate_routing(model))
+    render_lint_findings(lint_questionnaire(model))
+    render_duplicates(q_json, model)
+    fixes = st.session_state.get("repair_fixes")
+    if fixes:
+        with st.expander(f"🔧 {len(fixes)} correção(ões) automática(s) na resposta do modelo", expanded=False):
+            for fix in fixes:
+                st.markdown(f"- {fix}")
+
     st.markdown("---")
 
-    for section in q_json.get("sections", []):
-        with st.expander(f"📁 {section['id']}. {section['title']} ({len(section.get('questions', []))} perguntas)", expanded=False):
-            if section.get("description"):
-                st.caption(section["description"])
-            for q in section.get("questions", []):
-                q_type = q.get("type", "")
-                type_emoji = {"single_choice": "⏺", "multiple_choice": "☑️", "scale_numeric": "🔢", "scale_likert": "📊", "nps": "📈", "ranking": "🏆", "open_text": "✏️", "matrix": "📋"}.get(q_type, "❓")
-                st.markdown(f'<span class="question-badge">{q["id"]}</span> {type_emoji} **{q["text"]}**', unsafe_allow_html=True)
-                if q_type in ("single_choice", "multiple_choice"):
-                    for opt in q.get("options", []):
-                        if isinstance(opt, dict):
-                            routing = opt.get("routing", "")
+    for section in model.section_list():
+        with st.expander(f"📁 {section.id}. {section.title} ({len(section.question_list())} perguntas)", expanded=False):
+            if section.description:
+                st.caption(section.description)
+            for q in section.question_list():
+                kind = q.kind
+                type_emoji = TYPE_EMOJI.get(kind, "❓")
+                st.markdown(f'<span class="question-badge">{q.id}</span> {type_emoji} **{q.text}**', unsafe_allow_html=True)
+                if kind in CHOICE_TYPES:
+                    for opt in q.option_list():
+                        if not opt.plain:
+                            routing = opt.routing or ""
                             tag = ""
                             if routing == "TERMINATE":
                                 tag = " 🔴 ENCERRAR"
                             elif routing and routing != "CONTINUE":
                                 tag = f" 🟡 → {routing}"
-                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;`{opt.get('code', '')}` {opt.get('text', '')}{tag}")
+                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;`{opt.code if opt.code is not None else ''}` {opt.text if opt.text is not None else ''}{tag}")
                         else:
-                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;• {opt}")
-                elif q_type in ("scale_numeric", "nps"):
-                    st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;`{q.get('scale_min', 0)}` {q.get('anchor_min', '')} ← → {q.get('anchor_max', '')} `{q.get('scale_max', 10)}`")
-                if q.get("programming_note"):
-                    st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;📋 _{q['programming_note']}_")
-                if q.get("methodological_note"):
-                    st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;🔬 _{q['methodological_note']}_")
+                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;• {opt.text}")
+                elif kind in SCALE_TYPES:
+                    scale_min = q.scale_min if q.has("scale_min") else 0
+                    scale_max = q.scale_max if q.has("scale_max") else 10
+                    st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;`{scale_min}` {q.anchor_min or ''} ← → {q.anchor_max or ''} `{scale_max}`")
+                if q.programming_note:
+                    st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;📋 _{q.programming_note}_")
+                if q.methodological_note:
+                    st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;🔬 _{q.methodological_note}_")
                 st.markdown("")
 
-    notes = q_json.get("methodological_notes", {})
+    notes = model.notes
     if notes:
         with st.expander("📑 Notas Metodológicas", expanded=False):
             if notes.get("sampling"):
@@ -184,22 +593,88 @@ def render_questionnaire_preview(q_json):
                 st.markdown(f"- {b}")
 
 
+CHANGE_LABELS = {"added": "adicionado", "removed": "removido", "changed": "alterado"}
+
+
+def render_version_history(history):
+    versions = history.versions()
+    labels = {v.id: f"v{v.id} · {datetime.fromtimestamp(v.created_at).strftime('%H:%M:%S')} · {v.label}" for v in versions}
+    st.markdown("### Histórico de versões")
+    st.caption(f"Versão atual: {labels.get(history.current_id, '—')}")
+
+    col1, col2, _ = st.columns([1, 1, 4])
+    with col1:
+        if st.button("↩️ Desfazer", disabled=not history.can_undo(), use_container_width=True):
+            checkout_questionnaire(history.undo())
+            st.rerun()
+    with col2:
+        if st.button("↪️ Refazer", disabled=not history.can_redo(), use_container_width=True):
+            checkout_questionnaire(history.redo())
+            st.rerun()
+
+    if len(versions) < 2:
+        st.info("Ainda não há versões para comparar.")
+        return
+
+    ids = [v.id for v in versions]
+    col1, col2 = st.columns(2)
+    with col1:
+        old_id = st.selectbox("Comparar", ids, index=len(ids) - 2, format_func=labels.get)
+    with col2:
+        new_id = st.selectbox("com", ids, index=len(ids) - 1, format_func=labels.get)
+
+    changes = history.diff(old_id, new_id)
+    if not changes:
+        st.success("As versões são idênticas.")
+    for change in changes:
+        st.markdown(f"**{change.path}** · _{CHANGE_LABELS[change.kind]}_")
+        left, right = st.columns(2)
+        with left:
+            if change.kind != "added":
+                st.code(json.dumps(change.old, ensure_ascii=False, indent=2), language="json")
+        with right:
+            if change.kind != "removed":
+                st.code(json.dumps(change.new, ensure_ascii=False, indent=2), language="json")
+
+    if new_id != history.current_id and st.button(f"Restaurar v{new_id}"):
+        checkout_questionnaire(history.checkout(new_id))
+        st.rerun()
+
+
 # ============================================================
 # SIDEBAR
 # ============================================================
 with st.sidebar:
     st.markdown("### ⚙️ Configuração")
 
-    provider = st.selectbox("Provedor de IA", ["Groq (grátis — recomendado)", "Google Gemini"],
+    provider = st.selectbox("Provedor de IA", PROVIDERS,
         help="Groq é grátis e funciona em qualquer região.")
 
-    if provider == "Groq (grátis — recomendado)":
+    if provider == PROVIDER_GROQ:
         api_key = st.text_input("API Key do Groq", type="password", help="Grátis em https://console.groq.com/keys")
         st.caption("🔗 [Criar API Key grátis](https://console.groq.com/keys)")
+    elif provider == PROVIDER_STUB:
+        api_key = "stub"
+        st.caption("Respostas locais com latência fixa, para testes de carga.")
     else:
         api_key = st.text_input("API Key do Google Gemini", type="password", help="Grátis em https://aistudio.google.com/apikey")
         st.caption("🔗 [Criar API Key grátis](https://aistudio.google.com/apikey)")
 
+    hedge = None
+    if st.checkbox("⚡ Provedor reserva (hedge)", value=False,
+                   help="Se o primeiro token demorar, envia a mesma chamada ao outro provedor e usa a primeira resposta válida."):
+        backup_provider = next(p for p in PROVIDERS if p != provider)
+        backup_key = st.text_input(f"API Key reserva ({backup_provider})", type="password")
+        suggested_ms = latency_tracker.suggest_delay(provider)
+        if st.checkbox("Atraso automático", value=True,
+                       help="Usa o p90 do tempo até o primeiro token do provedor principal nas chamadas recentes."):
+            delay_ms = None
+            st.caption(f"Atraso atual: {suggested_ms / 1000:.1f}s")
+        else:
+            delay_ms = st.slider("Atraso do reserva (ms)", 300, 10000, int(suggested_ms), step=100)
+        if backup_key:
+            hedge = {"provider": backup_provider, "api_key": backup_key, "delay_ms": delay_ms}
+
     st.markdown("---")
     st.markdown("### 📂 Documentos do Projeto")
     uploaded_files = st.file_uploader("Upload briefing, proposta, docs do cliente", accept_multiple_files=True,
@@ -217,6 +692,52 @@ with st.sidebar:
     max_loi = st.slider("LOI máxima (minutos)", 5, 30, 12)
     platform = st.selectbox("Plataforma de campo", ["QuestionPro", "SurveyMonkey", "Typeform", "Google Forms", "Qualtrics", "Outra"])
     additional_instructions = st.text_area("Instruções adicionais", placeholder="Ex: Incluir perguntas sobre o app mobile.", height=100)
+    compact_prompt = st.checkbox("Prompt compacto", value=False,
+        help="Descreve o formato do JSON campo a campo, sem o exemplo completo. Usa menos tokens por chamada.")
+    num_variants = st.slider("Variantes em paralelo", 1, 4, 1,
+        help="Gera várias versões ao mesmo tempo (temperaturas diferentes; alterna provedores se houver chave reserva) "
+             "e mostra a de melhor pontuação local.")
+    bank_counts = question_bank.counts()
+    reusable = sum(bank_counts.get(kind, 0) for kind in REUSABLE_KINDS)
+    use_bank = st.checkbox("📚 Reutilizar blocos do banco", value=reusable > 0, disabled=reusable == 0,
+        help="Insere screening, NPS e perfil já validados do banco de perguntas; o modelo gera só as seções do projeto.")
+    with st.expander("📚 Banco de perguntas", expanded=False):
+        st.caption(" · ".join(f"{KIND_LABELS[k]}: {n}" for k, n in sorted(bank_counts.items())) or "Banco vazio.")
+        bank_files = st.file_uploader("Questionários exportados (.json)", type=["json"], accept_multiple_files=True,
+            key="bank_files", help="Cada seção vira um bloco, classificado e revisado pelo linter antes de ser indexado.")
+        if bank_files and st.button("Indexar no banco", use_container_width=True):
+            added = 0
+            for f in bank_files:
+                try:
+                    added += question_bank.ingest(json.loads(f.getvalue()), research_type, source=f.name)
+                except (json.JSONDecodeError, UnicodeDecodeError, AttributeError, TypeError) as e:
+                    st.warning(f"{f.name}: não é um questionário em JSON ({e}).")
+            st.success(f"{added} bloco(s) novo(s) indexado(s).")
+
+    if st.session_state.get("llm_calls"):
+        with st.expander("📏 Tamanho dos prompts", expanded=False):
+            for label, stats in reversed(st.session_state.llm_calls[-5:]):
+                reported = f" · provedor: {stats.input_tokens} (cache: {stats.cached_tokens or 0})" if stats.input_tokens else ""
+                cache = f" · prefixo em cache ({stats.prefix_cache})" if stats.prefix_cache else ""
+                if stats.hedge:
+                    cache += f" · {stats.provider} ({'principal' if stats.hedge == 'primary' else 'reserva'})"
+                st.caption(
+                    f"**{label}**: ~{stats.estimated_input_tokens} tokens "
+                    f"(sistema {stats.system_tokens}, prefixo {stats.prefix_tokens}, variável {stats.suffix_tokens})"
+                    f"{reported}{cache} · {stats.elapsed_ms / 1000:.1f}s"
+                )
+
+    latency = latency_tracker.summary()
+    if latency:
+        with st.expander("⏱️ Latência por provedor", expanded=False):
+            for name, metrics in latency.items():
+                for metric, label in (("first_token", "1º token"), ("total", "total")):
+                    if metric in metrics:
+                        m = metrics[metric]
+                        st.caption(
+                            f"**{name}** · {label}: p50 {m['p50'] / 1000:.1f}s · p90 {m['p90'] / 1000:.1f}s "
+                            f"· p95 {m['p95'] / 1000:.1f}s ({m['n']} chamadas)"
+                        )
 
     st.markdown("---")
     st.markdown('<div style="text-align:center;color:#999;font-size:0.75rem;">Questionnaire Designer v1.1<br>Powered by Groq / Gemini</div>', unsafe_allow_html=True)
@@ -230,17 +751,16 @@ st.markdown('<p class="subtitle">Crie questionários profissionais de pesquisa d
 st.markdown("---")
 
 if st.session_state.generation_step == "setup":
-    if uploaded_files:
+    results = parse_uploads(uploaded_files) if uploaded_files else []
+    if results:
         with st.expander("👁️ Conteúdo extraído dos documentos", expanded=False):
-            context = parse_all_files(uploaded_files)
-            st.session_state.project_context = context
-            st.text(context[:3000] + ("..." if len(context) > 3000 else ""))
-            st.caption(f"Total: {len(context)} caracteres extraídos")
+            docs_context = assemble_context(results)
+            st.text(docs_context[:3000] + ("..." if len(docs_context) > 3000 else ""))
+            st.caption(f"Total: {len(docs_context)} caracteres extraídos")
 
     manual_context = st.text_area("📝 Contexto adicional (opcional)",
         placeholder="Cole aqui informações extras sobre o projeto, objetivos específicos, hipóteses...", height=150)
-    if manual_context:
-        st.session_state.project_context = st.session_state.project_context + "\n\n--- Contexto adicional ---\n" + manual_context
+    set_project_context(assemble_context(results, manual_context))
 
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -250,18 +770,20 @@ if st.session_state.generation_step == "setup":
         st.info("👈 Insira sua API Key na barra lateral para começar.")
 
     if generate_btn and api_key:
-        if not st.session_state.project_context.strip() and not manual_context:
+        if not get_project_context().strip():
             st.warning("Faça upload de documentos ou insira contexto manualmente.")
         else:
             with st.spinner("🧠 Analisando documentos e desenhando questionário..."):
                 try:
                     settings = {"research_type": research_type, "target_audience": target_audience,
-                        "max_loi": max_loi, "platform": platform, "additional_instructions": additional_instructions}
-                    result = generate_questionnaire(provider, api_key, st.session_state.project_context, settings)
-                    st.session_state.questionnaire_json = result
-                    st.session_state.generation_step = "generated"
+                        "max_loi": max_loi, "platform": platform, "additional_instructions": additional_instructions,
+                        "compact_prompt": compact_prompt, "hedge": hedge, "variants": num_variants,
+                        "question_bank": use_bank}
+                    result = generate_questionnaire(provider, api_key, get_project_context(), settings)
+                    set_questionnaire(result, "Geração inicial")
+                    set_step("generated")
                     st.rerun()
-                except json.JSONDecodeError as e:
+                except (json.JSONDecodeError, SchemaError) as e:
                     st.error(f"Erro ao interpretar resposta do modelo. Tente novamente.\n\nDetalhe: {e}")
                 except Exception as e:
                     error_msg = str(e)
@@ -273,12 +795,26 @@ if st.session_state.generation_step == "setup":
                         st.error(f"Erro: {e}")
 
 elif st.session_state.generation_step in ("generated", "refining"):
-    q_json = st.session_state.questionnaire_json
+    try:
+        q_json = get_questionnaire()
+        if q_json:
+            get_questionnaire_model(q_json)
+            get_history()
+    except Exception as e:
+        # A stored state this version cannot read must not lock the session: the reset button below still renders.
+        st.error(f"Não foi possível abrir o questionário salvo ({e}). Use \"Começar novo questionário\" abaixo.")
+        q_json = None
     if q_json:
-        tab_preview, tab_refine, tab_json, tab_export = st.tabs(["👁️ Preview", "💬 Refinar", "🔧 JSON", "📥 Exportar"])
+        tab_preview, tab_refine, tab_json, tab_versions, tab_export = st.tabs(["👁️ Preview", "💬 Refinar", "🔧 JSON", "🕘 Versões", "📥 Exportar"])
 
         with tab_preview:
-            render_questionnaire_preview(q_json)
+            render_variant_picker(q_json)
+            if st.session_state.get("bank_blocks"):
+                st.caption("📚 Blocos reutilizados do banco: " + ", ".join(st.session_state.bank_blocks))
+            try:
+                render_questionnaire_preview(q_json, max_loi)
+            except Exception as e:
+                st.error(f"Erro ao exibir o questionário: {e}")
 
         with tab_refine:
             st.markdown("### Refine o questionário via chat")
@@ -286,34 +822,48 @@ elif st.session_state.generation_step in ("generated", "refining"):
                 '- *"Adicione uma pergunta sobre frequência de uso do app"*\n'
                 '- *"Remova a seção de dados demográficos"*\n'
                 '- *"Troque a escala da Q5 para Likert de 5 pontos"*')
-            for msg in st.session_state.chat_history:
+            for msg in get_chat_history():
                 with st.chat_message(msg["role"]):
                     st.markdown(msg["content"])
-            feedback = st.chat_input("Descreva as alterações desejadas...")
+            feedback = st.chat_input("Descreva as alterações desejadas...") or st.session_state.pop("pending_feedback", None)
             if feedback and api_key:
-                st.session_state.chat_history.append({"role": "user", "content": feedback})
+                add_chat_message("user", feedback)
                 with st.spinner("🔄 Aplicando alterações..."):
                     try:
-                        updated = refine_questionnaire(provider, api_key, q_json, feedback)
-                        st.session_state.questionnaire_json = updated
-                        st.session_state.generation_step = "refining"
-                        st.session_state.chat_history.append({"role": "assistant", "content": "✅ Questionário atualizado! Veja a aba **Preview**."})
+                        updated = refine_questionnaire(provider, api_key, q_json, feedback, compact_prompt,
+                            get_history().current_id, hedge)
+                        set_questionnaire(updated, f"Chat: {feedback[:60]}")
+                        set_step("refining")
+                        add_chat_message("assistant", "✅ Questionário atualizado! Veja a aba **Preview**.")
                         st.rerun()
                     except Exception as e:
-                        st.session_state.chat_history.append({"role": "assistant", "content": f"❌ Erro: {e}. Tente reformular."})
+                        add_chat_message("assistant", f"❌ Erro: {e}. Tente reformular.")
                         st.rerun()
 
         with tab_json:
             st.markdown("### JSON do Questionário")
-            json_str = json.dumps(q_json, ensure_ascii=False, indent=2)
+            json_str = get_serialized().dumps(q_json, get_history().current_id, PRETTY)
             edited_json = st.text_area("JSON", value=json_str, height=500, label_visibility="collapsed")
+            if edited_json != json_str:
+                try:
+                    render_routing_issues(validate_routing(json.loads(edited_json)), expanded=True)
+                except (json.JSONDecodeError, AttributeError, TypeError):
+                    pass  # reported when the user clicks apply
             if st.button("Aplicar JSON editado"):
                 try:
-                    st.session_state.questionnaire_json = json.loads(edited_json)
+                    # Same schema pass as model output, so a hand edit can never store an unusable questionnaire.
+                    data, fixes = repair_questionnaire(json.loads(edited_json))
+                    set_questionnaire(data, "Edição manual do JSON")
+                    st.session_state.repair_fixes = fixes
                     st.success("JSON atualizado!")
                     st.rerun()
                 except json.JSONDecodeError as e:
                     st.error(f"JSON inválido: {e}")
+                except SchemaError as e:
+                    st.error(f"Questionário inválido: {e}")
+
+        with tab_versions:
+            render_version_history(get_history())
 
         with tab_export:
             st.markdown("### Exportar Questionário")
@@ -321,7 +871,9 @@ elif st.session_state.generation_step in ("generated", "refining"):
             with col1:
                 st.markdown("#### 📄 Word (.docx)")
                 try:
-                    docx_bytes = generate_questionnaire_docx(q_json)
+                    from docx_generator import generate_questionnaire_docx
+
+                    docx_bytes = cached_export(q_json, "docx", lambda _: generate_questionnaire_docx(q_json))
                     safe_name = re.sub(r"[^\w\s-]", "", q_json.get("project_summary", {}).get("research_objective", "questionario"))[:50].strip()
                     st.download_button("⬇️ Baixar .docx", data=docx_bytes,
                         file_name=f"questionario_{safe_name}_{datetime.now().strftime('%Y%m%d')}.docx",
@@ -331,13 +883,58 @@ elif st.session_state.generation_step in ("generated", "refining"):
                     st.error(f"Erro ao gerar DOCX: {e}")
             with col2:
                 st.markdown("#### 🔧 JSON")
-                st.download_button("⬇️ Baixar .json", data=json.dumps(q_json, ensure_ascii=False, indent=2),
+                st.download_button("⬇️ Baixar .json", data=get_serialized().dumps(q_json, get_history().current_id, PRETTY),
                     file_name=f"questionario_{datetime.now().strftime('%Y%m%d')}.json", mime="application/json", use_container_width=True)
 
+            st.markdown("#### 🧩 Plataformas de campo")
+            st.caption("Routing, randomização, escalas e matrizes já vêm programados; revise antes de publicar.")
+            try:
+                from exporters import (
+                    CSV_MIME, QSF_MIME, XLSX_MIME, export_codebook_csv, export_qsf, export_xlsform,
+                )
+
+                stamp = datetime.now().strftime('%Y%m%d')
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.download_button("⬇️ XLSForm (.xlsx)", data=cached_export(q_json, "xlsform", export_xlsform),
+                        file_name=f"questionario_xlsform_{stamp}.xlsx", mime=XLSX_MIME, use_container_width=True,
+                        help="ODK, KoboToolbox, SurveyCTO")
+                with col2:
+                    st.download_button("⬇️ Qualtrics (.qsf)", data=cached_export(q_json, "qsf", export_qsf),
+                        file_name=f"questionario_{stamp}.qsf", mime=QSF_MIME, use_container_width=True,
+                        help="Qualtrics → Import Survey")
+                with col3:
+                    st.download_button("⬇️ Codebook (.csv)", data=cached_export(q_json, "codebook", export_codebook_csv),
+                        file_name=f"codebook_{stamp}.csv", mime=CSV_MIME, use_container_width=True,
+                        help="Uma linha por variável e código de resposta")
+            except Exception as e:
+                st.error(f"Erro ao exportar: {e}")
+
+            st.markdown("#### 🌐 Traduções")
+            render_translations(q_json, provider, api_key)
+
+            st.markdown("#### 📚 Banco de perguntas")
+            if st.button("Salvar blocos no banco", help="Indexa as seções deste questionário para reutilizar em projetos futuros."):
+                added = question_bank.ingest(q_json, research_type, source=f"sessão {st.session_state.session_id}")
+                st.success(f"{added} bloco(s) novo(s) indexado(s); os já existentes tiveram o uso contabilizado.")
+
     st.markdown("---")
     if st.button("🔄 Começar novo questionário"):
-        st.session_state.questionnaire_json = None
-        st.session_state.chat_history = []
-        st.session_state.project_context = ""
+        store.delete(st.session_state.session_id)
+        live_sessions.drop(st.session_state.session_id)  # questionnaire, chat, history and caches
+        st.session_state.handles = {}
+        st.session_state.repair_fixes = []
+        st.session_state.bank_blocks = []
+        st.session_state.context_digest = None
         st.session_state.generation_step = "setup"
         st.rerun()
+
+# ============================================================
+# WARM-UP (after first paint)
+# ============================================================
+startup.mark("first paint")
+startup.schedule_warmup(provider, api_key)
+if os.environ.get("QD_PROFILE_STARTUP"):
+    with st.sidebar.expander("⏱️ Startup", expanded=False):
+        for name, ms in startup.TIMINGS.items():
+            st.caption(f"{name}: {ms:.0f} ms")
@@ -0,0 +1,57 @@
+"""Serial vs. parallel DOCX rendering.
+
+    python benchmarks/bench_docx.py --questions 400 --workers 1 2 4 8
+
+Checks that every parallel ``word/document.xml`` is identical to the serial
+one and prints the median time and speedup per worker count, with the
+number of processes actually used (rendering stays serial on a single core).
+Worker pools are warmed up first, so the numbers are steady-state exports.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx_generator import generate_questionnaire_docx, resolve_workers  # noqa: E402
+from synthetic import synthetic_questionnaire  # noqa: E402
+
+
+def document_xml(docx_bytes: bytes) -> bytes:
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as zf:
+        return zf.read("word/document.xml")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = synthetic_questionnaire(args.questions)
+    reference = document_xml(generate_questionnaire_docx(data, workers=1))
+    print(f"{args.questions} perguntas, {len(data['sections'])} seções, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'usados':>7} {'mediana (s)':>12} {'speedup':>8}  document.xml")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        output = generate_questionnaire_docx(data, workers=workers)  # warm-up (starts the pool)
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = generate_questionnaire_docx(data, workers=workers)
+            times.append(time.perf_counter() - start)
+        median = statistics.median(times)
+        baseline = baseline or median
+        same = "idêntico" if document_xml(output) == reference else "DIFERENTE"
+        used = resolve_workers(data, workers)
+        print(f"{workers:>8} {used:>7} {median:>12.3f} {baseline / median:>7.2f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
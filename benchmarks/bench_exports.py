@@ -0,0 +1,49 @@
+"""Export times per format: DOCX vs. XLSForm, Qualtrics QSF and CSV codebook.
+
+    python benchmarks/bench_exports.py --questions 500
+
+Prints the median time and output size of each exporter on the same
+synthetic questionnaire. The DOCX row uses the default worker setting.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx_generator import generate_questionnaire_docx  # noqa: E402
+from exporters import export_codebook_csv, export_qsf, export_xlsform  # noqa: E402
+from synthetic import synthetic_questionnaire  # noqa: E402
+
+EXPORTS = (
+    ("DOCX", generate_questionnaire_docx),
+    ("XLSForm", export_xlsform),
+    ("Qualtrics QSF", export_qsf),
+    ("Codebook CSV", export_codebook_csv),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic_questionnaire(args.questions)
+    print(f"{args.questions} perguntas, {len(data['sections'])} seções")
+    print(f"{'formato':<14} {'mediana (s)':>12} {'tamanho (KB)':>13}")
+    for label, export in EXPORTS:
+        output = export(data)  # warm-up (imports, worker pool)
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            output = export(data)
+            times.append(time.perf_counter() - start)
+        print(f"{label:<14} {statistics.median(times):>12.3f} {len(output) / 1024:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
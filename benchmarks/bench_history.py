@@ -0,0 +1,60 @@
+"""Version history commit cost before and after ``max_versions`` is reached.
+
+    python benchmarks/bench_history.py --questions 500 --commits 120
+
+Each commit edits a few questions of the same synthetic questionnaire, like a
+chat refinement. Prints the median commit time below and above the cap and
+the stored node count, and exits with status 1 if commits past the cap cost
+more than ``--max-ratio`` times those before it, or if the pool holds nodes
+no kept version uses.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import synthetic_questionnaire  # noqa: E402
+from version_history import VersionHistory, _Pool, thaw  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--commits", type=int, default=120)
+    parser.add_argument("--max-versions", type=int, default=50)
+    parser.add_argument("--edits", type=int, default=3, help="perguntas alteradas por commit")
+    parser.add_argument("--max-ratio", type=float, default=3.0)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    data = synthetic_questionnaire(args.questions)
+    questions = [q for section in data["sections"] for q in section["questions"]]
+    history = VersionHistory(max_versions=args.max_versions)
+    before, after = [], []
+    for n in range(args.commits):
+        for q in rng.sample(questions, args.edits):
+            q["text"] = f"{q['text'].split(' (v')[0]} (v{n})"
+        start = time.perf_counter()
+        history.commit(data, f"commit {n}")
+        (after if n >= args.max_versions else before).append(time.perf_counter() - start)
+
+    fresh = _Pool()
+    for version in history.versions():
+        fresh.freeze(thaw(version.root))
+    ratio = statistics.median(after) / statistics.median(before) if after else 1.0
+    print(f"{args.questions} perguntas, {args.commits} commits, cap {args.max_versions}")
+    print(f"commit antes do cap: {statistics.median(before) * 1000:.1f} ms (mediana)")
+    if after:
+        print(f"commit depois do cap: {statistics.median(after) * 1000:.1f} ms (mediana, {ratio:.2f}x)")
+    print(f"nós armazenados: {history.node_count} (reconstrução do zero: {len(fresh)})")
+    if ratio > args.max_ratio or history.node_count != len(fresh):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Concurrent-session load test of ``app.py`` against the local stub provider.
+
+    python benchmarks/load_test.py --sessions 1 4 8 --questions 120 --latency-ms 800
+
+Each simulated researcher is a separate process driving its own headless
+``AppTest`` session (Streamlit's test runtime is a process-wide singleton,
+so sessions cannot share a process). Every step is an app rerun:
+
+- upload: a briefing DOCX unique to the session is handed to the app's
+  ``st.file_uploader`` and parsed by the app itself (``AppTest`` cannot fill
+  an uploader, so the session process returns the file from it);
+- generate: the "Gerar" button;
+- refine: ``--refinements`` chat messages;
+- export: a rerun with the download cache cleared, which rebuilds the DOCX,
+  XLSForm, QSF and codebook buttons of the export tab.
+
+The provider is ``llm_client``'s stub with a fixed latency, so the numbers
+measure the app, not the model. All sessions of a level start together.
+For each level it prints latency percentiles per step, errors, peak RSS
+(summed over the session processes, and the largest single session) and
+host CPU use (mean and peak over 100 ms samples of ``/proc/stat``).
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+APP = os.path.join(ROOT, "app.py")
+STEPS = ("load", "upload", "generate", "refine", "export")
+SAMPLE_SECONDS = 0.1
+RESULT_PREFIX = "LOAD_TEST_RESULT "
+EXPORT_BUTTONS = 5  # .docx, .json, XLSForm, QSF, codebook
+
+
+class _Upload(io.BytesIO):
+    """What ``st.file_uploader`` hands to the app: bytes with a ``name`` and ``size``."""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def _percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+# ------------------------------------------------------------
+# Session process
+# ------------------------------------------------------------
+def run_session(session: int, args) -> dict:
+    """One researcher, start to finish, in this process. Waits for a line on stdin before starting."""
+    import resource
+
+    import streamlit
+    from streamlit.testing.v1 import AppTest
+
+    import session_store
+    from docx_generator import generate_questionnaire_docx
+    from llm_client import PROVIDER_STUB
+    from synthetic import synthetic_questionnaire
+
+    briefing = generate_questionnaire_docx(synthetic_questionnaire(args.briefing_questions, seed=1000 + session))
+    uploads = []
+    file_uploader = streamlit.file_uploader
+
+    def briefing_uploader(label, *a, **kw):
+        if kw.get("key") is None and label.startswith("Upload briefing"):
+            for upload in uploads:
+                upload.seek(0)
+            return list(uploads) or None
+        return file_uploader(label, *a, **kw)
+
+    streamlit.file_uploader = briefing_uploader  # the app calls st.file_uploader at run time
+
+    live = []
+
+    class RecordedLiveSessions(session_store.LiveSessions):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            live.append(self)
+
+    session_store.LiveSessions = RecordedLiveSessions  # so the export step can drop the download cache
+
+    times = {step: [] for step in STEPS}
+    errors = []
+
+    def timed(step, at):
+        start = time.perf_counter()
+        at.run()
+        times[step].append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"{step}: {at.exception[0].message}")
+
+    at = AppTest.from_file(APP, default_timeout=args.timeout)
+    print("ready", flush=True)
+    sys.stdin.readline()
+    try:
+        timed("load", at)
+        at.sidebar.selectbox[0].select(PROVIDER_STUB).run()
+        uploads.append(_Upload(f"briefing_{session}.docx", briefing))
+        timed("upload", at)
+        if not any("caracteres extraídos" in c.value for c in at.caption):
+            raise RuntimeError("upload: o app não extraiu texto do briefing")
+        next(b for b in at.button if "Gerar" in b.label).click()
+        timed("generate", at)
+        state = live[0].get(at.session_state["session_id"])
+        if not state.get("questionnaire_json"):
+            raise RuntimeError("generate: nenhum questionário na sessão")
+        for r in range(args.refinements):
+            at.chat_input[0].set_value(f"Ajuste {r + 1}: reescreva a última pergunta de forma mais curta.")
+            timed("refine", at)
+        state.pop("exports", None)
+        timed("export", at)
+        if len(at.get("download_button")) < EXPORT_BUTTONS:
+            raise RuntimeError("export: botões de download ausentes")
+    except Exception as e:
+        errors.append(str(e) or repr(e))
+    return {
+        "times": times,
+        "errors": errors,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "workers_max_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+# ------------------------------------------------------------
+# Coordinator
+# ------------------------------------------------------------
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _cpu_ticks():
+    """``(busy, total)`` jiffies of the whole host, or None off Linux."""
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+    return sum(fields) - idle, sum(fields)
+
+
+class Sampler(threading.Thread):
+    """Samples the summed RSS of ``pids`` and host CPU use every ``SAMPLE_SECONDS`` until stopped."""
+
+    def __init__(self, pids: list):
+        super().__init__(name="qd-load-sampler", daemon=True)
+        self.pids = pids
+        self.stopped = threading.Event()
+        self.rss = []
+        self.cpu = []  # share of all cores, 0-1
+
+    def run(self):
+        last = _cpu_ticks()
+        while not self.stopped.wait(SAMPLE_SECONDS):
+            self.rss.append(sum(_rss_mb(pid) for pid in self.pids))
+            now = _cpu_ticks()
+            if last and now and now[1] > last[1]:
+                self.cpu.append((now[0] - last[0]) / (now[1] - last[1]))
+            last = now
+
+
+def run_level(sessions: int, args) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--briefing-questions", str(args.briefing_questions),
+           "--refinements", str(args.refinements), "--timeout", str(args.timeout)]
+    procs = [
+        subprocess.Popen(cmd + ["--session", str(i)], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL, text=True, cwd=ROOT)
+        for i in range(sessions)
+    ]
+    for proc in procs:
+        proc.stdout.readline()  # "ready": imports done, briefing built, AppTest created
+    sampler = Sampler([proc.pid for proc in procs])
+    sampler.start()
+    wall = time.perf_counter()
+    for proc in procs:
+        proc.stdin.write("go\n")
+        proc.stdin.flush()
+    results, errors = [], []
+    for i, proc in enumerate(procs):
+        try:
+            out, _ = proc.communicate(timeout=args.timeout * (len(STEPS) + args.refinements))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            errors.append(f"sessão {i}: timeout")
+            continue
+        line = next((l for l in out.splitlines() if l.startswith(RESULT_PREFIX)), None)
+        if line is None:
+            errors.append(f"sessão {i}: terminou sem resultado (código {proc.returncode})")
+            continue
+        result = json.loads(line[len(RESULT_PREFIX):])
+        results.append(result)
+        errors.extend(f"sessão {i}: {e}" for e in result["errors"])
+    wall = time.perf_counter() - wall
+    sampler.stopped.set()
+    sampler.join()
+
+    times = {step: [t for r in results for t in r["times"][step]] for step in STEPS}
+    return {
+        "sessions": sessions,
+        "wall_seconds": wall,
+        "steps": {
+            step: {"n": len(t), **{f"p{p}": _percentile(t, p) for p in (50, 90, 95)}, "max": max(t)}
+            for step, t in times.items() if t
+        },
+        "errors": errors,
+        "rss_mb": {
+            "peak_total": max(sampler.rss, default=0.0),
+            "peak_session": max((r["max_rss_mb"] for r in results), default=0.0),
+            "peak_workers": max((r["workers_max_rss_mb"] for r in results), default=0.0),
+        },
+        "cpu": {"mean": sum(sampler.cpu) / len(sampler.cpu) if sampler.cpu else None,
+                "peak": max(sampler.cpu, default=None)},
+    }
+
+
+def print_level(level: dict):
+    print(f"\n== {level['sessions']} sessão(ões) simultânea(s) · {level['wall_seconds']:.1f}s no total")
+    print(f"{'etapa':<10} {'n':>4} {'p50 (s)':>8} {'p90 (s)':>8} {'p95 (s)':>8} {'máx (s)':>8}")
+    for step, s in level["steps"].items():
+        print(f"{step:<10} {s['n']:>4} {s['p50']:>8.2f} {s['p90']:>8.2f} {s['p95']:>8.2f} {s['max']:>8.2f}")
+    rss, cpu = level["rss_mb"], level["cpu"]
+    print(f"RSS pico {rss['peak_total']:.0f} MB somando as sessões · maior sessão {rss['peak_session']:.0f} MB"
+          f" · workers DOCX {rss['peak_workers']:.0f} MB")
+    if cpu["mean"] is not None:
+        print(f"CPU do host: média {cpu['mean']:.0%} / pico {cpu['peak']:.0%} de {os.cpu_count()} núcleo(s)")
+    for error in level["errors"]:
+        print(f"  ❌ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8], help="níveis de concorrência")
+    parser.add_argument("--questions", type=int, default=120, help="tamanho do questionário devolvido pelo stub")
+    parser.add_argument("--briefing-questions", type=int, default=60, help="tamanho do briefing DOCX enviado")
+    parser.add_argument("--refinements", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=800, help="latência do provedor stub")
+    parser.add_argument("--timeout", type=float, default=300, help="timeout de cada execução do AppTest (s)")
+    parser.add_argument("--json", help="grava os resultados neste arquivo")
+    parser.add_argument("--session", type=int, help=argparse.SUPPRESS)  # internal: run one session process
+    args = parser.parse_args()
+
+    if args.session is not None:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(RESULT_PREFIX + json.dumps(run_session(args.session, args)), flush=True)
+        return
+
+    from synthetic import synthetic_questionnaire
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(synthetic_questionnaire(args.questions), f, ensure_ascii=False)
+    # Inherited by the session processes; set before any of them imports llm_client.
+    os.environ.setdefault("QD_STUB_PROVIDER", "1")
+    os.environ.setdefault("QD_SESSION_STORE", "memory")
+    os.environ.setdefault("QD_QUESTION_BANK", "memory")
+    os.environ["QD_STUB_RESPONSE"] = f.name
+    os.environ["QD_STUB_LATENCY_MS"] = str(args.latency_ms)
+    try:
+        print(f"stub: {args.questions} perguntas, {args.latency_ms:.0f} ms · briefing: "
+              f"{args.briefing_questions} perguntas · {args.refinements} refinamento(s) por sessão · "
+              "um processo por sessão")
+        levels = []
+        for sessions in args.sessions:
+            levels.append(run_level(sessions, args))
+            print_level(levels[-1])
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as out:
+                json.dump(levels, out, indent=2, ensure_ascii=False)
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Synthetic questionnaires of any size, for benchmarks.
+
+``synthetic_questionnaire(400)`` returns a schema-valid questionnaire with a
+realistic mix of question types, options, matrices, notes and routing.
+"""
+
+import random
+
+TYPES = (
+    ("single_choice", 30), ("multiple_choice", 15), ("scale_numeric", 12), ("scale_likert", 12),
+    ("nps", 3), ("ranking", 5), ("open_text", 8), ("matrix", 15),
+)
+WORDS = (
+    "marca produto serviço atendimento preço qualidade entrega aplicativo loja compra uso frequência "
+    "experiência cliente pagamento canal oferta promoção categoria embalagem sabor conveniência"
+).split()
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def synthetic_question(rng: random.Random, qid: str, next_ids: list) -> dict:
+    q_type = rng.choices([t for t, _ in TYPES], weights=[w for _, w in TYPES])[0]
+    q = {
+        "id": qid,
+        "type": q_type,
+        "text": _sentence(rng, rng.randint(8, 20)) + "?",
+        "instruction": rng.choice(["Resposta única", "Marque todas que se aplicam", "Selecione um número", ""]),
+        "required": rng.random() < 0.9,
+    }
+    if q_type in ("single_choice", "multiple_choice"):
+        q["randomize_options"] = rng.random() < 0.4
+        q["options"] = [{"code": i, "text": _sentence(rng, rng.randint(1, 4))} for i in range(1, rng.randint(3, 9))]
+        if q_type == "single_choice" and next_ids and rng.random() < 0.2:
+            q["options"][-1]["routing"] = rng.choice(next_ids + ["TERMINATE"])
+    elif q_type in ("scale_numeric", "nps"):
+        q.update(scale_min=0, scale_max=10, anchor_min="Nada provável", anchor_max="Extremamente provável")
+    elif q_type in ("scale_likert", "ranking"):
+        q["options"] = [_sentence(rng, 2) for _ in range(5)]
+    elif q_type == "matrix":
+        q["rows"] = [_sentence(rng, 3) for _ in range(rng.randint(3, 5))]
+        q["columns"] = ["Discordo totalmente", "Discordo", "Neutro", "Concordo", "Concordo totalmente"]
+    else:
+        q["max_chars"] = 500
+    if rng.random() < 0.3:
+        q["programming_note"] = _sentence(rng, 8)
+    if rng.random() < 0.3:
+        q["methodological_note"] = _sentence(rng, 10)
+    return q
+
+
+def synthetic_questionnaire(num_questions: int, questions_per_section: int = 25, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    ids = []
+    for s in range(-(-num_questions // questions_per_section)):
+        for k in range(min(questions_per_section, num_questions - s * questions_per_section)):
+            ids.append((f"S{s + 1}", f"S{s + 1}_Q{k + 1}"))
+    sections = {}
+    for pos, (sec_id, qid) in enumerate(ids):
+        section = sections.setdefault(sec_id, {
+            "id": sec_id, "title": _sentence(rng, 3), "description": _sentence(rng, 10), "questions": [],
+        })
+        next_ids = [q for _, q in ids[pos + 2 : pos + 6]]
+        section["questions"].append(synthetic_question(rng, qid, next_ids))
+    return {
+        "project_summary": {
+            "research_objective": "Tracker sintético para benchmarks",
+            "target_audience": "Consumidores 18+",
+            "methodology": "Online, CAWI",
+            "estimated_loi_minutes": 30,
+            "total_questions": num_questions,
+            "platform_notes": "Gerado por benchmarks/synthetic.py",
+        },
+        "sections": list(sections.values()),
+        "methodological_notes": {
+            "sampling": "Amostra sintética.",
+            "quotas": "Sem cotas.",
+            "biases_mitigated": ["Ordem das opções randomizada"],
+            "limitations": "Dados gerados aleatoriamente.",
+        },
+    }
@@ -1,86 +1,317 @@
+"""UI-free document parsing core.
+
+Each extractor returns ``(text, page_count)`` and raises on failure; callers go
+through :func:`parse_document`, which records errors as warnings on a
+:class:`ParseResult`. Third-party parser libraries are imported inside each
+extractor, so a worker only pays for pdfplumber when it actually gets a PDF.
+
+Extractors take a *source*: bytes, a read-only ``mmap`` or a file path. Uploads
+above ``SPOOL_THRESHOLD_BYTES`` are spooled to a temporary file and parsed
+through a memory map, and byte quotas bound the uploads of a session
+(:class:`UploadQuota`, ``QD_SESSION_UPLOAD_MB``) and the bytes being parsed
+across the process (``QD_GLOBAL_PARSE_MB``). Reruns that see the same upload
+find its parse by :func:`upload_key` before anything is spooled or hashed.
+"""
+
+import hashlib
 import io
-import streamlit as st
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from xml.etree import ElementTree
+
+UPLOAD_CACHE_SIZE = 256  # upload identity -> content digest, checked before spooling
+CONTEXT_CACHE_SIZE = 32
+MANUAL_CONTEXT_HEADER = "--- Contexto adicional ---"
+
+MB = 1024 * 1024
+SPOOL_THRESHOLD_BYTES = int(float(os.environ.get("QD_SPOOL_THRESHOLD_MB", "8")) * MB)
+SESSION_QUOTA_BYTES = int(float(os.environ.get("QD_SESSION_UPLOAD_MB", "200")) * MB)
+GLOBAL_QUOTA_BYTES = int(float(os.environ.get("QD_GLOBAL_PARSE_MB", "512")) * MB)
+PARSE_CACHE_BYTES = int(float(os.environ.get("QD_PARSE_CACHE_MB", "64")) * MB)  # parsed text kept per process
+QUOTA_WAIT_SECONDS = 30.0  # how long a parse waits for other sessions to free the global quota
+SPOOL_CHUNK_BYTES = MB
+
+
+@dataclass
+class ParseResult:
+    """Outcome of parsing a single document."""
+
+    name: str
+    text: str = ""
+    warnings: list = field(default_factory=list)
+    pages: int = 0
+    num_bytes: int = 0
+    elapsed_ms: float = 0.0
+    digest: str = ""
+
+    def as_context(self) -> str:
+        """Return the labelled block used in the project context."""
+        if self.text:
+            return f"--- Documento: {self.name} ---\n{self.text}"
+        return f"--- Documento: {self.name} (não foi possível extrair texto) ---"
+
+
+class QuotaExceeded(Exception):
+    """A document does not fit in the byte quota."""
+
+
+class ByteQuota:
+    """Bytes that may be held by parses at the same time. Thread-safe."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, num_bytes: int, timeout: float = 0.0):
+        """Reserve ``num_bytes``, waiting up to ``timeout`` seconds. Raises :class:`QuotaExceeded`."""
+        if num_bytes > self.limit:
+            raise QuotaExceeded(f"{num_bytes / MB:.0f} MB excede o limite de {self.limit / MB:.0f} MB")
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.used + num_bytes <= self.limit, timeout):
+                raise QuotaExceeded(f"servidor ocupado ({self.used / MB:.0f} de {self.limit / MB:.0f} MB em uso)")
+            self.used += num_bytes
+
+    def release(self, num_bytes: int):
+        with self._cond:
+            self.used = max(0, self.used - num_bytes)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, num_bytes: int, timeout: float = 0.0):
+        self.acquire(num_bytes, timeout)
+        try:
+            yield
+        finally:
+            self.release(num_bytes)
+
+
+class UploadQuota(ByteQuota):
+    """A session's share of upload bytes: each upload is counted once, for as long as it stays uploaded."""
+
+    def __init__(self, limit: int):
+        super().__init__(limit)
+        self.held = {}  # upload key -> bytes
+
+    def hold(self, key, num_bytes: int):
+        """Count upload ``key`` against the quota unless it already is. Raises :class:`QuotaExceeded`."""
+        if key in self.held:
+            return
+        self.acquire(num_bytes)
+        self.held[key] = num_bytes
+
+    def keep_only(self, keys):
+        """Release the uploads that are no longer in ``keys`` (removed from the uploader)."""
+        for key in [k for k in self.held if k not in keys]:
+            self.release(self.held.pop(key))
+
+
+GLOBAL_PARSE_QUOTA = ByteQuota(GLOBAL_QUOTA_BYTES)
+
 
+class _MappedStream(io.RawIOBase):
+    """Seekable read-only stream over an mmap (``io.BytesIO(mmap)`` would copy it)."""
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+    def __init__(self, mapped: mmap.mmap):
+        self._mapped = mapped
+        mapped.seek(0)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._mapped.read(None if size is None or size < 0 else size)
+
+    def readinto(self, buffer) -> int:
+        data = self._mapped.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._mapped.seek(offset, whence)
+        return self._mapped.tell()
+
+    def tell(self) -> int:
+        return self._mapped.tell()
+
+
+@contextmanager
+def _open_source(source):
+    """Binary stream over bytes, an mmap or a file path, without copying the content."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    elif isinstance(source, mmap.mmap):
+        yield _MappedStream(source)
+    else:
+        yield io.BytesIO(source)  # shares the bytes object's buffer
+
+
+def _source_size(source) -> int:
+    return os.path.getsize(source) if isinstance(source, (str, os.PathLike)) else len(source)
+
+
+def extract_text_from_pdf(source) -> tuple:
     """Extract text from a PDF file."""
-    try:
-        import pdfplumber
+    import pdfplumber
 
-        text_parts = []
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text_parts.append(page_text)
-        return "\n\n".join(text_parts)
-    except Exception as e:
-        st.warning(f"Erro ao ler PDF: {e}")
-        return ""
+    text_parts = []
+    with _open_source(source) as stream, pdfplumber.open(stream) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text_parts.append(page_text)
+        pages = len(pdf.pages)
+    return "\n\n".join(text_parts), pages
+
+
+_W_VAL = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}val"
+_DOCX_BREAKS = {"tab": "\t", "br": "\n", "cr": "\n", "noBreakHyphen": "-"}
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
 
 
-def extract_text_from_docx(file_bytes: bytes) -> str:
-    """Extract text from a DOCX file."""
+def _docx_main_part(zf) -> str:
+    """Name of the main document part (``word/document.xml`` unless the package says otherwise)."""
     try:
-        from docx import Document
+        rels = ElementTree.fromstring(zf.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for rel in rels:
+        if rel.get("Type", "").endswith("/officeDocument"):
+            return rel.get("Target", "word/document.xml").lstrip("/")
+    return "word/document.xml"
 
-        doc = Document(io.BytesIO(file_bytes))
-        text_parts = []
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_parts.append(para.text)
-        # Also extract from tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
-                if row_text:
-                    text_parts.append(row_text)
-        return "\n".join(text_parts)
-    except Exception as e:
-        st.warning(f"Erro ao ler DOCX: {e}")
-        return ""
 
+def _docx_pages(zf) -> int:
+    try:
+        props = ElementTree.fromstring(zf.read("docProps/app.xml"))
+    except (KeyError, ElementTree.ParseError):
+        return 0
+    for elem in props:
+        if _local(elem.tag) == "Pages" and (elem.text or "").isdigit():
+            return int(elem.text)
+    return 0
+
+
+def extract_text_from_docx(source) -> tuple:
+    """Extract text from a DOCX file, streaming ``document.xml`` in body order.
+
+    Paragraphs become lines and table rows become ``cell | cell`` lines, in
+    the order they appear. Vertically merged cells are emitted once, and
+    every top-level block is dropped from the tree once read, so memory
+    stays flat on long documents.
+    """
+    lines = []
+    paragraphs = []  # text buffers of the open (possibly nested) paragraphs
+    cells = []  # open table cells: [parts, skip]
+    rows = []  # open table rows: [cell texts]
+    body = None
+    depth = body_depth = runs = 0
+    with _open_source(source) as stream, zipfile.ZipFile(stream) as zf:
+        pages = _docx_pages(zf)
+        with zf.open(_docx_main_part(zf)) as xml:
+            for event, elem in ElementTree.iterparse(xml, events=("start", "end")):
+                name = _local(elem.tag)
+                if event == "start":
+                    depth += 1
+                    if name == "p":
+                        paragraphs.append([])
+                    elif name == "r":
+                        runs += 1
+                    elif name == "tc":
+                        cells.append([[], False])
+                    elif name == "tr":
+                        rows.append([])
+                    elif name == "body":
+                        body, body_depth = elem, depth
+                    elif name in ("vMerge", "hMerge") and cells and elem.get(_W_VAL, "continue") == "continue":
+                        cells[-1][1] = True  # continuation of a merged cell: its text lives in the first one
+                    continue
 
-def extract_text_from_txt(file_bytes: bytes) -> str:
+                depth -= 1
+                if name == "t" and paragraphs:
+                    paragraphs[-1].append(elem.text or "")
+                elif name in _DOCX_BREAKS and paragraphs and runs:  # w:tab in pPr is a tab stop, not text
+                    paragraphs[-1].append(_DOCX_BREAKS[name])
+                elif name == "r":
+                    runs -= 1
+                elif name == "p" and paragraphs:
+                    text = "".join(paragraphs.pop())
+                    if cells:
+                        cells[-1][0].append(text)
+                    elif text.strip():
+                        lines.append(text)
+                elif name == "tc" and cells:
+                    parts, skip = cells.pop()
+                    text = " ".join(part.strip() for part in parts if part.strip())  # one line per row
+                    if text and not skip and rows:
+                        rows[-1].append(text)
+                elif name == "tr" and rows:
+                    row_text = " | ".join(rows.pop())
+                    if row_text:
+                        (cells[-1][0] if cells else lines).append(row_text)  # nested tables stay in their cell
+                if body is not None and depth == body_depth:
+                    body.clear()  # the block just ended has been consumed
+    return "\n".join(lines), pages
+
+
+def extract_text_from_txt(source) -> tuple:
     """Extract text from a plain text file."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            source = f.read()
     try:
-        return file_bytes.decode("utf-8")
+        return str(source, "utf-8"), 0  # decodes straight from the buffer (bytes or mmap)
     except UnicodeDecodeError:
-        try:
-            return file_bytes.decode("latin-1")
-        except Exception as e:
-            st.warning(f"Erro ao ler arquivo texto: {e}")
-            return ""
+        return str(source, "latin-1"), 0
 
 
-def extract_text_from_pptx(file_bytes: bytes) -> str:
+def extract_text_from_pptx(source) -> tuple:
     """Extract text from a PPTX file."""
-    try:
-        from pptx import Presentation
+    from pptx import Presentation
 
-        prs = Presentation(io.BytesIO(file_bytes))
-        text_parts = []
-        for slide_num, slide in enumerate(prs.slides, 1):
-            slide_texts = []
-            for shape in slide.shapes:
-                if shape.has_text_frame:
-                    for para in shape.text_frame.paragraphs:
-                        if para.text.strip():
-                            slide_texts.append(para.text.strip())
-            if slide_texts:
-                text_parts.append(f"[Slide {slide_num}]\n" + "\n".join(slide_texts))
-        return "\n\n".join(text_parts)
-    except Exception as e:
-        st.warning(f"Erro ao ler PPTX: {e}")
-        return ""
+    with _open_source(source) as stream:
+        prs = Presentation(stream)
+    text_parts = []
+    slide_count = 0
+    for slide_num, slide in enumerate(prs.slides, 1):
+        slide_count = slide_num
+        slide_texts = []
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                for para in shape.text_frame.paragraphs:
+                    if para.text.strip():
+                        slide_texts.append(para.text.strip())
+        if slide_texts:
+            text_parts.append(f"[Slide {slide_num}]\n" + "\n".join(slide_texts))
+    return "\n\n".join(text_parts), slide_count
 
 
-def extract_text_from_xlsx(file_bytes: bytes) -> str:
+def extract_text_from_xlsx(source) -> tuple:
     """Extract text from an XLSX file."""
-    try:
-        import openpyxl
+    import openpyxl
 
-        wb = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True)
+    with _open_source(source) as stream:
+        return _xlsx_text(openpyxl.load_workbook(stream, read_only=True))
+
+
+def _xlsx_text(wb) -> tuple:
+    try:
         text_parts = []
         for sheet_name in wb.sheetnames:
             ws = wb[sheet_name]
@@ -91,10 +322,9 @@ def extract_text_from_xlsx(file_bytes: bytes) -> str:
                     rows.append(row_text)
             if rows:
                 text_parts.append(f"[Aba: {sheet_name}]\n" + "\n".join(rows[:100]))  # Limit rows
-        return "\n\n".join(text_parts)
-    except Exception as e:
-        st.warning(f"Erro ao ler XLSX: {e}")
-        return ""
+        return "\n\n".join(text_parts), len(wb.sheetnames)
+    finally:
+        wb.close()
 
 
 PARSERS = {
@@ -106,29 +336,219 @@ PARSERS = {
     "xlsx": extract_text_from_xlsx,
 }
 
+FORMAT_LABELS = {
+    "pdf": "PDF",
+    "docx": "DOCX",
+    "txt": "arquivo texto",
+    "md": "arquivo texto",
+    "pptx": "PPTX",
+    "xlsx": "XLSX",
+}
+
 
-def parse_uploaded_file(uploaded_file) -> str:
-    """Parse an uploaded file and return extracted text."""
-    file_bytes = uploaded_file.read()
-    extension = uploaded_file.name.rsplit(".", 1)[-1].lower()
+def _extension(name: str) -> str:
+    return name.rsplit(".", 1)[-1].lower()
+
+
+def parse_document(name: str, source, digest: str = None) -> ParseResult:
+    """Parse a document (bytes, mmap or path) into a :class:`ParseResult`. Never raises."""
+    extension = _extension(name)
+    result = ParseResult(name=name, num_bytes=_source_size(source), digest=digest or document_digest(name, source))
 
     parser = PARSERS.get(extension)
-    if parser:
-        text = parser(file_bytes)
-        if text:
-            return f"--- Documento: {uploaded_file.name} ---\n{text}"
-        else:
-            return f"--- Documento: {uploaded_file.name} (não foi possível extrair texto) ---"
+    if parser is None:
+        result.warnings.append(f"Formato .{extension} não suportado: {name}")
+        return result
+
+    start = time.perf_counter()
+    try:
+        result.text, result.pages = parser(source)
+    except Exception as e:
+        result.warnings.append(f"Erro ao ler {FORMAT_LABELS[extension]}: {e}")
+    result.elapsed_ms = (time.perf_counter() - start) * 1000
+    return result
+
+
+def document_digest(name: str, source) -> str:
+    """Content digest identifying a document (name included, since it labels the context)."""
+    h = hashlib.sha256(name.encode("utf-8"))
+    h.update(b"\0")
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(SPOOL_CHUNK_BYTES), b""):
+                h.update(chunk)
     else:
-        st.warning(f"Formato .{extension} não suportado: {uploaded_file.name}")
-        return ""
-
-
-def parse_all_files(uploaded_files) -> str:
-    """Parse all uploaded files and return combined text."""
-    all_texts = []
-    for f in uploaded_files:
-        text = parse_uploaded_file(f)
-        if text:
-            all_texts.append(text)
-    return "\n\n".join(all_texts)
+        h.update(source)
+    return h.hexdigest()
+
+
+class _LRU:
+    """Thread-safe LRU bounded by ``size``: an entry count, or the summed ``weight(value)`` if given."""
+
+    def __init__(self, size: int, weight=None):
+        self.size = size
+        self.weight = weight or (lambda value: 1)
+        self.total = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        weight = self.weight(value)
+        if weight > self.size:
+            return  # would push out everything else and still not fit
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.total -= old[1]
+            self._data[key] = (value, weight)
+            self.total += weight
+            while self.total > self.size:
+                self.total -= self._data.popitem(last=False)[1][1]
+
+
+_parse_cache = _LRU(PARSE_CACHE_BYTES, weight=lambda result: sys.getsizeof(result.text))
+_upload_digests = _LRU(UPLOAD_CACHE_SIZE)
+_context_cache = _LRU(CONTEXT_CACHE_SIZE)
+
+
+def parse_document_cached(name: str, source) -> ParseResult:
+    """Like :func:`parse_document`, but a document already seen (same digest) is not parsed again."""
+    digest = document_digest(name, source)
+    result = _parse_cache.get(digest)
+    if result is None:
+        result = parse_document(name, source, digest)
+        _parse_cache.put(digest, result)
+    return result
+
+
+def upload_size(uploaded_file) -> int:
+    size = getattr(uploaded_file, "size", None)
+    if size is None:
+        pos = uploaded_file.tell()
+        size = uploaded_file.seek(0, io.SEEK_END)
+        uploaded_file.seek(pos)
+    return size
+
+
+@contextmanager
+def spooled_source(uploaded_file, size: int = None):
+    """Yield the upload as bytes, or, above ``SPOOL_THRESHOLD_BYTES``, as an mmap of a temporary file."""
+    size = upload_size(uploaded_file) if size is None else size
+    if size <= SPOOL_THRESHOLD_BYTES or size == 0:
+        yield uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file.read()
+        return
+    with tempfile.TemporaryFile(prefix="qd-upload-") as tmp:
+        uploaded_file.seek(0)
+        shutil.copyfileobj(uploaded_file, tmp, SPOOL_CHUNK_BYTES)
+        tmp.flush()
+        mapped = mmap.mmap(tmp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # a parser still holds a view; the mapping goes away with it
+
+
+def skipped_result(name: str, size: int, warning: str) -> ParseResult:
+    """Result for a document that was not parsed; its digest covers name, size and reason, never the content."""
+    digest = hashlib.sha256(f"skipped\0{name}\0{size}\0{warning}".encode("utf-8")).hexdigest()
+    return ParseResult(name=name, num_bytes=size, warnings=[warning], digest=digest)
+
+
+def upload_key(uploaded_file, size: int = None):
+    """Cheap identity of an upload, used to find its earlier parse without spooling or hashing it.
+
+    Streamlit gives every upload a ``file_id``; other file-likes fall back to
+    a digest of their in-memory buffer. None when neither is available.
+    """
+    name = uploaded_file.name
+    size = upload_size(uploaded_file) if size is None else size
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        return name, size, file_id
+    if hasattr(uploaded_file, "getbuffer"):
+        with uploaded_file.getbuffer() as view:
+            return name, size, document_digest(name, view)
+    return None
+
+
+def parse_uploaded_file(uploaded_file, key=None) -> ParseResult:
+    """Parse a file-like upload exposing ``name`` and ``read()``.
+
+    An upload parsed before (same :func:`upload_key`) is answered from the
+    cache without being spooled or hashed again. Otherwise the bytes are
+    reserved in the global quota while the document is parsed; a file that
+    does not fit gets a warning instead of a parse.
+    """
+    name = uploaded_file.name
+    size = upload_size(uploaded_file)
+    key = upload_key(uploaded_file, size) if key is None else key
+    digest = _upload_digests.get(key) if key is not None else None
+    result = _parse_cache.get(digest) if digest is not None else None
+    if result is not None:
+        return result
+    try:
+        with GLOBAL_PARSE_QUOTA.reserve(size, QUOTA_WAIT_SECONDS):
+            with spooled_source(uploaded_file, size) as source:
+                result = parse_document_cached(name, source)
+    except QuotaExceeded as e:
+        return skipped_result(name, size, f"{name} não foi processado: {e}.")
+    if key is not None:
+        _upload_digests.put(key, result.digest)
+    return result
+
+
+def parse_all_files(uploaded_files, quota: UploadQuota = None) -> list:
+    """Parse all uploaded files, returning one result per file.
+
+    The files share the session's ``quota`` (kept by the caller across
+    reruns; a fresh one of ``SESSION_QUOTA_BYTES`` otherwise): files that
+    would take the total over it are skipped with a warning, and files no
+    longer uploaded give their share back.
+    """
+    quota = UploadQuota(SESSION_QUOTA_BYTES) if quota is None else quota
+    files = [(f, upload_size(f)) for f in uploaded_files]
+    keys = [upload_key(f, size) or (f.name, size, id(f)) for f, size in files]
+    quota.keep_only(set(keys))
+    results = []
+    for (f, size), key in zip(files, keys):
+        try:
+            quota.hold(key, size)
+        except QuotaExceeded:
+            results.append(skipped_result(
+                f.name, size, f"{f.name} não foi processado: os arquivos desta sessão passam de {quota.limit / MB:.0f} MB.",
+            ))
+            continue
+        results.append(parse_uploaded_file(f, key))
+    return results
+
+
+def combine_results(results) -> str:
+    """Join parsed documents into the combined project context text."""
+    return "\n\n".join(r.as_context() for r in results if _extension(r.name) in PARSERS)
+
+
+def assemble_context(results, manual_text: str = "") -> str:
+    """Build the project context from parsed documents and the manual text.
+
+    Pure and memoized on (document digests, manual text): the same inputs
+    always give the same string, however many times it is called.
+    """
+    key = (tuple(r.digest for r in results), manual_text)
+    context = _context_cache.get(key)
+    if context is None:
+        context = combine_results(results)
+        if manual_text.strip():
+            context = (context + "\n\n" if context else "") + f"{MANUAL_CONTEXT_HEADER}\n{manual_text}"
+        _context_cache.put(key, context)
+    return context
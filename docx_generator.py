@@ -1,13 +1,27 @@
+import atexit
 import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
 from docx import Document
 from docx.shared import Inches, Pt, Cm, RGBColor, Emu
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.enum.section import WD_ORIENT
+from docx.oxml import parse_xml
 from docx.oxml.ns import qn
+from lxml import etree
 
+from loi_estimator import estimate_loi
+
+
+# --- Parallel rendering ---
+PARALLEL_MIN_QUESTIONS = 150  # below this, process start-up costs more than it saves
+CHUNK_QUESTIONS = 40  # questions per worker task
 
 # --- Color palette ---
 COLOR_PRIMARY = RGBColor(0x1A, 0x56, 0x8E)  # Dark blue
@@ -54,8 +68,12 @@ def add_horizontal_line(doc, color="1A568E"):
     pPr.append(pBdr)
 
 
-def create_cover_page(doc, project_data: dict):
-    """Create a professional cover page."""
+def create_cover_page(doc, project_data: dict, estimate=None):
+    """Create a professional cover page.
+
+    When ``estimate`` (a :class:`loi_estimator.LoiEstimate`) is given, LOI and
+    question count come from it instead of the model's own claims.
+    """
     # Add spacing before title
     for _ in range(6):
         p = doc.add_paragraph()
@@ -89,8 +107,8 @@ def create_cover_page(doc, project_data: dict):
     meta_items = [
         ("Público-alvo", project_data.get("target_audience", "—")),
         ("Metodologia", project_data.get("methodology", "—")),
-        ("LOI estimada", f"{project_data.get('estimated_loi_minutes', '—')} minutos"),
-        ("Total de perguntas", str(project_data.get("total_questions", "—"))),
+        ("LOI estimada", f"{estimate.rounded_minutes if estimate else project_data.get('estimated_loi_minutes', '—')} minutos"),
+        ("Total de perguntas", str(estimate.total_questions if estimate else project_data.get("total_questions", "—"))),
         ("Data", datetime.now().strftime("%d/%m/%Y")),
         ("Status", "RASCUNHO — Para revisão"),
     ]
@@ -218,25 +236,9 @@ def add_question(doc, question: dict):
         run.font.italic = True
 
     # --- Render based on type ---
-    q_type = question.get("type", "")
-
-    if q_type in ("single_choice", "multiple_choice"):
-        _render_choice_options(doc, question)
-
-    elif q_type in ("scale_numeric", "nps"):
-        _render_scale(doc, question)
-
-    elif q_type == "scale_likert":
-        _render_likert(doc, question)
-
-    elif q_type == "ranking":
-        _render_ranking(doc, question)
-
-    elif q_type == "open_text":
-        _render_open_text(doc, question)
-
-    elif q_type == "matrix":
-        _render_matrix(doc, question)
+    renderer = TYPE_RENDERERS.get(question.get("type", ""))
+    if renderer:
+        renderer(doc, question)
 
     # Programming note
     if question.get("programming_note"):
@@ -464,6 +466,18 @@ def _render_matrix(doc, question: dict):
             run.font.color.rgb = COLOR_MUTED
 
 
+TYPE_RENDERERS = {
+    "single_choice": _render_choice_options,
+    "multiple_choice": _render_choice_options,
+    "scale_numeric": _render_scale,
+    "nps": _render_scale,
+    "scale_likert": _render_likert,
+    "ranking": _render_ranking,
+    "open_text": _render_open_text,
+    "matrix": _render_matrix,
+}
+
+
 def add_methodology_notes(doc, notes: dict):
     """Add methodology notes section at the end."""
     doc.add_page_break()
@@ -514,8 +528,9 @@ def add_methodology_notes(doc, notes: dict):
             run.font.color.rgb = COLOR_TEXT
 
 
-def generate_questionnaire_docx(questionnaire_json: dict) -> bytes:
-    """Generate a complete .docx questionnaire from JSON data."""
+@lru_cache(maxsize=1)
+def base_template() -> bytes:
+    """Return the styled empty document every questionnaire starts from (built once per process)."""
     doc = Document()
 
     # Set default font
@@ -531,9 +546,114 @@ def generate_questionnaire_docx(questionnaire_json: dict) -> bytes:
         section.left_margin = Cm(2.5)
         section.right_margin = Cm(2.5)
 
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def render_section_chunk(doc, sec_idx: int, section: dict, questions: list, with_header: bool = True):
+    """Render part of a section: the header (if ``with_header``) followed by ``questions``."""
+    if with_header:
+        if sec_idx > 0:
+            # Add spacing between sections (but not page break for every section)
+            p = doc.add_paragraph()
+            p.paragraph_format.space_before = Pt(12)
+
+        add_section_header(doc, section)
+
+    for question in questions:
+        add_question(doc, question)
+
+
+def _section_chunks(sections: list, chunk_size: int = CHUNK_QUESTIONS) -> list:
+    """Split the sections into ``(sec_idx, section, questions, with_header)`` tasks, in document order."""
+    chunks = []
+    for sec_idx, section in enumerate(sections):
+        questions = section.get("questions", [])
+        header = {k: v for k, v in section.items() if k != "questions"}
+        starts = range(0, len(questions), chunk_size) if questions else [0]
+        for start in starts:
+            chunks.append((sec_idx, header, questions[start : start + chunk_size], start == 0))
+    return chunks
+
+
+def _render_chunk_xml(chunk: tuple) -> bytes:
+    """Worker: render one chunk into a fresh document and return its body as XML."""
+    doc = Document(io.BytesIO(base_template()))
+    render_section_chunk(doc, *chunk)
+    body = doc.element.body
+    if body.sectPr is not None:
+        body.remove(body.sectPr)  # the main document keeps its own
+    return etree.tostring(body)
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared render pool, replaced (and the old one shut down) when the worker count changes."""
+    # Kept for the life of the process so only the first parallel export pays the worker start-up.
+    # "spawn" because forking the threaded Streamlit server is not safe.
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)  # tasks already submitted still finish
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _append_body_xml(doc, xml: bytes):
+    """Move the blocks of a worker's body into ``doc``, before the final section properties."""
+    body = doc.element.body
+    sect_pr = body.sectPr
+    for block in list(parse_xml(xml)):
+        if sect_pr is not None:
+            sect_pr.addprevious(block)
+        else:
+            body.append(block)
+
+
+def resolve_workers(questionnaire_json: dict, workers=None) -> int:
+    """Number of render processes to use; ``None`` picks one from the size of the questionnaire.
+
+    Always 1 on a single core or when the questionnaire fits in one chunk:
+    there, worker processes only add start-up and IPC (2 workers on 1 CPU
+    rendered at 0.76x the serial speed).
+    """
+    total = sum(len(sec.get("questions", [])) for sec in questionnaire_json.get("sections", []))
+    cpus = os.cpu_count() or 1
+    if cpus == 1 or total <= CHUNK_QUESTIONS:
+        return 1
+    if workers is not None:
+        return max(1, int(workers))
+    if total < PARALLEL_MIN_QUESTIONS:
+        return 1
+    return min(cpus, -(-total // CHUNK_QUESTIONS))
+
+
+def generate_questionnaire_docx(questionnaire_json: dict, workers=None) -> bytes:
+    """Generate a complete .docx questionnaire from JSON data.
+
+    With ``workers > 1`` the sections are rendered in worker processes as
+    XML fragments and spliced back in order; ``document.xml`` is identical to
+    the serial output. ``None`` decides from the questionnaire size.
+    """
+    doc = Document(io.BytesIO(base_template()))
+
     # Cover page
     project_data = questionnaire_json.get("project_summary", {})
-    create_cover_page(doc, project_data)
+    create_cover_page(doc, project_data, estimate_loi(questionnaire_json))
 
     # Platform notes
     platform_notes = project_data.get("platform_notes", "")
@@ -547,17 +667,14 @@ def generate_questionnaire_docx(questionnaire_json: dict) -> bytes:
 
     # Sections and questions
     sections = questionnaire_json.get("sections", [])
-    for sec_idx, section in enumerate(sections):
-        if sec_idx > 0:
-            # Add spacing between sections (but not page break for every section)
-            p = doc.add_paragraph()
-            p.paragraph_format.space_before = Pt(12)
-
-        add_section_header(doc, section)
-
-        questions = section.get("questions", [])
-        for question in questions:
-            add_question(doc, question)
+    workers = resolve_workers(questionnaire_json, workers)
+    if workers > 1:
+        chunks = _section_chunks(sections)
+        for xml in _process_pool(workers).map(_render_chunk_xml, chunks):
+            _append_body_xml(doc, xml)
+    else:
+        for sec_idx, section in enumerate(sections):
+            render_section_chunk(doc, sec_idx, section, section.get("questions", []))
 
     # Methodology notes
     method_notes = questionnaire_json.get("methodological_notes", {})
@@ -0,0 +1,218 @@
+"""Near-duplicate question detection with MinHash + LSH.
+
+Each question text becomes a set of character shingles (accent-folded,
+punctuation stripped) summarized by a MinHash signature. LSH banding puts
+questions whose signatures agree on a whole band into the same bucket, so
+only those candidate pairs are compared exactly: roughly linear in the
+number of questions instead of all pairs. Candidates are confirmed with the
+exact Jaccard similarity of the texts, blended with that of the option
+lists, and grouped with union-find. :func:`merge_duplicates` applies a
+suggested merge locally: it keeps the first question of a group and points
+routing at the removed ones to the question that followed them.
+"""
+
+import copy
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+
+from linter import fold
+from questionnaire_model import Questionnaire
+from routing_validator import target_token
+
+SHINGLE_SIZE = 5  # characters
+NUM_PERMUTATIONS = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard almost always share a bucket
+THRESHOLD = 0.6
+TEXT_WEIGHT = 0.7  # the rest goes to the option lists when both questions have one
+MAX_BUCKET = 64  # larger buckets are boilerplate (e.g. templated matrix items); compare neighbours only
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32, so a * h + b fits in uint64
+_rng = np.random.default_rng(0)
+_A = _rng.integers(1, 2**32, NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 2**32, NUM_PERMUTATIONS, dtype=np.uint64)
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+@dataclass
+class DuplicateGroup:
+    question_ids: list  # document order; the first one is kept by the suggested merge
+    texts: list
+    similarity: float  # lowest confirmed pair similarity in the group (0-1)
+    same_options: bool
+
+    @property
+    def keep(self) -> str:
+        return self.question_ids[0]
+
+    @property
+    def remove(self) -> list:
+        return self.question_ids[1:]
+
+    @property
+    def suggestion(self) -> str:
+        removed = ", ".join(self.remove)
+        options = " As opções são as mesmas." if self.same_options else " Confira se as opções da mantida cobrem as demais."
+        return f"Manter {self.keep} e remover {removed} ({self.similarity:.0%} de similaridade).{options}"
+
+
+def _normalize(text) -> str:
+    return _NON_WORD_RE.sub(" ", fold(text)).strip()
+
+
+def shingles(text, size: int = SHINGLE_SIZE) -> frozenset:
+    """Character shingles of the normalized text (the whole text when shorter than ``size``)."""
+    text = _normalize(text)
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i : i + size] for i in range(len(text) - size + 1))
+
+
+def _option_set(q) -> frozenset:
+    values = q.option_list() or (q.rows if isinstance(q.rows, list) else []) or (q.items if isinstance(q.items, list) else [])
+    return frozenset(_normalize(v.label) for v in values)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(shingle_set: frozenset) -> np.ndarray:
+    """MinHash signature (``NUM_PERMUTATIONS`` values) of a shingle set."""
+    if not shingle_set:
+        return np.full(NUM_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def candidate_pairs(signatures: list) -> set:
+    """Index pairs that share at least one LSH band bucket."""
+    rows = NUM_PERMUTATIONS // BANDS
+    pairs = set()
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        for i, sig in enumerate(signatures):
+            buckets[sig[band * rows : (band + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            if len(members) > MAX_BUCKET:
+                pairs.update(zip(members, members[1:]))
+                continue
+            for k, i in enumerate(members):
+                for j in members[k + 1 :]:
+                    pairs.add((i, j))
+    return pairs
+
+
+def similarity(text1: frozenset, text2: frozenset, options1: frozenset, options2: frozenset) -> tuple:
+    """``(score, same_options)``: text Jaccard, blended with the option lists when both have one."""
+    score = jaccard(text1, text2)
+    if options1 and options2:
+        options = jaccard(options1, options2)
+        return TEXT_WEIGHT * score + (1 - TEXT_WEIGHT) * options, options == 1.0
+    return score, options1 == options2
+
+
+def find_duplicates(questionnaire, threshold: float = THRESHOLD) -> list:
+    """Groups of near-duplicate questions (dict or :class:`Questionnaire`), in document order."""
+    model = questionnaire if isinstance(questionnaire, Questionnaire) else Questionnaire.from_dict(questionnaire)
+    questions = model.questions()
+    texts = [shingles(q.text) for q in questions]
+    options = [_option_set(q) for q in questions]
+    signatures = [minhash(s) for s in texts]
+
+    parent = list(range(len(questions)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    confirmed = {}
+    for i, j in candidate_pairs(signatures):
+        if not texts[i] or not texts[j]:
+            continue
+        score, same = similarity(texts[i], texts[j], options[i], options[j])
+        if score >= threshold:
+            confirmed[(i, j)] = (score, same)
+            parent[root(j)] = root(i)
+
+    members = defaultdict(list)
+    for i in range(len(questions)):
+        members[root(i)].append(i)
+    groups = []
+    for group in members.values():
+        if len(group) < 2:
+            continue
+        in_group = set(group)
+        pairs = [value for (i, _), value in confirmed.items() if i in in_group]
+        groups.append(DuplicateGroup(
+            question_ids=[str(questions[i].id) for i in sorted(group)],
+            texts=[str(questions[i].text or "") for i in sorted(group)],
+            similarity=min(score for score, _ in pairs),
+            same_options=all(same for _, same in pairs),
+        ))
+    return sorted(groups, key=lambda g: min(model.position(qid) or 0 for qid in g.question_ids))
+
+
+def duplicates_feedback(groups: list) -> str:
+    """Refinement request asking the model to merge the duplicate ``groups``."""
+    lines = [f"- {', '.join(g.question_ids)}: {g.suggestion}" for g in groups]
+    return (
+        "Una as perguntas quase duplicadas abaixo (mantenha a primeira de cada grupo, ajuste o routing e não altere o restante):\n"
+        + "\n".join(lines)
+    )
+
+
+def merge_duplicates(data: dict, group: DuplicateGroup) -> dict:
+    """Apply ``group.suggestion`` locally. Returns a new dict; ``data`` is not modified.
+
+    Routing that pointed at a removed question (or at a section left empty)
+    goes to the next remaining question; with none left it falls through.
+    """
+    data = copy.deepcopy(data)
+    removed = set(group.remove)
+    order = []  # (section id, question id, kept?) in document order
+    for section in data.get("sections") or []:
+        for q in section.get("questions") or []:
+            order.append((str(section.get("id")), str(q.get("id")), str(q.get("id")) not in removed))
+
+    kept_sections = {sec_id for sec_id, _, kept in order if kept}
+    redirect = {}  # removed question id or emptied section id -> next kept question (None: fall through)
+    following = None
+    for sec_id, qid, kept in reversed(order):
+        if kept:
+            following = qid
+        else:
+            redirect[qid] = following
+            if sec_id not in kept_sections:
+                redirect[sec_id] = following
+
+    sections = []
+    for section in data.get("sections") or []:
+        section["questions"] = [q for q in section.get("questions") or [] if str(q.get("id")) not in removed]
+        for q in section["questions"]:
+            for opt in q.get("options") or []:
+                if not isinstance(opt, dict) or opt.get("routing") is None:
+                    continue
+                raw = str(opt["routing"]).strip()
+                key = raw if raw in redirect else target_token(raw)
+                if key in redirect:
+                    if redirect[key] is None:
+                        del opt["routing"]
+                    else:
+                        opt["routing"] = redirect[key]
+        if section["questions"]:
+            sections.append(section)
+    data["sections"] = sections
+    summary = data.get("project_summary")
+    if isinstance(summary, dict) and "total_questions" in summary:
+        summary["total_questions"] = sum(len(s["questions"]) for s in sections)
+    return data
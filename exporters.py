@@ -0,0 +1,429 @@
+"""Exports for survey platforms: XLSForm (.xlsx), Qualtrics (.qsf) and a CSV codebook.
+
+All three walk the questionnaire once and write as they go (openpyxl
+write-only sheets, ``csv.writer``), so a 500-question tracker exports in a
+few hundred milliseconds. ``routing`` becomes XLSForm ``relevant``
+expressions / Qualtrics display logic (forward jumps hide the questions in
+between, ``TERMINATE`` ends the survey), ``randomize_options`` becomes
+``randomize=true`` / choice randomization (Qualtrics keeps ``Outro`` /
+``Nenhum`` / ``Não sei`` anchored at the end; XLSForm cannot), and scales
+and matrices map to each platform's native question types.
+"""
+
+import csv
+import html
+import io
+import re
+from datetime import datetime
+
+from linter import is_anchor_option
+from questionnaire_model import CHOICE_TYPES, SCALE_TYPES, Questionnaire, QuestionType
+from routing_validator import resolve_option_targets
+from serialization import COMPACT, dumps
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+QSF_MIME = "application/json"
+CSV_MIME = "text/csv"
+
+SURVEY_COLUMNS = (
+    "type", "name", "label", "hint", "required", "relevant", "appearance", "parameters",
+    "constraint", "constraint_message",
+)
+CHOICES_COLUMNS = ("list_name", "name", "label")
+CODEBOOK_COLUMNS = (
+    "variable", "question_id", "section", "type", "question", "value", "value_label",
+    "required", "randomize", "routing",
+)
+DEFAULT_LIKERT = (
+    "Discordo totalmente",
+    "Discordo parcialmente",
+    "Não concordo nem discordo",
+    "Concordo parcialmente",
+    "Concordo totalmente",
+)
+_ANCHOR_KEYS = ("anchor", "anchored", "fixed", "fixed_position", "exclusive", "lock")
+_NAME_RE = re.compile(r"[^\w.-]")
+
+
+def _model(questionnaire) -> Questionnaire:
+    return questionnaire if isinstance(questionnaire, Questionnaire) else Questionnaire.from_dict(questionnaire)
+
+
+def _title(model: Questionnaire) -> str:
+    summary = model.summary
+    return str(summary.get("title") or summary.get("research_objective") or "Questionário")[:200]
+
+
+def variable_name(qid) -> str:
+    """XLSForm / codebook variable name for a question id (valid XML name)."""
+    name = _NAME_RE.sub("_", str(qid or "").strip()) or "q"
+    return name if name[0].isalpha() or name[0] == "_" else f"q{name}"
+
+
+def _rows(q) -> list:
+    rows = q.rows if isinstance(q.rows, list) else (q.items if isinstance(q.items, list) else [])
+    return [row.label for row in rows]
+
+
+def _columns(q) -> list:
+    return [col.label for col in q.columns] if isinstance(q.columns, list) else []
+
+
+def choice_values(q) -> list:
+    """``(value, label)`` answer codes of a question, as in the DOCX and the codebook."""
+    kind = q.kind
+    if kind in CHOICE_TYPES:
+        return [(opt.code if opt.code is not None else i, opt.label) for i, opt in enumerate(q.option_list(), 1)]
+    if kind in SCALE_TYPES:
+        low = q.scale_min if isinstance(q.scale_min, int) else 0
+        high = q.scale_max if isinstance(q.scale_max, int) else 10
+        values = [(v, str(v)) for v in range(low, high + 1)]
+        if values and q.anchor_min:
+            values[0] = (low, f"{low} – {q.anchor_min}")
+        if values and q.anchor_max:
+            values[-1] = (high, f"{high} – {q.anchor_max}")
+        return values
+    if kind is QuestionType.SCALE_LIKERT:
+        labels = [opt.label for opt in q.option_list()] or list(DEFAULT_LIKERT)
+        return list(enumerate(labels, 1))
+    if kind is QuestionType.RANKING:
+        return list(enumerate([opt.label for opt in q.option_list()] or _rows(q), 1))
+    if kind is QuestionType.MATRIX:
+        return list(enumerate(_columns(q), 1))
+    return []
+
+
+def _anchored(q) -> set:
+    """Values of the options that stay in place when the others are randomized."""
+    return {
+        value for (value, _), opt in zip(choice_values(q), q.option_list())
+        if is_anchor_option(opt.label) or (opt.extra and any(opt.extra.get(key) for key in _ANCHOR_KEYS))
+    }
+
+
+def skip_conditions(model: Questionnaire) -> tuple:
+    """Routing as per-question conditions, in document order.
+
+    Returns ``(hidden, terminates)``: ``hidden[j]`` lists ``(source, value)``
+    pairs whose answer jumps over question ``j``; ``terminates[i]`` lists the
+    values of question ``i`` that end the survey. Backward and dangling
+    targets are left to :func:`routing_validator.validate_routing`.
+    """
+    questions = model.questions()
+    end = len(questions)
+    hidden = [[] for _ in questions]
+    terminates = [[] for _ in questions]
+    for pos, routed in enumerate(resolve_option_targets(model)):
+        if not routed:
+            continue
+        q = questions[pos]
+        values = {id(opt): value for opt, (value, _) in zip(q.option_list(), choice_values(q))}
+        for opt, target in routed:
+            if id(opt) not in values:
+                continue
+            if target == end:
+                terminates[pos].append(values[id(opt)])
+            elif isinstance(target, int) and target > pos + 1:
+                for j in range(pos + 1, target):
+                    hidden[j].append((q, values[id(opt)]))
+    return hidden, terminates
+
+
+# --- XLSForm ---------------------------------------------------------------------------------
+
+def _not_chosen(q, value) -> str:
+    name = variable_name(q.id)
+    if q.kind is QuestionType.MULTIPLE_CHOICE:
+        return f"not(selected(${{{name}}}, '{value}'))"
+    return f"${{{name}}} != '{value}'"
+
+
+def _survey_row(**cells) -> list:
+    return [cells.get(column, "") for column in SURVEY_COLUMNS]
+
+
+def _xlsform_question(q, relevant: str, survey, choices):
+    name = variable_name(q.id)
+    required = "yes" if q.required is not False else "no"
+    hint = str(q.instruction or "")
+    kind = q.kind
+    values = choice_values(q)
+    for value, label in values:
+        choices.append([name, str(value), label])
+
+    if kind is QuestionType.MATRIX:
+        survey.append(_survey_row(type="begin_group", name=name, label=q.text, hint=hint, relevant=relevant,
+                                  appearance="table-list"))
+        for i, row in enumerate(_rows(q), 1):
+            survey.append(_survey_row(type=f"select_one {name}", name=f"{name}_{i}", label=row, required=required))
+        survey.append(_survey_row(type="end_group", name=name))
+        return
+    if kind is QuestionType.OPEN_TEXT:
+        limit = q.max_chars if isinstance(q.max_chars, int) else None
+        survey.append(_survey_row(
+            type="text", name=name, label=q.text, hint=hint, required=required, relevant=relevant,
+            appearance="multiline",
+            constraint=f"string-length(.) <= {limit}" if limit else "",
+            constraint_message=f"Máximo de {limit} caracteres." if limit else "",
+        ))
+        return
+    if kind is QuestionType.MULTIPLE_CHOICE:
+        field_type = f"select_multiple {name}"
+    elif kind is QuestionType.RANKING:
+        field_type = f"rank {name}"
+    else:
+        field_type = f"select_one {name}"
+    survey.append(_survey_row(
+        type=field_type, name=name, label=q.text, hint=hint, required=required, relevant=relevant,
+        appearance="likert" if kind in SCALE_TYPES or kind is QuestionType.SCALE_LIKERT else "",
+        parameters="randomize=true" if q.randomize_options is True and kind in CHOICE_TYPES else "",
+    ))
+
+
+def export_xlsform(questionnaire) -> bytes:
+    """XLSForm workbook (``survey``, ``choices`` and ``settings`` sheets) for ODK / KoboToolbox / SurveyCTO."""
+    from openpyxl import Workbook
+
+    model = _model(questionnaire)
+    hidden, terminates = skip_conditions(model)
+    wb = Workbook(write_only=True)
+    survey = wb.create_sheet("survey")
+    choices = wb.create_sheet("choices")
+    settings = wb.create_sheet("settings")
+    survey.append(SURVEY_COLUMNS)
+    choices.append(CHOICES_COLUMNS)
+
+    pos = 0
+    ended = []  # "did not terminate" conditions from earlier questions
+    for sec_idx, section in enumerate(model.section_list(), 1):
+        survey.append(_survey_row(type="begin_group", name=variable_name(section.id or f"S{sec_idx}"),
+                                  label=section.title or f"Seção {sec_idx}", hint=section.description or ""))
+        for q in section.question_list():
+            conditions = ended + [_not_chosen(source, value) for source, value in hidden[pos]]
+            _xlsform_question(q, " and ".join(conditions), survey, choices)
+            ended.extend(_not_chosen(q, value) for value in terminates[pos])
+            pos += 1
+        survey.append(_survey_row(type="end_group", name=variable_name(section.id or f"S{sec_idx}")))
+
+    settings.append(("form_title", "form_id", "version", "default_language"))
+    settings.append((_title(model), "questionario", datetime.now().strftime("%Y%m%d%H%M"), "Portuguese (pt)"))
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+# --- Qualtrics QSF ---------------------------------------------------------------------------
+
+SURVEY_ID = "SV_questionnaire"
+_NEVER = "0000-00-00 00:00:00"
+
+
+def _qsf_choices(values: list) -> tuple:
+    """Qualtrics choices keyed 1..n, with recodes to the questionnaire's own values."""
+    choices = {str(i): {"Display": label} for i, (_, label) in enumerate(values, 1)}
+    recodes = {str(i): str(value) for i, (value, _) in enumerate(values, 1)}
+    return choices, list(range(1, len(values) + 1)), recodes
+
+
+def _qsf_randomization(values: list, anchored: set) -> dict:
+    if not anchored:
+        return {"Type": "All", "Advanced": None, "TotalRandSubset": ""}
+    keys = [str(i) for i in range(1, len(values) + 1)]
+    fixed = {key for key, (value, _) in zip(keys, values) if value in anchored}
+    return {
+        "Type": "Advanced",
+        "Advanced": {
+            "FixedOrder": [key if key in fixed else "{~Randomized~}" for key in keys],
+            "RandomizeAll": [key for key in keys if key not in fixed],
+            "RandomSubSet": [], "Undisplayed": [], "TotalRandSubset": 0, "QuestionsPerPage": 0,
+        },
+        "TotalRandSubset": "",
+    }
+
+
+def _qsf_locator(qid: str, key: int) -> str:
+    return f"q://{qid}/SelectableChoice/{key}"
+
+
+def _qsf_display_logic(conditions: list) -> dict:
+    expression = {"Type": "If"}
+    for i, (source_qid, key, label) in enumerate(conditions):
+        locator = _qsf_locator(source_qid, key)
+        expression[str(i)] = {
+            "LogicType": "Question", "QuestionID": source_qid, "QuestionIsInLoop": "no",
+            "ChoiceLocator": locator, "Operator": "NotSelected", "QuestionIDFromLocator": source_qid,
+            "LeftOperand": locator, "Type": "Expression",
+            "Description": f"Se {source_qid} não é {html.escape(label)}",
+            **({"Conjuction": "And"} if i else {}),  # sic, Qualtrics spelling
+        }
+    return {"0": expression, "Type": "BooleanExpression", "inPage": False}
+
+
+def _qsf_question(q, qid: str, values: list, hidden: list, terminates: list, qids: dict, keys: dict) -> dict:
+    kind = q.kind
+    payload = {
+        "QuestionText": html.escape(str(q.text or "")),
+        "DataExportTag": variable_name(q.id),
+        "QuestionType": "MC",
+        "Selector": "SAVR",
+        "SubSelector": "TX",
+        "Configuration": {"QuestionDescriptionOption": "UseText"},
+        "QuestionDescription": str(q.text or "")[:100],
+        "Validation": {"Settings": {
+            "ForceResponse": "OFF" if q.required is False else "ON", "ForceResponseType": "ON", "Type": "None",
+        }},
+        "Language": [],
+        "DataVisibility": {"Private": False, "Hidden": False},
+        "QuestionID": qid,
+    }
+    if kind is QuestionType.MATRIX:
+        rows = _rows(q)
+        answers, answer_order, recodes = _qsf_choices(values)
+        payload.update(
+            QuestionType="Matrix", Selector="Likert", SubSelector="SingleAnswer",
+            Choices={str(i): {"Display": row} for i, row in enumerate(rows, 1)},
+            ChoiceOrder=list(range(1, len(rows) + 1)),
+            Answers=answers, AnswerOrder=answer_order, RecodeValues=recodes, ChoiceDataExportTags=False,
+        )
+    elif kind is QuestionType.OPEN_TEXT:
+        payload.update(QuestionType="TE", Selector="ML", SubSelector=None)
+    else:
+        choices, order, recodes = _qsf_choices(values)
+        payload.update(Choices=choices, ChoiceOrder=order, RecodeValues=recodes)
+        if kind is QuestionType.MULTIPLE_CHOICE:
+            payload["Selector"] = "MAVR"
+        elif kind is QuestionType.RANKING:
+            payload.update(QuestionType="RO", Selector="DND", SubSelector="TX")
+        elif kind in SCALE_TYPES or kind is QuestionType.SCALE_LIKERT:
+            payload["Selector"] = "SAHR"
+        if q.randomize_options is True and kind in CHOICE_TYPES:
+            payload["Randomization"] = _qsf_randomization(values, _anchored(q))
+
+    if hidden:
+        payload["DisplayLogic"] = _qsf_display_logic([
+            (qids[id(source)], keys[id(source)][value], str(value)) for source, value in hidden
+        ])
+    if terminates:
+        own = keys[id(q)]
+        payload["SkipLogic"] = [
+            {
+                "SkipLogicID": i, "ChoiceLocator": _qsf_locator(qid, own[value]), "Condition": "Selected",
+                "SkipToDestination": "ENDOFSURVEY", "Locator": _qsf_locator(qid, own[value]), "QuestionID": qid,
+            }
+            for i, value in enumerate(terminates, 1)
+        ]
+    return payload
+
+
+def _element(element: str, primary: str, payload, secondary=None) -> dict:
+    return {
+        "SurveyID": SURVEY_ID, "Element": element, "PrimaryAttribute": primary,
+        "SecondaryAttribute": secondary, "TertiaryAttribute": None, "Payload": payload,
+    }
+
+
+def export_qsf(questionnaire) -> bytes:
+    """Qualtrics survey file (one block per section) for *Import Survey*."""
+    model = _model(questionnaire)
+    hidden, terminates = skip_conditions(model)
+    questions = model.questions()
+    qids = {id(q): f"QID{pos}" for pos, q in enumerate(questions, 1)}
+    values = [choice_values(q) for q in questions]
+    # Choice key (1..n) of each value, for the locators of routed questions only.
+    keys = {
+        id(q): {value: i for i, (value, _) in enumerate(values[pos], 1)}
+        for pos, q in enumerate(questions) if terminates[pos] or any(opt.routing for opt in q.option_list())
+    }
+    title = _title(model)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    blocks, flow, elements = [], [], []
+    pos = 0
+    for sec_idx, section in enumerate(model.section_list(), 1):
+        block_id = f"BL_{sec_idx}"
+        block_questions = []
+        for q in section.question_list():
+            qid = qids[id(q)]
+            block_questions.append({"Type": "Question", "QuestionID": qid})
+            payload = _qsf_question(q, qid, values[pos], hidden[pos], terminates[pos], qids, keys)
+            elements.append(_element("SQ", qid, payload, str(q.text or "")[:100]))
+            pos += 1
+        blocks.append({
+            "Type": "Default" if sec_idx == 1 else "Standard",
+            "Description": section.title or f"Seção {sec_idx}",
+            "ID": block_id,
+            "BlockElements": block_questions,
+        })
+        flow.append({"Type": "Block" if sec_idx == 1 else "Standard", "ID": block_id, "FlowID": f"FL_{sec_idx + 1}"})
+
+    survey = {
+        "SurveyEntry": {
+            "SurveyID": SURVEY_ID, "SurveyName": title, "SurveyDescription": None, "SurveyOwnerID": "",
+            "SurveyBrandID": "", "DivisionID": None, "SurveyLanguage": "PT-BR", "SurveyActiveResponseSet": "RS_1",
+            "SurveyStatus": "Inactive", "SurveyStartDate": _NEVER, "SurveyExpirationDate": _NEVER,
+            "SurveyCreationDate": now, "CreatorID": "", "LastModified": now, "LastAccessed": _NEVER,
+            "LastActivated": _NEVER, "Deleted": None,
+        },
+        "SurveyElements": [
+            _element("BL", "Survey Blocks", blocks),
+            _element("FL", "Survey Flow", {
+                "Type": "Root", "FlowID": "FL_1", "Flow": flow, "Properties": {"Count": len(flow) + 1},
+            }),
+            _element("SO", "Survey Options", {
+                "BackButton": "true", "SaveAndContinue": "true", "SurveyProtection": "PublicSurvey",
+                "BallotBoxStuffingPrevention": "false", "NoIndex": "Yes", "SecureResponseFiles": "true",
+                "SurveyExpiration": None, "SurveyTermination": "DefaultMessage", "Header": "", "Footer": "",
+                "ProgressBarDisplay": "None", "PartialData": "+1 week", "ValidationMessage": None,
+                "PreviousButton": " ← ", "NextButton": " → ", "SurveyTitle": title, "SkinLibrary": "",
+                "SkinType": "MQ", "Skin": "", "NewScoring": 1,
+            }),
+            _element("QC", "Survey Question Count", None, str(len(questions))),
+            *elements,
+        ],
+    }
+    return dumps(survey, COMPACT).encode("utf-8")
+
+
+# --- Codebook --------------------------------------------------------------------------------
+
+def _codebook_rows(q, section_id: str):
+    name = variable_name(q.id)
+    kind = q.kind
+    base = {
+        "question_id": q.id, "section": section_id, "type": q.type, "question": q.text,
+        "required": "sim" if q.required is not False else "não",
+        "randomize": "sim" if q.randomize_options is True else "",
+    }
+    values = choice_values(q)
+    if kind is QuestionType.MATRIX:
+        for i, row in enumerate(_rows(q), 1):
+            for value, label in values:
+                yield {**base, "variable": f"{name}_{i}", "question": f"{q.text} [{row}]",
+                       "value": value, "value_label": label}
+    elif kind is QuestionType.MULTIPLE_CHOICE:
+        for (value, label), opt in zip(values, q.option_list()):
+            yield {**base, "variable": f"{name}_{value}", "value": 1, "value_label": label,
+                   "routing": opt.routing or ""}
+    elif kind is QuestionType.RANKING:
+        for value, label in values:
+            yield {**base, "variable": f"{name}_{value}", "value": f"1-{len(values)}", "value_label": label}
+    elif kind is QuestionType.OPEN_TEXT:
+        limit = f" (máx. {q.max_chars} caracteres)" if q.max_chars else ""
+        yield {**base, "variable": name, "value": "", "value_label": f"Texto aberto{limit}"}
+    else:
+        options = q.option_list() if kind in CHOICE_TYPES else [None] * len(values)
+        for (value, label), opt in zip(values, options):
+            yield {**base, "variable": name, "value": value, "value_label": label,
+                   "routing": (opt.routing or "") if opt is not None else ""}
+
+
+def export_codebook_csv(questionnaire) -> bytes:
+    """Flat codebook, one row per variable value (UTF-8 with BOM so Excel reads the accents)."""
+    model = _model(questionnaire)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CODEBOOK_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for section in model.section_list():
+        for q in section.question_list():
+            writer.writerows(_codebook_rows(q, str(section.id or "")))
+    return buffer.getvalue().encode("utf-8-sig")
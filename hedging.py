@@ -0,0 +1,167 @@
+"""Hedged requests across two providers.
+
+The call goes to the primary provider first. If its first token has not
+arrived within the hedge delay (or the call fails), the same request is sent
+to the backup provider. The first response that passes ``validate`` wins and
+the other stream is cancelled. :class:`LatencyTracker` keeps recent
+first-token and total latencies per provider and suggests the hedge delay
+from the primary's first-token percentile.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+from llm_client import new_call_stats, stream_llm
+from prompts import SYSTEM_PROMPT
+
+DEFAULT_HEDGE_DELAY_MS = 1500.0
+MIN_HEDGE_DELAY_MS = 300.0
+MAX_HEDGE_DELAY_MS = 10000.0
+HEDGE_PERCENTILE = 90  # hedge once the primary is slower than this percentile of its own first tokens
+MIN_SAMPLES = 5
+
+
+def _percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class LatencyTracker:
+    """Sliding window of per-provider latencies (ms). Thread-safe."""
+
+    def __init__(self, window: int = 100):
+        self.window = window
+        self._samples = {}  # (provider, metric) -> deque
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, first_token_ms: float = None, total_ms: float = None):
+        with self._lock:
+            for metric, value in (("first_token", first_token_ms), ("total", total_ms)):
+                if value is not None:
+                    self._samples.setdefault((provider, metric), deque(maxlen=self.window)).append(value)
+
+    def samples(self, provider: str, metric: str = "first_token") -> list:
+        with self._lock:
+            return list(self._samples.get((provider, metric), ()))
+
+    def percentile(self, provider: str, p: float, metric: str = "first_token"):
+        """Latency percentile in ms, or None without samples."""
+        values = self.samples(provider, metric)
+        return _percentile(values, p) if values else None
+
+    def summary(self) -> dict:
+        """``{provider: {metric: {"n", "p50", "p90", "p95"}}}`` for display."""
+        with self._lock:
+            keys = list(self._samples)
+        out = {}
+        for provider, metric in keys:
+            values = self.samples(provider, metric)
+            out.setdefault(provider, {})[metric] = {
+                "n": len(values), **{f"p{p}": _percentile(values, p) for p in (50, 90, 95)},
+            }
+        return out
+
+    def suggest_delay(self, provider: str) -> float:
+        """Hedge delay for ``provider`` as primary: its first-token p90, clamped."""
+        values = self.samples(provider, "first_token")
+        if len(values) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY_MS
+        return min(MAX_HEDGE_DELAY_MS, max(MIN_HEDGE_DELAY_MS, _percentile(values, HEDGE_PERCENTILE)))
+
+
+class _Attempt:
+    def __init__(self, role: str, provider: str, api_key: str, results: queue.Queue):
+        self.role = role
+        self.provider = provider
+        self.api_key = api_key
+        self.results = results
+        self.first_token = threading.Event()
+        self.cancelled = threading.Event()
+        self.stats = None
+
+    def start(self, prompt, system_prompt, prefix, tracker, validate, cache_scope=None):
+        threading.Thread(
+            target=self._run, args=(prompt, system_prompt, prefix, tracker, validate, cache_scope),
+            name=f"qd-hedge-{self.role}", daemon=True,
+        ).start()
+
+    def _run(self, prompt, system_prompt, prefix, tracker, validate, cache_scope):
+        self.stats = stats = new_call_stats(self.provider, prompt, system_prompt, prefix)
+        stats.hedge = self.role
+        start = time.perf_counter()
+        parts = []
+        try:
+            chunks = stream_llm(self.provider, self.api_key, prompt, system_prompt, prefix, stats, cache_scope)
+            try:
+                for chunk in chunks:
+                    if stats.first_token_ms is None:
+                        stats.first_token_ms = (time.perf_counter() - start) * 1000
+                        self.first_token.set()
+                    if self.cancelled.is_set():
+                        if tracker is not None:
+                            tracker.record(self.provider, first_token_ms=stats.first_token_ms)
+                        return
+                    parts.append(chunk)
+            finally:
+                chunks.close()
+            stats.elapsed_ms = (time.perf_counter() - start) * 1000
+            if tracker is not None:
+                tracker.record(self.provider, stats.first_token_ms, stats.elapsed_ms)
+            text = "".join(parts)
+            if validate is not None and not validate(text):
+                self.results.put((self, text, ValueError(f"Resposta inválida de {self.provider}.")))
+            else:
+                self.results.put((self, text, None))
+        except Exception as e:
+            if tracker is not None and stats.first_token_ms is not None:
+                tracker.record(self.provider, first_token_ms=stats.first_token_ms)
+            self.results.put((self, None, e))
+        finally:
+            self.first_token.set()  # a failed primary should trigger the backup right away
+
+
+def call_llm_hedged(primary: str, primary_key: str, backup: str, backup_key: str, prompt: str,
+                    system_prompt: str = SYSTEM_PROMPT, prefix: str = "", hedge_delay_ms: float = None,
+                    tracker: LatencyTracker = None, validate=None, cache_scope: str = None):
+    """Race ``primary`` against a delayed ``backup``. Returns ``(text, CallStats)`` of the winner.
+
+    ``validate(text) -> bool`` rejects responses that should not win (e.g.
+    unparseable JSON). If every response is rejected, the last one is returned
+    anyway so the caller's own repair can try it; if none arrives at all, the
+    last error is raised. ``cache_scope`` is passed on to
+    :func:`llm_client.stream_llm`.
+    """
+    if hedge_delay_ms is None:
+        hedge_delay_ms = tracker.suggest_delay(primary) if tracker is not None else DEFAULT_HEDGE_DELAY_MS
+    results = queue.Queue()
+    attempts = [_Attempt("primary", primary, primary_key, results)]
+    attempts[0].start(prompt, system_prompt, prefix, tracker, validate, cache_scope)
+    if backup and backup_key and not attempts[0].first_token.wait(hedge_delay_ms / 1000):
+        attempts.append(_Attempt("backup", backup, backup_key, results))
+        attempts[-1].start(prompt, system_prompt, prefix, tracker, validate, cache_scope)
+
+    pending, error, rejected = len(attempts), None, None
+    while pending:
+        attempt, text, exc = results.get()
+        pending -= 1
+        if text is not None and exc is not None:
+            rejected = (text, attempt.stats)
+        if exc is None:
+            for other in attempts:
+                if other is not attempt:
+                    other.cancelled.set()
+            return text, attempt.stats
+        error = exc
+        if pending == 0 and len(attempts) == 1 and backup and backup_key:
+            # The primary failed before the hedge delay elapsed: fall back to the backup.
+            attempts.append(_Attempt("backup", backup, backup_key, results))
+            attempts[-1].start(prompt, system_prompt, prefix, tracker, validate, cache_scope)
+            pending += 1
+    if rejected is not None:
+        return rejected
+    raise error
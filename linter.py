@@ -0,0 +1,243 @@
+"""Local linter for the question-writing rules in ``SYSTEM_PROMPT``.
+
+Checks, in a single pass over the questions, with regexes and Portuguese
+lexicons compiled at import time:
+
+- double-barreled questions (two objects under one evaluation);
+- leading wording (``Você concorda que...``, loaded adjectives);
+- MECE options: repeated options and overlapping or gapped numeric ranges;
+- matrices with more than ``MAX_MATRIX_ROWS`` rows;
+- randomized options with ``Outro`` / ``Nenhum`` / ``Não sei`` not anchored.
+
+Text is lower-cased and accent-folded once per question, so the whole pass is
+O(total text) and cheap enough to run after every refinement.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+
+from questionnaire_model import Questionnaire, QuestionType
+
+DOUBLE_BARRELED = "double_barreled"
+LEADING = "leading"
+MECE = "mece"
+MATRIX_ROWS = "matrix_rows"
+UNANCHORED = "unanchored"
+
+ERROR = "erro"
+WARNING = "aviso"
+
+RULE_LABELS = {
+    DOUBLE_BARRELED: "Uma ideia por pergunta",
+    LEADING: "Neutralidade",
+    MECE: "Opções MECE",
+    MATRIX_ROWS: "Matriz mobile-first",
+    UNANCHORED: "Randomização",
+}
+
+MAX_MATRIX_ROWS = 5
+
+
+def _fold_table() -> dict:
+    """Translation table that strips Latin-1 accents (á -> a, ç -> c, ...)."""
+    table = {}
+    for code in range(0xC0, 0x180):
+        base = unicodedata.normalize("NFKD", chr(code))[0]
+        if base != chr(code) and base.isascii():
+            table[code] = base
+    return table
+
+
+_FOLD = _fold_table()
+
+
+def fold(text) -> str:
+    """Lower-case and strip accents."""
+    return str(text or "").translate(_FOLD).lower()
+
+
+# Lexicons are written accent-free because they match folded text.
+_EVALUATION = (
+    r"satisfeit\w*|satisfacao|avali\w+|nota|classific\w+|concord\w+|importan\w+|"
+    r"qualidade|gost\w+|recomend\w+|confia\w*|prefer\w+|opiniao|acha"
+)
+_DOUBLE_BARRELED_RE = re.compile(
+    rf"\b(?:{_EVALUATION})\b.*?\b(?:com|sobre|de|do|da|dos|das|a|o|os|as|quanto\s+a\w*|em\s+relacao\s+a\w*)\s+"
+    r"(?:[ao]s?\s+|seu\s+|sua\s+|seus\s+|suas\s+)?(\w{3,})\s+(?:e|ou|e\s+tambem)\s+"
+    r"(?:[ao]s?\s+|d[ao]s?\s+|seu\s+|sua\s+|seus\s+|suas\s+|com\s+)?(\w{3,})"
+)
+# Pairs that read as one concept and are not double-barreled.
+_FIXED_PAIRS = frozenset({
+    ("custo", "beneficio"), ("preco", "condicoes"), ("produtos", "servicos"), ("bens", "servicos"),
+    ("entrada", "saida"), ("compra", "venda"), ("perguntas", "respostas"),
+})
+_LEADING_RES = (
+    (re.compile(r"\b(?:voce|vc)\s+(?:nao\s+)?(?:concorda|acha|acredita|diria)\s+que\b"), ERROR,
+     "induz a resposta (\"você concorda/acha que...\")."),
+    # Only a question that *opens* in the negative: "Por que você não é cliente do Banco X?" is a
+    # neutral question with a negation inside it, not a leading one.
+    (re.compile(r"^\s*(?:nao\s+)?(?:e|seria)\s+verdade\s+que\b|^\s*(?:(?:voce|vc)\s+)?nao\s+(?:e|seria|acha|concorda)\b[^?]*\?\s*$"),
+     ERROR, "pergunta na negativa que sugere a resposta."),
+    (re.compile(r"\b(?:todos|todo\s+mundo|a\s+maioria(?:\s+das\s+pessoas)?)\s+(?:sabem|sabe|concordam|concorda|dizem|diz|preferem|prefere)\b"),
+     ERROR, "apela para a opinião da maioria."),
+    (re.compile(r"\b(?:excelente|incrive(?:l|is)|otim[oa]s?|maravilhos[oa]s?|fantastic[oa]s?|espetacular(?:es)?|"
+                r"pessim[oa]s?|terrive(?:l|is)|horrive(?:l|is)|renomad[oa]s?|lider(?:es)?\s+(?:de|do)\s+mercado)\b"),
+     WARNING, "usa adjetivo valorativo no enunciado."),
+    (re.compile(r"\bquao\s+(?:satisfeit\w*|bo[am]|feliz|positiv\w*)\b"), WARNING,
+     "escala unipolar que pressupõe uma avaliação positiva."),
+)
+_ANCHOR_OPTION_RE = re.compile(
+    r"^\s*(?:outr[oa]s?|nenhum[a]?|nenhuma\s+das\s+(?:anteriores|alternativas)|nao\s+sei|nao\s+se\s+aplica|"
+    r"prefiro\s+nao\s+(?:responder|informar|dizer)|ns/nr|todas\s+as\s+(?:anteriores|alternativas))\b"
+)
+_ANCHOR_NOTE_RE = re.compile(r"\b(?:fix\w+|ancor\w+|mant\w+\s+(?:no\s+)?(?:final|fim)|exceto|nao\s+randomiz\w*)\b")
+_ANCHOR_KEYS = ("anchor", "anchored", "fixed", "fixed_position", "exclusive", "lock")
+
+_NUMBER = r"(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d+))?"
+_CURRENCY = r"(?:r\$\s*)?"
+_RANGE_RE = re.compile(rf"{_NUMBER}\s*(?:a|ate|-|–|—|e)\s*{_CURRENCY}{_NUMBER}")
+# (pattern, side, strict): strict bounds exclude the number itself ("mais de 50" starts after 50).
+_BOUND_RES = (
+    (re.compile(rf"\b(?:mais\s+de|acima\s+de|superior\s+a)\s*{_CURRENCY}{_NUMBER}|>\s*{_CURRENCY}{_NUMBER}"), "low", True),
+    (re.compile(rf"\ba\s+partir\s+de\s*{_CURRENCY}{_NUMBER}|{_NUMBER}\s*(?:\w+\s+)?(?:ou\s+mais|\+)"), "low", False),
+    (re.compile(rf"\b(?:menos\s+de|abaixo\s+de|inferior\s+a)\s*{_CURRENCY}{_NUMBER}|<\s*{_CURRENCY}{_NUMBER}"), "high", True),
+    (re.compile(rf"\bate\s*{_CURRENCY}{_NUMBER}"), "high", False),
+)
+_SPACE_RE = re.compile(r"[\s\W_]+")
+
+
+@dataclass(frozen=True)
+class LintFinding:
+    rule: str
+    question_id: str
+    message: str
+    severity: str = WARNING
+
+
+def _number(integer: str, decimals) -> float:
+    return float(integer.replace(".", "") + ("." + decimals if decimals else ""))
+
+
+def _bound(match) -> float:
+    groups = match.groups()
+    for i in range(0, len(groups), 2):
+        if groups[i] is not None:
+            return _number(groups[i], groups[i + 1])
+    raise ValueError(match.group(0))
+
+
+def _interval(label: str):
+    """``(low, high, strict_low, strict_high)`` for a numeric range option, or None."""
+    match = _RANGE_RE.search(label)
+    if match:
+        return _number(*match.group(1, 2)), _number(*match.group(3, 4)), False, False
+    for pattern, side, strict in _BOUND_RES:
+        match = pattern.search(label)
+        if match:
+            value = _bound(match)
+            return (value, float("inf"), strict, False) if side == "low" else (float("-inf"), value, False, strict)
+    return None
+
+
+def _check_ranges(qid: str, labels: list, originals: list, findings: list):
+    intervals = [
+        (interval, original) for label, original in zip(labels, originals) if (interval := _interval(label)) is not None
+    ]
+    if len(intervals) < 2:
+        return
+    finite = [b for (lo, hi, _, _), _ in intervals for b in (lo, hi) if abs(b) != float("inf")]
+    integral = all(b == int(b) for b in finite)
+    if integral:
+        # Inclusive integer bounds: "menos de 18" -> up to 17, "mais de 65" -> from 66.
+        intervals = [((lo + sl, hi - sh, False, False), label) for (lo, hi, sl, sh), label in intervals]
+    ordered = sorted(intervals, key=lambda item: item[0][:2])
+    for ((_, hi1, _, shi1), label1), ((lo2, _, slo2, _), label2) in zip(ordered, ordered[1:]):
+        if lo2 < hi1 or (lo2 == hi1 and not (shi1 or slo2)):
+            findings.append(LintFinding(MECE, qid, f"{qid}: faixas sobrepostas (\"{label1}\" e \"{label2}\").", ERROR))
+        elif integral and lo2 > hi1 + 1:
+            findings.append(LintFinding(MECE, qid, f"{qid}: lacuna entre as faixas \"{label1}\" e \"{label2}\".", WARNING))
+
+
+def _check_options(q, findings: list):
+    options = q.option_list()
+    if not options:
+        return
+    qid = str(q.id)
+    originals = [opt.label.strip() for opt in options]
+    labels = [fold(label) for label in originals]
+    seen = set()
+    for label, original in zip(labels, originals):
+        key = _SPACE_RE.sub(" ", label).strip()
+        if key and key in seen:
+            findings.append(LintFinding(MECE, qid, f"{qid}: opção repetida (\"{original}\").", ERROR))
+        seen.add(key)
+    if q.kind is QuestionType.SINGLE_CHOICE:
+        _check_ranges(qid, labels, originals, findings)
+
+    if q.randomize_options is True:
+        loose = [
+            opt.label for opt, label in zip(options, labels)
+            if _ANCHOR_OPTION_RE.match(label)
+            and not (opt.extra and any(opt.extra.get(key) for key in _ANCHOR_KEYS))
+        ]
+        if loose and not _ANCHOR_NOTE_RE.search(fold(q.programming_note)):
+            names = ", ".join(f"\"{name}\"" for name in loose)
+            findings.append(LintFinding(
+                UNANCHORED, qid,
+                f"{qid}: opções randomizadas sem fixar {names} no final (indique na nota de programação).",
+                WARNING,
+            ))
+
+
+def is_anchor_option(label) -> bool:
+    """True for options that stay in place when the rest is randomized (Outro, Nenhum, Não sei, ...)."""
+    return bool(_ANCHOR_OPTION_RE.match(fold(label).strip()))
+
+
+def lint_question(q, findings: list = None) -> list:
+    """Append the findings for one question to ``findings`` (and return it)."""
+    findings = [] if findings is None else findings
+    qid = str(q.id)
+    original = str(q.text or "")
+    text = fold(original)
+
+    match = _DOUBLE_BARRELED_RE.search(text)
+    if match and (match.group(1), match.group(2)) not in _FIXED_PAIRS and match.group(1) != match.group(2):
+        # Folding keeps offsets for Portuguese text, so quote the words as written.
+        source = original if len(original) == len(text) else text
+        first, second = source[match.start(1) : match.end(1)], source[match.start(2) : match.end(2)]
+        findings.append(LintFinding(
+            DOUBLE_BARRELED, qid, f"{qid}: pode estar avaliando duas coisas ao mesmo tempo (\"{first}\" e \"{second}\").",
+            WARNING,
+        ))
+    for pattern, severity, message in _LEADING_RES:
+        if pattern.search(text):
+            findings.append(LintFinding(LEADING, qid, f"{qid}: {message}", severity))
+
+    if q.kind is QuestionType.MATRIX:
+        rows = q.rows if isinstance(q.rows, list) else (q.items if isinstance(q.items, list) else [])
+        if len(rows) > MAX_MATRIX_ROWS:
+            findings.append(LintFinding(
+                MATRIX_ROWS, qid, f"{qid}: matriz com {len(rows)} linhas (máx. {MAX_MATRIX_ROWS} para mobile).", ERROR,
+            ))
+    _check_options(q, findings)
+    return findings
+
+
+def lint_questionnaire(questionnaire) -> list:
+    """Lint every question (dict or :class:`Questionnaire`) in one pass. Returns a list of findings."""
+    model = questionnaire if isinstance(questionnaire, Questionnaire) else Questionnaire.from_dict(questionnaire)
+    findings = []
+    for q in model.questions():
+        lint_question(q, findings)
+    return findings
+
+
+def lint_feedback(findings: list) -> str:
+    """Refinement request asking the model to fix ``findings``."""
+    lines = [f"- {f.message}" for f in findings]
+    return (
+        "Corrija os seguintes problemas apontados pela revisão automática, sem alterar o restante do questionário:\n"
+        + "\n".join(lines)
+    )
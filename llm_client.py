@@ -0,0 +1,324 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import lru_cache
+
+from prompts import SYSTEM_PROMPT
+
+PROVIDER_GROQ = "Groq (grátis — recomendado)"
+PROVIDER_GEMINI = "Google Gemini"
+PROVIDER_STUB = "Stub local (testes de carga)"
+PROVIDERS = [PROVIDER_GROQ, PROVIDER_GEMINI]
+if os.environ.get("QD_STUB_PROVIDER"):
+    # Offline provider for load tests: fixed latency, canned response (see benchmarks/load_test.py).
+    PROVIDERS.append(PROVIDER_STUB)
+
+GROQ_MODEL = "llama-3.3-70b-versatile"
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_CACHE_MODEL = "models/gemini-2.0-flash-001"  # explicit caching needs a pinned version
+GEMINI_CACHE_TTL = timedelta(hours=1)
+GEMINI_MIN_CACHE_TOKENS = 4096  # smaller prefixes are not worth (or allowed) a cache entry
+GEMINI_MAX_CACHE_SCOPES = 256  # sessions whose last prefix digest is remembered
+TEMPERATURE = 0.4
+MAX_OUTPUT_TOKENS = 8192
+STUB_LATENCY_MS = 500.0
+STUB_CHUNK_CHARS = 2048
+STUB_QUESTIONNAIRE = {
+    "project_summary": {"research_objective": "Teste de carga", "estimated_loi_minutes": 1, "total_questions": 2},
+    "sections": [{"id": "S1", "title": "Screening / Qualificação", "questions": [
+        {"id": "S1_Q1", "type": "single_choice", "text": "Você é maior de idade?", "required": True,
+         "options": [{"code": 1, "text": "Sim"}, {"code": 2, "text": "Não", "routing": "TERMINATE"}]},
+        {"id": "S1_Q2", "type": "open_text", "text": "Gostaria de fazer algum comentário adicional?", "required": False},
+    ]}],
+    "methodological_notes": {},
+}
+
+# Rough BPE stand-in: words split into chunks of up to 4 characters, punctuation,
+# and line breaks / indentation runs (single spaces merge into the next word).
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]|\n\s*|\s{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count, good enough to compare prompt sizes between calls."""
+    return len(_TOKEN_RE.findall(text)) if text else 0
+
+
+@dataclass
+class CallStats:
+    provider: str
+    system_tokens: int  # estimated
+    prefix_tokens: int  # estimated, stable part of the user content
+    suffix_tokens: int  # estimated, variable part
+    elapsed_ms: float = 0.0
+    input_tokens: int = None  # as reported by the provider
+    cached_tokens: int = None  # as reported by the provider
+    output_tokens: int = None
+    prefix_cache: str = ""  # "", "created" or "hit" (Gemini explicit cache)
+    first_token_ms: float = None  # streaming calls only
+    hedge: str = ""  # "", "primary" or "backup" (see hedging.py)
+
+    @property
+    def estimated_input_tokens(self) -> int:
+        return self.system_tokens + self.prefix_tokens + self.suffix_tokens
+
+
+@lru_cache(maxsize=16)
+def get_client(provider: str, api_key: str, temperature: float = TEMPERATURE, system_prompt: str = SYSTEM_PROMPT):
+    """Return a provider client, importing the SDK on first use and caching it per key."""
+    if provider == PROVIDER_STUB:
+        return None
+    if provider == PROVIDER_GROQ:
+        from groq import Groq
+
+        return Groq(api_key=api_key)
+
+    import google.generativeai as genai
+
+    return _bind_key(genai.GenerativeModel(
+        model_name=GEMINI_MODEL,
+        system_instruction=system_prompt,
+        generation_config=genai.GenerationConfig(temperature=temperature, max_output_tokens=MAX_OUTPUT_TOKENS),
+    ), api_key)
+
+
+# genai.configure() swaps the key of one process-wide client under every thread (hedges, variants and
+# other sessions), so generation uses per-key clients; only cache creation, which has no such hook, still
+# configures, and does so under this lock.
+_genai_configure_lock = threading.Lock()
+
+
+@lru_cache(maxsize=16)
+def _gemini_service(api_key: str):
+    """Gemini generation client that always sends ``api_key``."""
+    import google.ai.generativelanguage as glm
+
+    return glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+
+def _bind_key(model, api_key: str):
+    model._client = _gemini_service(api_key)  # otherwise the SDK falls back to the configure()d client
+    return model
+
+
+_gemini_caches = {}  # (api_key, prefix digest) -> (model, expires_at)
+_gemini_last_prefix = OrderedDict()  # (api_key, cache scope) -> digest of its previous prefix
+_gemini_creating = set()  # cache keys with a create in flight
+_gemini_caches_lock = threading.Lock()
+
+
+def _gemini_cached_model(api_key: str, system_prompt: str, prefix: str, stats: CallStats, cache_scope: str = None):
+    """Return a model bound to a cached (system prompt + prefix), or None if caching does not apply.
+
+    Only callers whose prefix is stable pass a ``cache_scope`` (e.g. the
+    session id). A cache is created the second time a scope sends the same
+    prefix in a row, so a prefix that changes every call never pays for a
+    blocking create plus an hour of storage.
+    """
+    if cache_scope is None or stats.system_tokens + stats.prefix_tokens < GEMINI_MIN_CACHE_TOKENS:
+        return None
+    import google.generativeai as genai
+    from google.generativeai import caching
+
+    digest = hashlib.sha256((system_prompt + "\0" + prefix).encode("utf-8")).hexdigest()
+    key = (api_key, digest)
+    with _gemini_caches_lock:
+        scope = (api_key, cache_scope)
+        previous = _gemini_last_prefix.pop(scope, None)
+        _gemini_last_prefix[scope] = digest
+        while len(_gemini_last_prefix) > GEMINI_MAX_CACHE_SCOPES:
+            _gemini_last_prefix.popitem(last=False)
+        entry = _gemini_caches.get(key)
+        if entry and entry[1] > time.time():
+            stats.prefix_cache = "hit"
+            return entry[0]
+        if previous != digest or key in _gemini_creating:
+            return None
+        _gemini_creating.add(key)
+    try:
+        with _genai_configure_lock:
+            genai.configure(api_key=api_key)
+            cache = caching.CachedContent.create(
+                model=GEMINI_CACHE_MODEL, system_instruction=system_prompt, contents=[prefix], ttl=GEMINI_CACHE_TTL,
+            )
+    except Exception:
+        return None  # e.g. prefix below the provider minimum; fall back to a normal call
+    finally:
+        with _gemini_caches_lock:
+            _gemini_creating.discard(key)
+    model = _bind_key(genai.GenerativeModel.from_cached_content(
+        cached_content=cache,
+        generation_config=genai.GenerationConfig(temperature=TEMPERATURE, max_output_tokens=MAX_OUTPUT_TOKENS),
+    ), api_key)
+    with _gemini_caches_lock:
+        now = time.time()
+        for expired in [k for k, (_, expires_at) in _gemini_caches.items() if expires_at <= now]:
+            del _gemini_caches[expired]
+        # Expire a little early so we never call with a cache the server already dropped.
+        _gemini_caches[key] = (model, now + GEMINI_CACHE_TTL.total_seconds() - 60)
+    stats.prefix_cache = "created"
+    return model
+
+
+def _record_groq_usage(usage, stats: CallStats):
+    if stats is None or usage is None:
+        return
+    stats.input_tokens = getattr(usage, "prompt_tokens", None)
+    stats.output_tokens = getattr(usage, "completion_tokens", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    stats.cached_tokens = getattr(details, "cached_tokens", None) if details is not None else None
+
+
+def _record_gemini_usage(usage, stats: CallStats):
+    if stats is None or usage is None:
+        return
+    stats.input_tokens = getattr(usage, "prompt_token_count", None)
+    stats.cached_tokens = getattr(usage, "cached_content_token_count", None)
+    stats.output_tokens = getattr(usage, "candidates_token_count", None)
+
+
+def call_groq(api_key: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "", stats: CallStats = None,
+              temperature: float = TEMPERATURE) -> str:
+    """Call Groq API (free tier: Llama 3.3 70B)."""
+    client = get_client(PROVIDER_GROQ, api_key)
+    response = client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            # Stable content first so Groq's automatic prefix caching can match it.
+            {"role": "user", "content": prefix + prompt},
+        ],
+        temperature=temperature,
+        max_tokens=MAX_OUTPUT_TOKENS,
+    )
+    _record_groq_usage(getattr(response, "usage", None), stats)
+    return response.choices[0].message.content
+
+
+def call_gemini(api_key: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "", stats: CallStats = None,
+                temperature: float = TEMPERATURE, cache_scope: str = None) -> str:
+    """Call Google Gemini API, reusing a cached prefix when it is large and stable (see ``cache_scope``)."""
+    import google.generativeai as genai
+
+    model = _gemini_cached_model(api_key, system_prompt, prefix, stats, cache_scope) if prefix and stats is not None else None
+    if model is not None:
+        # The cached model carries the default config; other temperatures override it per call.
+        config = None if temperature == TEMPERATURE else genai.GenerationConfig(
+            temperature=temperature, max_output_tokens=MAX_OUTPUT_TOKENS,
+        )
+        response = model.generate_content(prompt, generation_config=config)
+    else:
+        model = get_client(PROVIDER_GEMINI, api_key, temperature, system_prompt)
+        response = model.generate_content(prefix + prompt)
+    _record_gemini_usage(getattr(response, "usage_metadata", None), stats)
+    return response.text
+
+
+@lru_cache(maxsize=4)
+def _stub_response(path: str) -> str:
+    if not path:
+        return json.dumps(STUB_QUESTIONNAIRE, ensure_ascii=False)
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def call_stub(prompt: str, stats: CallStats = None) -> str:
+    """Local stand-in for a provider: sleeps ``QD_STUB_LATENCY_MS`` and returns ``QD_STUB_RESPONSE`` (a JSON file)."""
+    time.sleep(float(os.environ.get("QD_STUB_LATENCY_MS", STUB_LATENCY_MS)) / 1000)
+    text = _stub_response(os.environ.get("QD_STUB_RESPONSE", ""))
+    if stats is not None:
+        stats.input_tokens = stats.estimated_input_tokens
+        stats.output_tokens = estimate_tokens(text)
+    return text
+
+
+def stream_stub(prompt: str, stats: CallStats = None):
+    text = call_stub(prompt, stats)
+    for start in range(0, len(text), STUB_CHUNK_CHARS):
+        yield text[start : start + STUB_CHUNK_CHARS]
+
+
+def stream_groq(api_key: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "", stats: CallStats = None):
+    """Like :func:`call_groq`, but yield text chunks as they arrive. Closing the generator closes the stream."""
+    client = get_client(PROVIDER_GROQ, api_key)
+    stream = client.chat.completions.create(
+        model=GROQ_MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prefix + prompt},
+        ],
+        temperature=TEMPERATURE,
+        max_tokens=MAX_OUTPUT_TOKENS,
+        stream=True,
+    )
+    try:
+        for chunk in stream:
+            x_groq = getattr(chunk, "x_groq", None)
+            _record_groq_usage(getattr(chunk, "usage", None) or getattr(x_groq, "usage", None), stats)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+
+
+def stream_gemini(api_key: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "", stats: CallStats = None,
+                  cache_scope: str = None):
+    """Like :func:`call_gemini`, but yield text chunks as they arrive."""
+    model = _gemini_cached_model(api_key, system_prompt, prefix, stats, cache_scope) if prefix and stats is not None else None
+    if model is not None:
+        response = model.generate_content(prompt, stream=True)
+    else:
+        model = get_client(PROVIDER_GEMINI, api_key, system_prompt=system_prompt)
+        response = model.generate_content(prefix + prompt, stream=True)
+    for chunk in response:
+        _record_gemini_usage(getattr(chunk, "usage_metadata", None), stats)
+        if chunk.candidates and chunk.candidates[0].content.parts:
+            yield chunk.text
+
+
+def new_call_stats(provider: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "") -> CallStats:
+    return CallStats(
+        provider=provider,
+        system_tokens=estimate_tokens(system_prompt),
+        prefix_tokens=estimate_tokens(prefix),
+        suffix_tokens=estimate_tokens(prompt),
+    )
+
+
+def stream_llm(provider: str, api_key: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "",
+               stats: CallStats = None, cache_scope: str = None):
+    """Yield the response in chunks; ``stats`` (if given) is filled as the stream progresses."""
+    if provider == PROVIDER_STUB:
+        return stream_stub(prompt, stats)
+    if provider == PROVIDER_GROQ:
+        return stream_groq(api_key, prompt, system_prompt, prefix, stats)
+    return stream_gemini(api_key, prompt, system_prompt, prefix, stats, cache_scope)
+
+
+def call_llm_with_stats(provider: str, api_key: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "",
+                        temperature: float = TEMPERATURE, cache_scope: str = None):
+    """Call the provider with a stable ``prefix`` and a variable ``prompt`` suffix. Returns ``(text, CallStats)``.
+
+    ``cache_scope`` opts the prefix into Gemini's explicit cache; pass it only
+    when the prefix repeats across calls of that scope (e.g. the project
+    context of a session), never for prefixes that change every call.
+    """
+    stats = new_call_stats(provider, prompt, system_prompt, prefix)
+    start = time.perf_counter()
+    if provider == PROVIDER_STUB:
+        text = call_stub(prompt, stats)
+    elif provider == PROVIDER_GROQ:
+        text = call_groq(api_key, prompt, system_prompt, prefix, stats, temperature)
+    else:
+        text = call_gemini(api_key, prompt, system_prompt, prefix, stats, temperature, cache_scope)
+    stats.elapsed_ms = (time.perf_counter() - start) * 1000
+    return text, stats
+
+
+def call_llm(provider: str, api_key: str, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "") -> str:
+    return call_llm_with_stats(provider, api_key, prompt, system_prompt, prefix)[0]
@@ -0,0 +1,176 @@
+"""Deterministic local LOI (length of interview) estimator.
+
+Each question gets a time in seconds from its type, text length, option count
+and matrix rows, using the timings in ``SYSTEM_PROMPT`` (closed ~15-20s, open
+~45-60s, scale ~10-15s). Routing then weights every question by the
+probability of reaching it: answer shares are drawn per scenario (scenario 0
+is "every option equally likely"), and all scenarios are propagated through
+the routing graph at once as numpy columns, so hundreds of them cost about as
+much as one. Screen-outs (``TERMINATE``) are excluded from the completes LOI.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from questionnaire_model import Questionnaire, QuestionType
+from routing_validator import resolve_option_targets
+
+# Seconds to answer, before reading time and per-option costs.
+TYPE_SECONDS = {
+    QuestionType.SINGLE_CHOICE: 8.0,
+    QuestionType.MULTIPLE_CHOICE: 10.0,
+    QuestionType.SCALE_NUMERIC: 8.0,
+    QuestionType.SCALE_LIKERT: 6.0,
+    QuestionType.NPS: 9.0,
+    QuestionType.RANKING: 6.0,
+    QuestionType.OPEN_TEXT: 45.0,
+    QuestionType.MATRIX: 4.0,
+}
+DEFAULT_SECONDS = 12.0
+OPTION_SECONDS = 1.0  # reading one option / item
+RANKING_ITEM_SECONDS = 3.0  # placing one ranking item
+MATRIX_ROW_SECONDS = 7.0  # answering one matrix row
+READ_CHARS_PER_SECOND = 25.0  # ~250 words per minute
+
+DEFAULT_SCENARIOS = 256
+
+
+@dataclass
+class LoiEstimate:
+    total_questions: int
+    completes_minutes: float  # expected LOI for respondents who complete, uniform answers
+    all_minutes: float  # expected time over everyone who starts, screen-outs included
+    worst_minutes: float  # longest completing path
+    p10_minutes: float
+    p50_minutes: float
+    p90_minutes: float
+    completion_rate: float  # share of starters who are not screened out, uniform answers
+    question_seconds: list
+    max_loi: float = None
+
+    @property
+    def exceeds_max(self) -> bool:
+        return self.max_loi is not None and self.completes_minutes > self.max_loi
+
+    @property
+    def rounded_minutes(self) -> int:
+        return max(1, int(round(self.completes_minutes)))
+
+
+def question_seconds(q) -> float:
+    """Estimated seconds to read and answer a single question."""
+    seconds = TYPE_SECONDS.get(q.kind, DEFAULT_SECONDS)
+    chars = len(str(q.text or "")) + len(str(q.instruction or ""))
+    seconds += chars / READ_CHARS_PER_SECOND
+    options = q.option_list()
+    if q.kind is QuestionType.RANKING:
+        items = options or (q.items if isinstance(q.items, list) else [])
+        seconds += len(items) * (OPTION_SECONDS + RANKING_ITEM_SECONDS)
+    elif q.kind is QuestionType.MATRIX:
+        rows = q.rows if isinstance(q.rows, list) else (q.items if isinstance(q.items, list) else [])
+        columns = q.columns if isinstance(q.columns, list) else []
+        seconds += len(rows) * MATRIX_ROW_SECONDS + len(columns) * OPTION_SECONDS
+    else:
+        seconds += len(options) * OPTION_SECONDS
+        if q.kind is QuestionType.SCALE_LIKERT and not options:
+            seconds += 5 * OPTION_SECONDS  # default 5-point agreement scale
+    return seconds
+
+
+def _transitions(model: Questionnaire) -> list:
+    """Per question: destination of each answer option, or None if it always falls through.
+
+    Destinations use ``n`` for a completed interview and ``n + 1`` for a
+    screen-out. Unknown targets and backward jumps fall through.
+    """
+    questions = model.questions()
+    n = len(questions)
+    result = []
+    for pos, (q, routed) in enumerate(zip(questions, resolve_option_targets(model))):
+        dests = None
+        if routed:
+            by_option = {id(opt): target for opt, target in routed}
+            dests = []
+            for opt in q.option_list():
+                target = by_option.get(id(opt))
+                if target == n:
+                    dests.append(n + 1)
+                elif isinstance(target, int) and target > pos:
+                    dests.append(target)
+                else:
+                    dests.append(pos + 1)
+            if all(d == pos + 1 for d in dests):
+                dests = None
+        result.append(dests)
+    return result
+
+
+def estimate_loi(questionnaire, max_loi=None, scenarios: int = DEFAULT_SCENARIOS, seed: int = 0) -> LoiEstimate:
+    """Estimate LOI from the actual questions (dict or :class:`Questionnaire`)."""
+    model = questionnaire if isinstance(questionnaire, Questionnaire) else Questionnaire.from_dict(questionnaire)
+    questions = model.questions()
+    n = len(questions)
+    seconds = np.array([question_seconds(q) for q in questions], dtype=float)
+    if n == 0:
+        return LoiEstimate(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, [], max_loi)
+
+    scenarios = max(1, scenarios)
+    rng = np.random.default_rng(seed)
+    transitions = _transitions(model)
+
+    # Answer shares per routed question: row 0 uniform, the rest Dirichlet(1) draws.
+    shares = []
+    for dests in transitions:
+        if dests is None:
+            shares.append(None)
+            continue
+        p = rng.dirichlet(np.ones(len(dests)), size=scenarios)
+        p[0] = 1.0 / len(dests)
+        shares.append(p)
+
+    # Forward pass: probability of reaching each node, one column per scenario.
+    reach = np.zeros((n + 2, scenarios))
+    reach[0] = 1.0
+    for pos in range(n):
+        dests = transitions[pos]
+        if dests is None:
+            reach[pos + 1] += reach[pos]
+            continue
+        for option, dest in enumerate(dests):
+            reach[dest] += reach[pos] * shares[pos][:, option]
+
+    # Backward pass: probability of completing from each node.
+    completes = np.zeros((n + 2, scenarios))
+    completes[n] = 1.0
+    longest = np.full(n + 2, -np.inf)
+    longest[n] = 0.0
+    for pos in range(n - 1, -1, -1):
+        dests = transitions[pos]
+        if dests is None:
+            completes[pos] = completes[pos + 1]
+            longest[pos] = seconds[pos] + longest[pos + 1]
+            continue
+        for option, dest in enumerate(dests):
+            completes[pos] += shares[pos][:, option] * completes[dest]
+        longest[pos] = seconds[pos] + max(longest[d] for d in dests)
+
+    all_seconds = seconds @ reach[:n]
+    completion = completes[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        completes_seconds = np.where(completion > 0, seconds @ (reach[:n] * completes[:n]) / completion, 0.0)
+
+    p10, p50, p90 = np.percentile(completes_seconds, [10, 50, 90]) / 60
+    worst = longest[0] if np.isfinite(longest[0]) else 0.0
+    return LoiEstimate(
+        total_questions=n,
+        completes_minutes=float(completes_seconds[0] / 60),
+        all_minutes=float(all_seconds[0] / 60),
+        worst_minutes=float(worst / 60),
+        p10_minutes=float(p10),
+        p50_minutes=float(p50),
+        p90_minutes=float(p90),
+        completion_rate=float(completion[0]),
+        question_seconds=seconds.tolist(),
+        max_loi=max_loi,
+    )
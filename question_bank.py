@@ -0,0 +1,481 @@
+"""Local bank of validated question blocks for retrieval-augmented generation.
+
+Past questionnaires (exported JSON) are split into section blocks, classified
+as screening, NPS, demographics or project-specific, checked with the
+:mod:`linter` and the routing validator, and indexed by research type and
+question type. Full-text search uses SQLite FTS5 (BM25) when the SQLite build
+has it and an in-memory inverted index otherwise. At generation time the best
+validated screening / NPS / demographics blocks are inserted as they are
+(:func:`merge_blocks`) and the model only writes the project-specific sections.
+
+Pick the backend with ``QD_QUESTION_BANK``: ``memory`` or ``sqlite:<file>``
+(default ``sqlite:~/.questionnaire-designer/question_bank.db``).
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from linter import ERROR, fold, lint_questionnaire
+from questionnaire_model import Questionnaire, QuestionType, Section
+from routing_validator import BACKWARD, CYCLE, DUPLICATE_ID, target_token, validate_routing
+
+DEFAULT_BANK = "sqlite:" + os.path.join(os.path.expanduser("~"), ".questionnaire-designer", "question_bank.db")
+
+SCREENING = "screening"
+NPS = "nps"
+DEMOGRAPHICS = "demographics"
+PROJECT = "project"
+REUSABLE_KINDS = (SCREENING, NPS, DEMOGRAPHICS)  # also their order in the final questionnaire
+KIND_LABELS = {
+    SCREENING: "Screening", NPS: "NPS", DEMOGRAPHICS: "Perfil / demográficos", PROJECT: "Específico do projeto",
+}
+
+MAX_NPS_BLOCK = 4  # a section this small built around an NPS question is a reusable NPS block
+MAX_QUERY_TERMS = 32
+CANDIDATES = 50  # full-text hits re-ranked by research type and usage
+RESEARCH_TYPE_BOOST = 1.0
+USES_WEIGHT = 0.1
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_KIND_RES = (
+    (SCREENING, re.compile(r"screen|qualifica|filtro|elegib")),
+    (DEMOGRAPHICS, re.compile(r"demograf|perfil|socioecon|classifica\w*\s+econ|dados\s+(?:do\s+)?(?:respondente|entrevistado)")),
+    (NPS, re.compile(r"\bnps\b|net\s+promoter|recomenda")),
+)
+_NPS_RESEARCH_RE = re.compile(r"\bnps\b|satisfa|recomenda|\bcx\b|customer\s+experience|experiencia\s+do\s+cliente")
+_TERM_RE = re.compile(r"\w{3,}")
+_STOPWORDS = frozenset(
+    "que para com uma uns umas por dos das nos nas como mais seu sua seus suas ser sao esta este essa esse isso "
+    "pelo pela pelos pelas entre sobre tambem muito quando onde qual quais voce voces ate sem nao sim foi tem ter "
+    "the and for".split()
+)
+_BLOCKING_ROUTING = (BACKWARD, CYCLE, DUPLICATE_ID)
+
+
+@dataclass
+class BankBlock:
+    id: int
+    kind: str
+    research_type: str
+    title: str
+    question_types: tuple
+    section: dict
+    uses: int = 1
+    validated: bool = True
+    score: float = 0.0
+
+    @property
+    def num_questions(self) -> int:
+        return len(self.section.get("questions") or [])
+
+
+def terms(text) -> list:
+    """Accent-folded index terms (3+ characters, no stopwords)."""
+    return [t for t in _TERM_RE.findall(fold(text)) if t not in _STOPWORDS]
+
+
+def query_terms(text, limit: int = MAX_QUERY_TERMS) -> list:
+    """The ``limit`` most frequent terms of a (possibly long) query such as the project context."""
+    return [t for t, _ in Counter(terms(text)).most_common(limit)]
+
+
+def _labels(values) -> list:
+    if not isinstance(values, list):
+        return []
+    return [str(v.get("text", "")) if isinstance(v, dict) else str(v) for v in values]
+
+
+def block_terms(section: dict) -> list:
+    parts = [section.get("title") or "", section.get("description") or ""]
+    for q in section.get("questions") or []:
+        parts.append(q.get("text") or "")
+        for key in ("options", "rows", "columns", "items"):
+            parts.extend(_labels(q.get(key)))
+    return terms(" ".join(map(str, parts)))
+
+
+def block_digest(section: dict) -> str:
+    """Content hash that ignores ids, routing and notes, so re-exports of a block are recognized."""
+    content = [
+        (q.get("type"), fold(q.get("text")).strip(), [fold(label).strip() for label in _labels(q.get("options"))])
+        for q in section.get("questions") or []
+    ]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def classify_section(section) -> str:
+    """Block kind of a section (dict or :class:`Section`)."""
+    if isinstance(section, dict):
+        section = Section.from_value(section)
+    text = fold(f"{section.title or ''} {section.description or ''}")
+    for kind, pattern in _KIND_RES:
+        if pattern.search(text):
+            return kind
+    questions = section.question_list()
+    if len(questions) <= MAX_NPS_BLOCK and any(q.kind is QuestionType.NPS for q in questions):
+        return NPS
+    return PROJECT
+
+
+def block_problems(section: dict) -> list:
+    """Linter errors and in-block routing errors that keep a block from being reused."""
+    model = Questionnaire.from_dict({"sections": [section]})
+    problems = [f.message for f in lint_questionnaire(model) if f.severity == ERROR]
+    problems += [i.message for i in validate_routing(model) if i.kind in _BLOCKING_ROUTING]
+    return problems
+
+
+class InvertedIndex:
+    """BM25 over in-memory postings (used when SQLite has no FTS5)."""
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self._lengths = {}
+        self._total = 0
+
+    def add(self, doc_id: int, doc_terms: list):
+        for term, count in Counter(doc_terms).items():
+            self._postings[term][doc_id] = count
+        self._lengths[doc_id] = len(doc_terms)
+        self._total += len(doc_terms)
+
+    def search(self, query: list) -> dict:
+        """``{doc_id: score}`` for the documents matching any query term."""
+        n = len(self._lengths)
+        if not n:
+            return {}
+        average = self._total / n or 1.0
+        scores = defaultdict(float)
+        for term in set(query):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = 1 - BM25_B + BM25_B * self._lengths[doc_id] / average
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return scores
+
+
+class QuestionBank:
+    """Base class: backends implement ``_bump``, ``_add``, ``_candidates`` and ``_counts``."""
+
+    def ingest(self, questionnaire, research_type: str = None, source: str = "") -> int:
+        """Index every section of ``questionnaire`` (dict or model). Returns how many blocks were new."""
+        model = questionnaire if isinstance(questionnaire, Questionnaire) else Questionnaire.from_dict(questionnaire)
+        research_type = str(research_type or model.summary.get("research_type") or "")
+        added = 0
+        for section in model.section_list():
+            questions = section.question_list()
+            if not questions:
+                continue
+            data = section.to_dict()
+            digest = block_digest(data)
+            if self._bump(digest):
+                continue
+            self._add(BankBlock(
+                id=0,
+                kind=classify_section(section),
+                research_type=research_type,
+                title=str(section.title or ""),
+                question_types=tuple(sorted({str(q.type) for q in questions})),
+                section=data,
+                validated=not block_problems(data),
+            ), digest, block_terms(data), source)
+            added += 1
+        return added
+
+    def search(self, query: str = "", kind: str = None, research_type: str = None, question_type: str = None,
+               validated_only: bool = True, limit: int = 5) -> list:
+        """Blocks ranked by text relevance, same research type and how often they were reused."""
+        hits = self._candidates(query_terms(query), kind, question_type, validated_only)
+        for block, relevance in hits:
+            same_type = bool(research_type) and fold(block.research_type) == fold(research_type)
+            block.score = relevance + RESEARCH_TYPE_BOOST * same_type + USES_WEIGHT * math.log1p(block.uses)
+        return [block for block, _ in sorted(hits, key=lambda hit: -hit[0].score)[:limit]]
+
+    def best_block(self, kind: str, research_type: str = None, query: str = ""):
+        """Best validated block of ``kind`` for the project, or None when the bank has none."""
+        found = self.search(query, kind, research_type, limit=1)
+        if not found and query:
+            found = self.search("", kind, research_type, limit=1)
+        return found[0] if found else None
+
+    def counts(self) -> dict:
+        """``{kind: number of validated blocks}``."""
+        return self._counts()
+
+
+def _where(kind, question_type, validated_only) -> tuple:
+    clauses, params = [], []
+    if kind:
+        clauses.append("b.kind = ?")
+        params.append(kind)
+    if question_type:
+        clauses.append("instr(' ' || b.question_types || ' ', ?) > 0")
+        params.append(f" {question_type} ")
+    if validated_only:
+        clauses.append("b.validated = 1")
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+class MemoryBank(QuestionBank):
+    """Process-local bank (lost on restart)."""
+
+    def __init__(self):
+        self._blocks = {}
+        self._digests = {}
+        self._index = InvertedIndex()
+        self._lock = threading.Lock()
+
+    def _bump(self, digest):
+        with self._lock:
+            block_id = self._digests.get(digest)
+            if block_id is not None:
+                self._blocks[block_id].uses += 1
+            return block_id is not None
+
+    def _add(self, block, digest, doc_terms, source):
+        with self._lock:
+            block.id = len(self._blocks) + 1
+            self._blocks[block.id] = block
+            self._digests[digest] = block.id
+            self._index.add(block.id, doc_terms)
+
+    def _candidates(self, query, kind, question_type, validated_only):
+        with self._lock:
+            scores = self._index.search(query) if query else dict.fromkeys(self._blocks, 0.0)
+            blocks = [(self._blocks[block_id], score) for block_id, score in scores.items()]
+        return [
+            (copy.copy(block), score) for block, score in blocks
+            if (not kind or block.kind == kind)
+            and (not question_type or question_type in block.question_types)
+            and (block.validated or not validated_only)
+        ]
+
+    def _counts(self):
+        with self._lock:
+            return dict(Counter(b.kind for b in self._blocks.values() if b.validated))
+
+
+class SQLiteBank(QuestionBank):
+    """Single-file bank with an FTS5 index (or an in-memory inverted index without FTS5)."""
+
+    _COLUMNS = "b.id, b.kind, b.research_type, b.title, b.question_types, b.data, b.uses, b.validated"
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS bank_blocks ("
+                " id INTEGER PRIMARY KEY, digest TEXT NOT NULL UNIQUE, kind TEXT NOT NULL, research_type TEXT NOT NULL,"
+                " title TEXT NOT NULL, question_types TEXT NOT NULL, validated INTEGER NOT NULL,"
+                " uses INTEGER NOT NULL DEFAULT 1, data TEXT NOT NULL, source TEXT, added_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS bank_blocks_kind ON bank_blocks (kind, validated)")
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS bank_blocks_fts USING fts5(body, tokenize='unicode61')"
+                )
+                self._index = None
+            except sqlite3.OperationalError:  # SQLite built without FTS5
+                self._index = InvertedIndex()
+                for block_id, data in self._conn.execute("SELECT id, data FROM bank_blocks"):
+                    self._index.add(block_id, block_terms(json.loads(data)))
+
+    @property
+    def full_text(self) -> str:
+        return "fts5" if self._index is None else "inverted index"
+
+    def _bump(self, digest):
+        with self._lock:
+            return self._conn.execute("UPDATE bank_blocks SET uses = uses + 1 WHERE digest = ?", (digest,)).rowcount > 0
+
+    def _add(self, block, digest, doc_terms, source):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO bank_blocks (digest, kind, research_type, title, question_types, validated, uses, data,"
+                " source, added_at) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                (digest, block.kind, block.research_type, block.title, " ".join(block.question_types),
+                 int(block.validated), json.dumps(block.section, ensure_ascii=False), source, time.time()),
+            )
+            block.id = cursor.lastrowid
+            if self._index is None:
+                self._conn.execute("INSERT INTO bank_blocks_fts (rowid, body) VALUES (?, ?)",
+                                   (block.id, " ".join(doc_terms)))
+            else:
+                self._index.add(block.id, doc_terms)
+
+    def _candidates(self, query, kind, question_type, validated_only):
+        where, params = _where(kind, question_type, validated_only)
+        with self._lock:
+            if not query:
+                rows = self._conn.execute(
+                    f"SELECT {self._COLUMNS}, 0.0 FROM bank_blocks b WHERE 1 = 1{where}"
+                    " ORDER BY b.uses DESC LIMIT ?", (*params, CANDIDATES),
+                ).fetchall()
+            elif self._index is None:
+                match = " OR ".join(f'"{term}"' for term in query)
+                rows = self._conn.execute(
+                    f"SELECT {self._COLUMNS}, -bm25(bank_blocks_fts) FROM bank_blocks_fts"
+                    f" JOIN bank_blocks b ON b.id = bank_blocks_fts.rowid WHERE bank_blocks_fts MATCH ?{where}"
+                    " ORDER BY bm25(bank_blocks_fts) LIMIT ?", (match, *params, CANDIDATES),
+                ).fetchall()
+            else:
+                scores = self._index.search(query)
+                best = sorted(scores, key=scores.get, reverse=True)[:CANDIDATES]
+                rows = self._conn.execute(
+                    f"SELECT {self._COLUMNS}, 0.0 FROM bank_blocks b"
+                    f" WHERE b.id IN ({', '.join('?' * len(best)) or 'NULL'}){where}", (*best, *params),
+                ).fetchall()
+                rows = [(*row[:-1], scores[row[0]]) for row in rows]
+        return [
+            (BankBlock(block_id, kind, research_type, title, tuple(types.split()), json.loads(data), uses, bool(ok)),
+             relevance)
+            for block_id, kind, research_type, title, types, data, uses, ok, relevance in rows
+        ]
+
+    def _counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, COUNT(*) FROM bank_blocks WHERE validated = 1 GROUP BY kind")
+            return dict(rows.fetchall())
+
+
+def open_bank(spec: str = None) -> QuestionBank:
+    """Build a bank from a ``QD_QUESTION_BANK``-style spec."""
+    spec = spec or os.environ.get("QD_QUESTION_BANK", DEFAULT_BANK)
+    kind, _, location = spec.partition(":")
+    if kind == "memory":
+        return MemoryBank()
+    if kind == "sqlite":
+        return SQLiteBank(os.path.expanduser(location))
+    raise ValueError(f"QD_QUESTION_BANK inválido: {spec}")
+
+
+# --- Generation ------------------------------------------------------------------------------
+
+def select_blocks(bank: QuestionBank, research_type: str, query: str = "", include_nps: bool = None) -> list:
+    """Best validated block per reusable kind, in questionnaire order.
+
+    The NPS block is only reused when the research type or the query asks for
+    it (NPS, satisfação, CX...), unless ``include_nps`` says otherwise.
+    """
+    if include_nps is None:
+        include_nps = bool(_NPS_RESEARCH_RE.search(fold(f"{research_type} {query}")))
+    blocks = []
+    for kind in REUSABLE_KINDS:
+        if kind == NPS and not include_nps:
+            continue
+        block = bank.best_block(kind, research_type, query)
+        if block is not None:
+            blocks.append(block)
+    return blocks
+
+
+def blocks_prompt(blocks: list) -> str:
+    """Generation prompt addendum listing the blocks that will be inserted."""
+    from loi_estimator import estimate_loi
+    from prompts import BANK_BLOCKS_PROMPT
+
+    lines = []
+    for block in blocks:
+        texts = "; ".join(str(q.get("text") or "")[:80] for q in block.section.get("questions") or [])
+        lines.append(f"- {KIND_LABELS[block.kind]} — \"{block.title}\" ({block.num_questions} perguntas): {texts}")
+    minutes = estimate_loi({"sections": [b.section for b in blocks]}).completes_minutes
+    return BANK_BLOCKS_PROMPT.format(blocks="\n".join(lines), minutes=minutes)
+
+
+def _remap_routing(section: dict, ids: dict, fallback):
+    """Point routing at the new ids; targets outside ``ids`` go to ``fallback`` (None keeps them as they are)."""
+    for q in section["questions"]:
+        for opt in q.get("options") or []:
+            if not isinstance(opt, dict) or opt.get("routing") is None:
+                continue
+            token = target_token(opt["routing"])
+            if token is None or token == "TERMINATE":
+                continue
+            raw = str(opt["routing"]).strip()
+            new_id = ids.get(raw, ids.get(token))
+            if new_id is not None:
+                opt["routing"] = new_id
+            elif fallback is not None:
+                if fallback:
+                    opt["routing"] = fallback
+                else:
+                    del opt["routing"]
+
+
+def merge_blocks(data: dict, blocks: list) -> dict:
+    """Insert the bank ``blocks`` into a generated questionnaire and renumber sections and questions.
+
+    Generated sections of a kind that a block replaces are dropped (the model
+    was asked not to write them). Routing keeps pointing at the same questions;
+    a bank block's jumps out of the block go to the next section. Returns a
+    new dict and leaves ``data`` untouched.
+    """
+    if not blocks:
+        return data
+    data = copy.deepcopy(data)
+    by_kind = {block.kind: block for block in blocks}
+    generated = [s for s in data.get("sections") or [] if classify_section(s) not in by_kind]
+    # (section, scope): each bank block is its own id scope, the generated sections share one.
+    ordered = [(copy.deepcopy(by_kind[k].section), k) for k in (SCREENING, NPS) if k in by_kind]
+    ordered += [(section, PROJECT) for section in generated]
+    ordered += [(copy.deepcopy(by_kind[k].section), k) for k in (DEMOGRAPHICS,) if k in by_kind]
+
+    scopes = defaultdict(dict)  # scope -> {old id: new id}
+    for number, (section, scope) in enumerate(ordered, 1):
+        new_section_id = f"S{number}"
+        first_question = None
+        for k, q in enumerate(section["questions"], 1):
+            new_id = f"{new_section_id}_Q{k}"
+            scopes[scope].setdefault(str(q.get("id")), new_id)
+            q["id"] = new_id
+            first_question = first_question or new_id
+        scopes[scope].setdefault(str(section.get("id")), first_question)
+        section["id"] = new_section_id
+    for number, (section, scope) in enumerate(ordered):
+        if scope == PROJECT:
+            _remap_routing(section, scopes[scope], None)
+        else:
+            following = ordered[number + 1][0]["id"] + "_Q1" if number + 1 < len(ordered) else ""
+            _remap_routing(section, scopes[scope], following)
+
+    data["sections"] = [section for section, _ in ordered]
+    summary = data.setdefault("project_summary", {})
+    if isinstance(summary, dict):
+        summary["total_questions"] = sum(len(section["questions"]) for section in data["sections"])
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexa questionários exportados (.json) no banco de perguntas.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--research-type", default=None, help="tipo de pesquisa (padrão: project_summary.research_type)")
+    parser.add_argument("--bank", default=None, help="memory ou sqlite:<arquivo> (padrão: QD_QUESTION_BANK)")
+    args = parser.parse_args(argv)
+    bank = open_bank(args.bank)
+    added = 0
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            added += bank.ingest(json.load(f), args.research_type, source=os.path.basename(path))
+    print(f"{added} bloco(s) novo(s); validados por tipo: {bank.counts()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Typed, ``__slots__``-based in-memory questionnaire model.
+
+``Questionnaire.from_dict`` loads the JSON schema described in ``SYSTEM_PROMPT``
+and ``to_dict`` dumps it back losslessly: key order is preserved and keys the
+model does not know about are kept in ``extra``. Hand-edited JSON may be
+malformed: sections, questions and the questionnaire itself that are not
+objects load as empty nodes, and unhashable ids are kept as their text. Question types are interned
+as :class:`QuestionType` members, so dispatch is an identity check, and
+``Questionnaire.question(qid)`` is an O(1) lookup.
+"""
+
+import sys
+from enum import Enum
+
+
+class QuestionType(str, Enum):
+    SINGLE_CHOICE = "single_choice"
+    MULTIPLE_CHOICE = "multiple_choice"
+    SCALE_NUMERIC = "scale_numeric"
+    SCALE_LIKERT = "scale_likert"
+    NPS = "nps"
+    RANKING = "ranking"
+    OPEN_TEXT = "open_text"
+    MATRIX = "matrix"
+
+
+_TYPES_BY_VALUE = {t.value: t for t in QuestionType}
+
+CHOICE_TYPES = frozenset({QuestionType.SINGLE_CHOICE, QuestionType.MULTIPLE_CHOICE})
+SCALE_TYPES = frozenset({QuestionType.SCALE_NUMERIC, QuestionType.NPS})
+
+
+MAX_INTERNED_LEN = 40
+
+
+def _intern(value):
+    """Intern short identifier-like strings (keys, ids, types, routing keywords).
+
+    Interned strings are never freed (immortal on 3.12+), so free text such
+    as question texts and notes, which changes with every edit, is left alone.
+    """
+    if isinstance(value, str) and len(value) <= MAX_INTERNED_LEN and not any(c.isspace() for c in value):
+        return sys.intern(value)
+    return value
+
+
+def _hashable(value) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _Node:
+    """Base for model nodes: known keys live in slots, the rest in ``extra``."""
+
+    __slots__ = ("extra", "_keys")
+    FIELDS = ()
+    INTERNED = frozenset()  # identifier-like fields, shared through sys.intern
+    CHILDREN = {}  # key -> node class for list-valued children
+
+    def _load(self, data: dict):
+        if not isinstance(data, dict):
+            data = {}
+        self._keys = tuple(_intern(k) for k in data)
+        self.extra = None
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        for key, value in data.items():
+            if key in self.CHILDREN:
+                value = [self.CHILDREN[key].from_value(v) for v in value] if isinstance(value, list) else value
+                setattr(self, key, value)
+            elif key in self.FIELDS:
+                if key in self.INTERNED:
+                    value = _intern(value) if _hashable(value) else str(value)
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def has(self, key: str) -> bool:
+        return key in self._keys
+
+    def to_dict(self) -> dict:
+        out = {}
+        for key in self._keys:
+            if key in self.CHILDREN:
+                value = getattr(self, key)
+                out[key] = [child.to_value() for child in value] if isinstance(value, list) else value
+            elif key in self.FIELDS:
+                out[key] = getattr(self, key)
+            else:
+                out[key] = self.extra[key]
+        return out
+
+
+class Option(_Node):
+    """A choice option, matrix row/column or ranking item (dict or bare value)."""
+
+    __slots__ = ("code", "text", "routing", "plain")
+    FIELDS = ("code", "text", "routing")
+    INTERNED = frozenset({"routing"})
+
+    @classmethod
+    def from_value(cls, value) -> "Option":
+        opt = cls.__new__(cls)
+        if isinstance(value, dict):
+            opt._load(value)
+            opt.plain = False
+        else:
+            opt._keys = ()
+            opt.extra = None
+            opt.code = opt.routing = None
+            opt.text = value
+            opt.plain = True
+        return opt
+
+    def to_value(self):
+        return self.text if self.plain else self.to_dict()
+
+    @property
+    def label(self) -> str:
+        return "" if self.text is None else str(self.text)
+
+
+class Question(_Node):
+    __slots__ = (
+        "id", "type", "text", "instruction", "required", "randomize_options",
+        "options", "scale_min", "scale_max", "anchor_min", "anchor_max",
+        "rows", "columns", "items", "max_chars", "programming_note", "methodological_note",
+        "kind", "section",
+    )
+    FIELDS = (
+        "id", "type", "text", "instruction", "required", "randomize_options",
+        "options", "scale_min", "scale_max", "anchor_min", "anchor_max",
+        "rows", "columns", "items", "max_chars", "programming_note", "methodological_note",
+    )
+    INTERNED = frozenset({"id", "type"})
+    CHILDREN = {"options": Option, "rows": Option, "columns": Option, "items": Option}
+
+    @classmethod
+    def from_value(cls, value) -> "Question":
+        q = cls.__new__(cls)
+        q._load(value)
+        q.kind = _TYPES_BY_VALUE.get(q.type)
+        q.section = None
+        return q
+
+    def to_value(self) -> dict:
+        return self.to_dict()
+
+    def option_list(self) -> list:
+        return self.options if isinstance(self.options, list) else []
+
+
+class Section(_Node):
+    __slots__ = ("id", "title", "description", "questions")
+    FIELDS = ("id", "title", "description", "questions")
+    INTERNED = frozenset({"id"})
+    CHILDREN = {"questions": Question}
+
+    @classmethod
+    def from_value(cls, value) -> "Section":
+        s = cls.__new__(cls)
+        s._load(value)
+        for q in s.question_list():
+            q.section = s
+        return s
+
+    def to_value(self) -> dict:
+        return self.to_dict()
+
+    def question_list(self) -> list:
+        return self.questions if isinstance(self.questions, list) else []
+
+
+class Questionnaire(_Node):
+    __slots__ = ("project_summary", "sections", "methodological_notes", "_index", "_order")
+    FIELDS = ("project_summary", "sections", "methodological_notes")
+    CHILDREN = {"sections": Section}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Questionnaire":
+        qn = cls.__new__(cls)
+        qn._load(data)
+        qn.reindex()
+        return qn
+
+    def reindex(self):
+        """Rebuild the id -> question index and the question order."""
+        self._index = {}
+        self._order = []
+        for section in self.section_list():
+            for q in section.question_list():
+                if q.id is not None and q.id not in self._index:
+                    self._index[q.id] = len(self._order)
+                self._order.append(q)
+
+    def section_list(self) -> list:
+        return self.sections if isinstance(self.sections, list) else []
+
+    def questions(self) -> list:
+        """All questions in document order."""
+        return self._order
+
+    def question(self, qid):
+        """Return the question with id ``qid`` (or None) in O(1)."""
+        pos = self._index.get(qid)
+        return None if pos is None else self._order[pos]
+
+    def position(self, qid):
+        """Return the document-order position of question ``qid`` (or None)."""
+        return self._index.get(qid)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    @property
+    def summary(self) -> dict:
+        return self.project_summary if isinstance(self.project_summary, dict) else {}
+
+    @property
+    def notes(self) -> dict:
+        return self.methodological_notes if isinstance(self.methodological_notes, dict) else {}
@@ -0,0 +1,223 @@
+"""Routing / skip-logic validation over ``sections[].questions[].options[].routing``.
+
+Questions become graph nodes in document order plus a virtual END node. Each
+question falls through to the next one unless every option routes elsewhere;
+``TERMINATE`` goes to END. All checks are O(questions + options).
+"""
+
+import re
+from dataclasses import dataclass
+
+from questionnaire_model import Questionnaire, QuestionType
+
+CONTINUE_VALUES = frozenset({"", "CONTINUE", "CONTINUAR"})
+END_VALUES = frozenset({"TERMINATE", "END", "FIM", "ENCERRAR"})
+
+_TARGET_RE = re.compile(r"^(?:ir\s+para|pular\s+para|go\s*to|skip\s+to)?\s*[→>\-]*\s*(\S+?)\.?$", re.IGNORECASE)
+
+DANGLING = "dangling"
+BACKWARD = "backward"
+CYCLE = "cycle"
+UNREACHABLE = "unreachable"
+DEAD_END = "dead_end"
+DUPLICATE_ID = "duplicate_id"
+
+
+@dataclass(frozen=True)
+class RoutingIssue:
+    kind: str
+    question_id: str
+    message: str
+    target: str = ""
+
+
+def _resolve(routing, index: dict, sections: dict, end: int):
+    """Map a routing value to a node: None for fall-through, END, a position, or a raw string if unknown."""
+    if routing is None:
+        return None
+    value = str(routing).strip()
+    if value.upper() in CONTINUE_VALUES:
+        return None
+    if value.upper() in END_VALUES:
+        return end
+    match = _TARGET_RE.match(value)
+    target = match.group(1) if match else value
+    for candidate in (value, target):
+        if candidate in index:
+            return index[candidate]
+        if candidate in sections:
+            return sections[candidate]
+    return value
+
+
+def target_token(routing):
+    """Normalize a routing value: None (fall through), ``"TERMINATE"`` or the target id as written."""
+    if routing is None:
+        return None
+    value = str(routing).strip()
+    if value.upper() in CONTINUE_VALUES:
+        return None
+    if value.upper() in END_VALUES:
+        return "TERMINATE"
+    match = _TARGET_RE.match(value)
+    return match.group(1) if match else value
+
+
+def resolve_option_targets(model: Questionnaire) -> list:
+    """Resolve option routing per question.
+
+    Returns one list per question (document order) of ``(option, target)``
+    pairs for routed options, where ``target`` is None (fall through), END
+    (``len(questions)``), a question position, or the raw string when the
+    target does not exist.
+    """
+    questions = model.questions()
+    end = len(questions)
+    index = {}
+    sections = {}
+    for pos, q in enumerate(questions):
+        index.setdefault(q.id, pos)
+        if q.section is not None:
+            sections.setdefault(q.section.id, pos)
+    return [
+        [(opt, _resolve(opt.routing, index, sections, end)) for opt in q.option_list() if not opt.plain and opt.routing is not None]
+        for q in questions
+    ]
+
+
+def falls_through(question, routed: list) -> bool:
+    """True if some answer to ``question`` continues to the next question."""
+    # Multiple choice can tick a routed and a non-routed option at once, so it always falls through.
+    options = question.option_list()
+    if question.kind is QuestionType.MULTIPLE_CHOICE or len(routed) < len(options) or not options:
+        return True
+    return any(target is None or isinstance(target, str) for _, target in routed)
+
+
+def build_routing_graph(model: Questionnaire):
+    """Return ``(edges, issues)`` where ``edges[i]`` lists the successors of question ``i``."""
+    questions = model.questions()
+    issues = []
+
+    seen = set()
+    for q in questions:
+        if q.id in seen:
+            issues.append(RoutingIssue(DUPLICATE_ID, str(q.id), f"ID {q.id} repetido — o routing para ele é ambíguo."))
+        seen.add(q.id)
+
+    edges = []
+    for pos, (q, routed) in enumerate(zip(questions, resolve_option_targets(model))):
+        succ = set()
+        for opt, target in routed:
+            if isinstance(target, str):
+                issues.append(RoutingIssue(
+                    DANGLING, str(q.id), f"{q.id}: opção {opt.code} aponta para '{target}', que não existe.", target,
+                ))
+            elif target is not None:
+                if target <= pos:
+                    issues.append(RoutingIssue(
+                        BACKWARD, str(q.id),
+                        f"{q.id}: opção {opt.code} volta para {questions[target].id} (salto para trás).",
+                        str(questions[target].id),
+                    ))
+                succ.add(target)
+        if falls_through(q, routed):
+            succ.add(pos + 1)
+        edges.append(sorted(succ))
+    return edges, issues
+
+
+def _strongly_connected(edges: list, n: int) -> list:
+    """Iterative Tarjan; returns SCCs over nodes 0..n-1 (END excluded)."""
+    index_of = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack, sccs = [], []
+    counter = 0
+    for root in range(n):
+        if index_of[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                index_of[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            recurse = False
+            succ = edges[node]
+            while i < len(succ):
+                nxt = succ[i]
+                i += 1
+                if nxt >= n:
+                    continue
+                if index_of[nxt] == -1:
+                    work.append((node, i))
+                    work.append((nxt, 0))
+                    recurse = True
+                    break
+                if on_stack[nxt]:
+                    low[node] = min(low[node], index_of[nxt])
+            if recurse:
+                continue
+            if low[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                sccs.append(component)
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+    return sccs
+
+
+def validate_routing(questionnaire) -> list:
+    """Validate the routing of a questionnaire (dict or :class:`Questionnaire`). Returns a list of issues."""
+    model = questionnaire if isinstance(questionnaire, Questionnaire) else Questionnaire.from_dict(questionnaire)
+    questions = model.questions()
+    n = len(questions)
+    if n == 0:
+        return []
+    edges, issues = build_routing_graph(model)
+
+    for component in _strongly_connected(edges, n):
+        if len(component) > 1 or component[0] in edges[component[0]]:
+            ids = ", ".join(str(questions[i].id) for i in sorted(component))
+            issues.append(RoutingIssue(CYCLE, str(questions[min(component)].id), f"Loop de routing entre: {ids}."))
+
+    reached = [False] * (n + 1)
+    reached[0] = True
+    frontier = [0]
+    while frontier:
+        node = frontier.pop()
+        if node < n:
+            for nxt in edges[node]:
+                if not reached[nxt]:
+                    reached[nxt] = True
+                    frontier.append(nxt)
+
+    reverse = [[] for _ in range(n + 1)]
+    for node, succ in enumerate(edges):
+        for nxt in succ:
+            reverse[nxt].append(node)
+    finishes = [False] * (n + 1)
+    finishes[n] = True
+    frontier = [n]
+    while frontier:
+        node = frontier.pop()
+        for prev in reverse[node]:
+            if not finishes[prev]:
+                finishes[prev] = True
+                frontier.append(prev)
+
+    for pos, q in enumerate(questions):
+        if not reached[pos]:
+            issues.append(RoutingIssue(UNREACHABLE, str(q.id), f"{q.id} nunca é exibida (nenhum caminho chega até ela)."))
+        elif not finishes[pos]:
+            issues.append(RoutingIssue(DEAD_END, str(q.id), f"{q.id}: nenhum caminho a partir daqui termina o questionário."))
+    return issues
@@ -0,0 +1,372 @@
+"""Local validation and repair of questionnaire JSON returned by the model.
+
+The cheap path runs entirely locally: lenient JSON parsing (code fences,
+smart quotes, trailing commas, comments, truncated output) followed by a
+schema pass that fills defaults, fixes ids and numbering and drops malformed
+options. Only when the text still cannot be parsed is the broken fragment
+(not the whole questionnaire) sent back to the model for repair.
+"""
+
+import json
+import re
+
+from questionnaire_model import QuestionType
+from routing_validator import target_token
+
+VALID_TYPES = {t.value for t in QuestionType}
+TYPE_ALIASES = {
+    "single": "single_choice",
+    "radio": "single_choice",
+    "multiple": "multiple_choice",
+    "multi_choice": "multiple_choice",
+    "checkbox": "multiple_choice",
+    "scale": "scale_numeric",
+    "numeric_scale": "scale_numeric",
+    "likert": "scale_likert",
+    "open": "open_text",
+    "text": "open_text",
+    "open_ended": "open_text",
+    "grid": "matrix",
+    "rank": "ranking",
+}
+CHOICE_TYPES = ("single_choice", "multiple_choice")
+FRAGMENT_CONTEXT = 1500  # max chars sent for an LLM fragment repair
+
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_LINE_COMMENT_RE = re.compile(r'^(\s*)//.*$', re.MULTILINE)
+_PY_LITERALS = ((re.compile(r"(?<=[:\[,\s])True(?=\s*[,}\]])"), "true"),
+                (re.compile(r"(?<=[:\[,\s])False(?=\s*[,}\]])"), "false"),
+                (re.compile(r"(?<=[:\[,\s])None(?=\s*[,}\]])"), "null"))
+_SMART_QUOTES = frozenset("“”„")
+_QUESTION_START_RE = re.compile(r'\{\s*"(?:id|i)"\s*:')  # "i" is the short key (serialization.KEY_MAP)
+_STRING_RE = re.compile(r'("(?:[^"\\]|\\.)*(?:"|$))', re.DOTALL)  # a JSON string, or one cut off at the end
+
+
+class SchemaError(ValueError):
+    """The response could not be turned into a usable questionnaire."""
+
+
+def _json_body(text: str) -> str:
+    match = _FENCE_RE.search(text)
+    if match and "{" in match.group(1):
+        text = match.group(1)
+    start = text.find("{")
+    if start == -1:
+        raise SchemaError("Não foi possível extrair JSON da resposta do modelo.")
+    end = text.rfind("}")
+    return text[start:] if end < start else text[start : end + 1]
+
+
+def _close_truncated(text: str) -> str:
+    """Close strings and brackets left open by a truncated response."""
+    stack = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = _outside_strings(text.rstrip().rstrip(",") + "".join(reversed(stack)), _drop_trailing_commas)
+    return text
+
+
+def _outside_strings(text: str, fix) -> str:
+    """Apply ``fix`` to the text between JSON strings only, so question text is never rewritten."""
+    parts = _STRING_RE.split(text)
+    parts[::2] = [fix(part) for part in parts[::2]]  # odd indices are the strings themselves
+    return "".join(parts)
+
+
+def _drop_trailing_commas(text: str) -> str:
+    return _TRAILING_COMMA_RE.sub(r"\1", text)
+
+
+def _fix_literals_and_commas(text: str) -> str:
+    for pattern, replacement in _PY_LITERALS:
+        text = pattern.sub(replacement, text)
+    return _drop_trailing_commas(text)
+
+
+def _straighten_quotes(text: str) -> str:
+    """Turn curly quotes into ``"`` where they delimit strings; inside a string they are text and stay."""
+    out = []
+    in_string = escaped = False
+    opener = '"'
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"' or (opener in _SMART_QUOTES and ch in _SMART_QUOTES):
+                in_string = False
+                ch = '"'
+        elif ch == '"' or ch in _SMART_QUOTES:
+            in_string, opener = True, ch
+            ch = '"'
+        out.append(ch)
+    return "".join(out)
+
+
+def _local_text_fixes(text: str) -> str:
+    text = _straighten_quotes(text)
+    text = _LINE_COMMENT_RE.sub(r"\1", text)
+    text = _outside_strings(text, _fix_literals_and_commas)
+    return _close_truncated(text)
+
+
+def loads_lenient(text: str) -> dict:
+    """Parse model output as JSON, applying local text fixes if needed.
+
+    Raises :class:`json.JSONDecodeError` (against the fixed text) when the
+    local fixes are not enough.
+    """
+    body = _json_body(text)
+    try:
+        return json.loads(body)
+    except json.JSONDecodeError:
+        pass
+    fixed = _local_text_fixes(body)
+    return json.loads(fixed)
+
+
+def _fragment_bounds(text: str, pos: int) -> tuple:
+    """Span of the question object around ``pos`` (or a window around it)."""
+    starts = [m.start() for m in _QUESTION_START_RE.finditer(text)]
+    before = [s for s in starts if s <= pos]
+    after = [s for s in starts if s > pos]
+    lo = before[-1] if before else max(0, pos - FRAGMENT_CONTEXT // 2)
+    hi = after[0] if after else min(len(text), pos + FRAGMENT_CONTEXT // 2)
+    if hi - lo > FRAGMENT_CONTEXT:
+        lo, hi = max(lo, pos - FRAGMENT_CONTEXT // 2), min(hi, pos + FRAGMENT_CONTEXT // 2)
+    return lo, hi
+
+
+def repair_with_model(text: str, error: json.JSONDecodeError, fix_fragment) -> dict:
+    """Send only the broken fragment to ``fix_fragment(fragment) -> str`` and splice the answer back."""
+    body = _local_text_fixes(_json_body(text))
+    lo, hi = _fragment_bounds(body, error.pos)
+    fixed = fix_fragment(body[lo:hi]).strip()
+    match = _FENCE_RE.search(fixed)
+    if match:
+        fixed = match.group(1)
+    return json.loads(_local_text_fixes(body[:lo] + fixed + body[hi:]))
+
+
+def _as_dict(value, fixes: list, label: str) -> dict:
+    if isinstance(value, dict):
+        return value
+    if value not in (None, "", [], {}):
+        fixes.append(f"{label}: valor inválido substituído por objeto vazio.")
+    return {}
+
+
+def _clean_options(q: dict, fixes: list):
+    options = q.get("options")
+    if options is None:
+        return
+    if not isinstance(options, list):
+        fixes.append(f"{q['id']}: 'options' não era uma lista e foi removido.")
+        del q["options"]
+        return
+    cleaned, seen_texts = [], set()
+    for opt in options:
+        if isinstance(opt, (int, float)) and not isinstance(opt, bool):
+            opt = str(opt)
+        if isinstance(opt, str):
+            text = opt.strip()
+        elif isinstance(opt, dict):
+            raw = opt.get("text", opt.get("label"))
+            text = str(raw).strip() if raw is not None else ""
+            if text and "text" not in opt:
+                opt = {**opt, "text": text}
+                opt.pop("label", None)
+        else:
+            text = ""
+        if not text or text.lower() in seen_texts:
+            fixes.append(f"{q['id']}: opção inválida ou repetida removida.")
+            continue
+        seen_texts.add(text.lower())
+        cleaned.append(opt)
+
+    if q.get("type") in CHOICE_TYPES:
+        # Valid unique codes stay (99 = "Não sei" and the like are conventions); only the rest get new ones.
+        taken, invalid = set(), []
+        for opt in (o for o in cleaned if isinstance(o, dict)):
+            code = opt.get("code")
+            if isinstance(code, str) and code.strip().isdigit():
+                code = int(code)
+            if isinstance(code, int) and not isinstance(code, bool) and code not in taken:
+                taken.add(code)
+                opt["code"] = code
+            else:
+                invalid.append(opt)
+        if invalid:
+            first = max(taken, default=0) + 1
+            for code, opt in enumerate(invalid, first):
+                opt["code"] = code
+            fixes.append(f"{q['id']}: {len(invalid)} código(s) ausente(s) ou repetido(s) renumerado(s) a partir de {first}.")
+    q["options"] = cleaned
+
+
+def _fix_question_type(q: dict, fixes: list):
+    q_type = str(q.get("type") or "").strip().lower()
+    q_type = TYPE_ALIASES.get(q_type, q_type)
+    if q_type not in VALID_TYPES:
+        q_type = "single_choice" if q.get("options") else "open_text"
+        fixes.append(f"{q.get('id', '?')}: tipo '{q.get('type')}' inválido, assumido '{q_type}'.")
+    q["type"] = q_type
+    if q_type in ("scale_numeric", "nps"):
+        for key, default in (("scale_min", 0), ("scale_max", 10)):
+            value = q.get(key, default)
+            try:
+                q[key] = int(value)
+            except (TypeError, ValueError):
+                q[key] = default
+                fixes.append(f"{q.get('id', '?')}: '{key}' inválido, usado {default}.")
+        if q["scale_min"] > q["scale_max"]:
+            q["scale_min"], q["scale_max"] = q["scale_max"], q["scale_min"]
+            fixes.append(f"{q.get('id', '?')}: escala invertida corrigida.")
+
+
+def _retarget_duplicates(questions: list, copies: dict, fixes: list):
+    """Point routing at the renumbered copy of a duplicated id when that is the copy it can reach.
+
+    Routing only moves forward, so a reference to a repeated id from a given
+    question means the first copy after it; references with no copy ahead
+    are left for the routing validator.
+    """
+    for pos, q in enumerate(questions):
+        for opt in q.get("options") or []:
+            if not isinstance(opt, dict):
+                continue
+            token = target_token(opt.get("routing"))
+            if token not in copies:
+                continue
+            ahead = [new_id for copy_pos, new_id in copies[token] if copy_pos > pos]
+            if ahead and ahead[0] != token:
+                routing = str(opt["routing"])
+                at = routing.rfind(token)
+                opt["routing"] = routing[:at] + ahead[0] + routing[at + len(token):]
+                fixes.append(f"{q['id']}: routing para {token} apontado para a cópia renumerada {ahead[0]}.")
+
+
+def repair_questionnaire(data) -> tuple:
+    """Validate and repair a questionnaire dict in place. Returns ``(data, fixes)``.
+
+    Raises :class:`SchemaError` when there is nothing usable (no questions).
+    """
+    if isinstance(data, list):
+        data = {"sections": data}
+    if not isinstance(data, dict):
+        raise SchemaError("A resposta do modelo não é um objeto JSON.")
+    fixes = []
+    data["project_summary"] = _as_dict(data.get("project_summary"), fixes, "project_summary")
+    data["methodological_notes"] = _as_dict(data.get("methodological_notes"), fixes, "methodological_notes")
+
+    sections = data.get("sections")
+    if not isinstance(sections, list):
+        raise SchemaError("O questionário não tem a lista 'sections'.")
+
+    seen_section_ids, seen_question_ids = set(), set()
+    copies = {}  # question id as written -> [(position, id after repair)]
+    kept_sections, kept_count = [], 0
+    for sec in sections:
+        if not isinstance(sec, dict) or not isinstance(sec.get("questions"), list):
+            fixes.append("Seção malformada removida.")
+            continue
+        sec_num = len(kept_sections) + 1
+        sec_id = str(sec.get("id") or "").strip()
+        if not sec_id or sec_id in seen_section_ids:
+            sec_id = f"S{sec_num}"
+            while sec_id in seen_section_ids:
+                sec_num += 1
+                sec_id = f"S{sec_num}"
+            fixes.append(f"Seção sem ID válido renomeada para {sec_id}.")
+        sec["id"] = sec_id  # ids written as numbers or lists become strings
+        seen_section_ids.add(sec_id)
+        if not sec.get("title"):
+            sec["title"] = f"Seção {len(kept_sections) + 1}"
+            fixes.append(f"{sec_id}: título ausente preenchido.")
+
+        kept_questions = []
+        for q in sec["questions"]:
+            if not isinstance(q, dict) or not str(q.get("text") or "").strip():
+                fixes.append(f"{sec_id}: pergunta sem texto removida.")
+                continue
+            old_id = q.get("id")
+            q_id = str(old_id or "").strip()
+            written = q_id
+            if not q_id or q_id in seen_question_ids:
+                k = len(kept_questions) + 1
+                q_id = f"{sec_id}_Q{k}"
+                while q_id in seen_question_ids:
+                    k += 1
+                    q_id = f"{sec_id}_Q{k}"
+                fixes.append(f"Pergunta {old_id or 'sem ID'} renumerada para {q_id}.")
+            q["id"] = q_id
+            seen_question_ids.add(q_id)
+            if written:
+                copies.setdefault(written, []).append((kept_count + len(kept_questions), q_id))
+            _fix_question_type(q, fixes)
+            if not isinstance(q.get("required", True), bool):
+                q["required"] = True
+            _clean_options(q, fixes)
+            kept_questions.append(q)
+        sec["questions"] = kept_questions
+        if kept_questions:
+            kept_sections.append(sec)
+            kept_count += len(kept_questions)
+        else:
+            fixes.append(f"{sec_id}: seção sem perguntas removida.")
+
+    if not kept_sections:
+        raise SchemaError("O questionário não tem nenhuma pergunta válida.")
+    data["sections"] = kept_sections
+    renamed = {written: ids for written, ids in copies.items() if any(new_id != written for _, new_id in ids)}
+    if renamed:
+        _retarget_duplicates([q for sec in kept_sections for q in sec["questions"]], renamed, fixes)
+
+    total = sum(len(sec["questions"]) for sec in kept_sections)
+    if data["project_summary"].get("total_questions") != total:
+        data["project_summary"]["total_questions"] = total
+    return data, fixes
+
+
+def parse_and_repair(text: str, fix_fragment=None, transform=None) -> tuple:
+    """Turn raw model output into ``(questionnaire, fixes)``.
+
+    ``fix_fragment`` is an optional ``callable(fragment) -> str`` used only
+    when local parsing fails; it should ask the model to repair that fragment.
+    ``transform`` is applied to the parsed JSON before the schema repair
+    (e.g. ``serialization.expand_keys``).
+    """
+    body = _json_body(text)
+    notes = []
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError:
+        try:
+            data = json.loads(_local_text_fixes(body))
+            notes.append("Sintaxe do JSON corrigida localmente.")
+        except json.JSONDecodeError as e:
+            if fix_fragment is None:
+                raise
+            data = repair_with_model(text, e, fix_fragment)
+            notes.append("Trecho com JSON inválido corrigido pelo modelo.")
+    if transform is not None:
+        data = transform(data)
+    data, fixes = repair_questionnaire(data)
+    return data, notes + fixes
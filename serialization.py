@@ -0,0 +1,139 @@
+"""Questionnaire serialization modes.
+
+- ``pretty``: indented JSON for the UI and downloads (orjson when installed).
+- ``compact``: minified JSON.
+- ``llm``: minified JSON with short keys (see ``KEY_MAP``) for prompts;
+  :func:`expand_keys` maps it back losslessly.
+
+:class:`SerializationCache` memoizes the strings per questionnaire version,
+so reruns do not re-serialize the same tree.
+"""
+
+import json
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+PRETTY = "pretty"
+COMPACT = "compact"
+LLM = "llm"
+
+KEY_MAP = {
+    "project_summary": "ps",
+    "research_objective": "ro",
+    "target_audience": "ta",
+    "methodology": "me",
+    "estimated_loi_minutes": "loi",
+    "total_questions": "tq",
+    "platform_notes": "pn",
+    "sections": "S",
+    "id": "i",
+    "title": "ti",
+    "description": "de",
+    "questions": "Q",
+    "type": "t",
+    "text": "x",
+    "instruction": "in",
+    "required": "rq",
+    "randomize_options": "rz",
+    "options": "o",
+    "code": "c",
+    "routing": "r",
+    "scale_min": "mn",
+    "scale_max": "mx",
+    "anchor_min": "an",
+    "anchor_max": "ax",
+    "rows": "rw",
+    "columns": "co",
+    "items": "it",
+    "max_chars": "mc",
+    "programming_note": "pg",
+    "methodological_note": "mt",
+    "methodological_notes": "MN",
+    "sampling": "sa",
+    "quotas": "qu",
+    "biases_mitigated": "bm",
+    "limitations": "li",
+}
+_LONG_BY_SHORT = {short: long for long, short in KEY_MAP.items()}
+_ESCAPE = "~"  # prefixes original keys that would collide with a short key
+
+KEY_LEGEND = ", ".join(f"{short}={long}" for long, short in KEY_MAP.items())
+
+
+def _shorten_key(key):
+    if not isinstance(key, str):
+        return key
+    if key in KEY_MAP:
+        return KEY_MAP[key]
+    if key in _LONG_BY_SHORT or key.startswith(_ESCAPE):
+        return _ESCAPE + key
+    return key
+
+
+def _expand_key(key):
+    if not isinstance(key, str):
+        return key
+    if key.startswith(_ESCAPE):
+        return key[1:]
+    return _LONG_BY_SHORT.get(key, key)
+
+
+def _map_keys(value, fn):
+    if isinstance(value, dict):
+        return {fn(k): _map_keys(v, fn) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_map_keys(v, fn) for v in value]
+    return value
+
+
+def shorten_keys(data):
+    """Replace schema keys with their short forms (lossless, see :func:`expand_keys`)."""
+    return _map_keys(data, _shorten_key)
+
+
+def expand_keys(data):
+    """Inverse of :func:`shorten_keys`. Data with long keys passes through unchanged."""
+    return _map_keys(data, _expand_key)
+
+
+def dumps(data, mode: str = PRETTY) -> str:
+    if mode == PRETTY:
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+            except TypeError:
+                pass  # e.g. non-string keys or huge ints: json handles them
+        return json.dumps(data, ensure_ascii=False, indent=2)
+    if mode == COMPACT:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    if mode == LLM:
+        return json.dumps(shorten_keys(data), ensure_ascii=False, separators=(",", ":"))
+    raise ValueError(f"Modo de serialização desconhecido: {mode}")
+
+
+class SerializationCache:
+    """Bounded cache of serialized strings keyed by (version id, mode)."""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def dumps(self, data, version, mode: str = PRETTY) -> str:
+        if version is None:
+            return dumps(data, mode)
+        key = (version, mode)
+        text = self._data.get(key)
+        if text is None:
+            text = self._data[key] = dumps(data, mode)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        else:
+            self._data.move_to_end(key)
+        return text
+
+    def clear(self):
+        self._data.clear()
@@ -0,0 +1,339 @@
+"""Server-side session persistence with compact serialization.
+
+Values are encoded with msgpack + zstd when those packages are installed and
+with JSON + zlib otherwise; a two-byte header records the format, so either
+side can read what the other wrote. ``st.session_state`` keeps only handles
+(``"<session_id>/<key>"``) and small flags; the decoded working state of the
+most recently active sessions lives in a bounded :class:`LiveSessions` LRU
+shared by the process, and the rest is loaded from the store on demand, so
+idle tabs cost almost nothing and a restarted pod restores sessions lazily
+from disk or SQLite.
+
+Sessions are found again through a signed token (:meth:`SessionStore.sign`)
+rather than a bare id, optionally bound to a per-browser value such as a
+cookie, so a token cannot be forged and a leaked URL does not open the
+session in another browser.
+
+Pick the backend with ``QD_SESSION_STORE``: ``memory``, ``disk:<dir>`` or
+``sqlite:<file>`` (default ``sqlite:~/.questionnaire-designer/sessions.db``).
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+DEFAULT_STORE = "sqlite:" + os.path.join(os.path.expanduser("~"), ".questionnaire-designer", "sessions.db")
+ZSTD_LEVEL = 6
+ZLIB_LEVEL = 6
+PURGE_INTERVAL_SECONDS = 3600.0
+META_SESSION = "_meta"  # store-wide values (the token secret); never purged
+
+
+def encode(value) -> bytes:
+    """Serialize and compress ``value`` (JSON-compatible data)."""
+    if msgpack is not None:
+        kind, raw = b"M", msgpack.packb(value, use_bin_type=True)
+    else:
+        kind, raw = b"J", json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if zstandard is not None:
+        return kind + b"Z" + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return kind + b"z" + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decode(blob: bytes):
+    kind, compression, payload = blob[:1], blob[1:2], blob[2:]
+    if compression == b"Z":
+        if zstandard is None:
+            raise RuntimeError("Sessão gravada com zstd, mas o pacote 'zstandard' não está instalado.")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raw = zlib.decompress(payload)
+    if kind == b"M":
+        if msgpack is None:
+            raise RuntimeError("Sessão gravada com msgpack, mas o pacote 'msgpack' não está instalado.")
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw.decode("utf-8"))
+
+
+def make_handle(session_id: str, key: str) -> str:
+    return f"{session_id}/{key}"
+
+
+def split_handle(handle: str) -> tuple:
+    session_id, _, key = handle.partition("/")
+    return session_id, key
+
+
+class SessionStore:
+    """Base class: backends implement the ``_put/_get/_keys/_delete/_purge`` blob methods."""
+
+    _secret = None
+    _last_purge = 0.0
+    _purge_lock = threading.Lock()
+
+    def save(self, session_id: str, key: str, value) -> str:
+        """Persist ``value`` and return its handle."""
+        self._put(session_id, key, encode(value), time.time())
+        return make_handle(session_id, key)
+
+    def load(self, handle: str, default=None):
+        blob = self._get(*split_handle(handle))
+        return default if blob is None else decode(blob)
+
+    def handles(self, session_id: str) -> dict:
+        """Return ``{key: handle}`` for everything stored under ``session_id``."""
+        return {key: make_handle(session_id, key) for key in self._keys(session_id)}
+
+    def delete(self, session_id: str):
+        self._delete(session_id)
+
+    def purge(self, max_age_seconds: float) -> int:
+        """Drop whole sessions with no write for ``max_age_seconds``. Returns how many entries were removed.
+
+        A session's keys go together, so a reload never finds half a session
+        (e.g. a history without its questionnaire).
+        """
+        return self._purge(time.time() - max_age_seconds)
+
+    def purge_if_due(self, max_age_seconds: float, interval: float = PURGE_INTERVAL_SECONDS) -> int:
+        """:meth:`purge` at most once per ``interval`` seconds; cheap enough to call on every rerun."""
+        with self._purge_lock:
+            now = time.time()
+            if now - self._last_purge < interval:
+                return 0
+            self._last_purge = now
+        return self.purge(max_age_seconds)
+
+    def secret(self) -> bytes:
+        """Token key: ``QD_SESSION_SECRET``, else a random one kept in the store so tokens survive restarts."""
+        if self._secret is None:
+            secret = os.environ.get("QD_SESSION_SECRET", "").encode("utf-8")
+            if not secret:
+                secret = self._get(META_SESSION, "secret")
+                if secret is None:
+                    secret = secrets.token_bytes(32)
+                    self._put(META_SESSION, "secret", secret, time.time())
+            self._secret = secret
+        return self._secret
+
+    def sign(self, session_id: str, binding: str = "") -> str:
+        """Token for ``session_id``, valid only with the same ``binding`` (e.g. a browser cookie)."""
+        mac = hmac.new(self.secret(), f"{session_id}|{binding}".encode("utf-8"), hashlib.sha256)
+        return f"{session_id}.{mac.hexdigest()[:32]}"
+
+    def verify(self, token: str, binding: str = "") -> str:
+        """The session id in ``token`` if it was signed here for ``binding``, else None."""
+        session_id, _, _ = (token or "").partition(".")
+        if session_id and session_id != META_SESSION and hmac.compare_digest(self.sign(session_id, binding), token):
+            return session_id
+        return None
+
+
+class MemoryStore(SessionStore):
+    """Process-local store (compressed blobs, lost on restart)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _put(self, session_id, key, blob, ts):
+        with self._lock:
+            self._data[(session_id, key)] = (blob, ts)
+
+    def _get(self, session_id, key):
+        entry = self._data.get((session_id, key))
+        return entry[0] if entry else None
+
+    def _keys(self, session_id):
+        with self._lock:
+            return [k for sid, k in self._data if sid == session_id]
+
+    def _delete(self, session_id):
+        with self._lock:
+            for entry in [e for e in self._data if e[0] == session_id]:
+                del self._data[entry]
+
+    def _purge(self, cutoff):
+        with self._lock:
+            last_write = {}
+            for (sid, _), (_, ts) in self._data.items():
+                last_write[sid] = max(ts, last_write.get(sid, ts))
+            expired = {sid for sid, ts in last_write.items() if ts < cutoff and sid != META_SESSION}
+            stale = [e for e in self._data if e[0] in expired]
+            for entry in stale:
+                del self._data[entry]
+        return len(stale)
+
+
+class DiskStore(SessionStore):
+    """One directory per session, one file per key."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, session_id, key=None):
+        safe_sid = "".join(c for c in session_id if c.isalnum() or c in "-_")
+        base = os.path.join(self.root, safe_sid)
+        return base if key is None else os.path.join(base, "".join(c for c in key if c.isalnum() or c in "-_") + ".bin")
+
+    def _put(self, session_id, key, blob, ts):
+        path = self._path(session_id, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+    def _get(self, session_id, key):
+        try:
+            with open(self._path(session_id, key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _keys(self, session_id):
+        try:
+            names = os.listdir(self._path(session_id))
+        except FileNotFoundError:
+            return []
+        return [n[:-4] for n in names if n.endswith(".bin")]
+
+    def _delete(self, session_id):
+        base = self._path(session_id)
+        for name in self._keys(session_id):
+            os.remove(os.path.join(base, name + ".bin"))
+        try:
+            os.rmdir(base)
+        except OSError:
+            pass
+
+    def _purge(self, cutoff):
+        removed = 0
+        for sid in os.listdir(self.root):
+            base = os.path.join(self.root, sid)
+            if sid == META_SESSION or not os.path.isdir(base):
+                continue
+            paths = [os.path.join(base, name) for name in os.listdir(base)]
+            if any(os.path.getmtime(path) >= cutoff for path in paths):
+                continue
+            for path in paths:
+                os.remove(path)
+                removed += 1
+            try:
+                os.rmdir(base)
+            except OSError:
+                pass  # a write raced in; the session lives on
+        return removed
+
+
+class SQLiteStore(SessionStore):
+    """Single-file store; safe to share between the app's threads."""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_blobs ("
+                " session_id TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (session_id, key))"
+            )
+
+    def _put(self, session_id, key, blob, ts):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_blobs (session_id, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, key, blob, ts),
+            )
+
+    def _get(self, session_id, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM session_blobs WHERE session_id = ? AND key = ?", (session_id, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _keys(self, session_id):
+        with self._lock:
+            rows = self._conn.execute("SELECT key FROM session_blobs WHERE session_id = ?", (session_id,)).fetchall()
+        return [r[0] for r in rows]
+
+    def _delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_blobs WHERE session_id = ?", (session_id,))
+
+    def _purge(self, cutoff):
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM session_blobs WHERE session_id IN ("
+                " SELECT session_id FROM session_blobs WHERE session_id != ?"
+                " GROUP BY session_id HAVING MAX(updated_at) < ?)",
+                (META_SESSION, cutoff),
+            ).rowcount
+
+
+class LiveSessions:
+    """Decoded working state of the most recently used sessions, one dict each (LRU).
+
+    Most of a session's dict is persisted in the store (questionnaire, chat,
+    history) or derived from it (model, serializations, exports), and an
+    evicted session reloads those on its next rerun. Generation variants,
+    translations and the translation memory are deliberately not persisted
+    (variants carry API keys; both are cheap to regenerate) and are lost on
+    eviction; the app labels them as temporary.
+    """
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max(1, max_sessions)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> dict:
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+            if state is None:
+                state = {}
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return state
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+def open_store(spec: str = None) -> SessionStore:
+    """Build a store from a ``QD_SESSION_STORE``-style spec."""
+    spec = spec or os.environ.get("QD_SESSION_STORE", DEFAULT_STORE)
+    kind, _, location = spec.partition(":")
+    if kind == "memory":
+        return MemoryStore()
+    if kind == "disk":
+        return DiskStore(os.path.expanduser(location))
+    if kind == "sqlite":
+        return SQLiteStore(os.path.expanduser(location))
+    raise ValueError(f"QD_SESSION_STORE inválido: {spec}")
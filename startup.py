@@ -0,0 +1,115 @@
+"""Cold-start profiling, background warm-up and the startup budget.
+
+``python startup.py`` measures cold imports in fresh interpreters and exits
+non-zero when any module goes over its budget in ``STARTUP_BUDGET_MS``.
+"""
+
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Cold import budget (ms) for modules on the app's critical path. Heavy
+# dependencies (python-docx, parsers, numpy, provider SDKs) are loaded by schedule_warmup()
+# after first paint and are deliberately absent here.
+STARTUP_BUDGET_MS = {
+    "prompts": 20,
+    "document_parser": 60,
+    "llm_client": 60,
+    "startup": 40,
+}
+
+WARMUP_MODULES = ("pdfplumber", "docx", "pptx", "openpyxl", "numpy")
+MAX_WARMED = 64  # (provider, key digest) pairs remembered as already warmed
+
+TIMINGS = {}  # phase name -> elapsed ms, first script run of the process only
+_t0 = time.perf_counter()
+_warmup_lock = threading.Lock()
+_warmed = OrderedDict()  # (provider, sha256 of the API key) -> None, LRU; never the key itself
+
+
+@contextmanager
+def phase(name: str):
+    """Time a startup phase. Only the first measurement per process is kept."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TIMINGS.setdefault(name, (time.perf_counter() - start) * 1000)
+
+
+def mark(name: str):
+    """Record the elapsed time since this module was first imported."""
+    TIMINGS.setdefault(name, (time.perf_counter() - _t0) * 1000)
+
+
+def _warm_up(provider: str, api_key: str):
+    for module in WARMUP_MODULES:
+        with phase(f"warmup:import {module}"):
+            try:
+                __import__(module)
+            except ImportError:
+                pass
+    with phase("warmup:docx template"):
+        from docx_generator import base_template
+
+        base_template()
+    if api_key:
+        with phase("warmup:llm client"):
+            from llm_client import get_client
+
+            try:
+                get_client(provider, api_key)
+            except Exception:
+                pass  # surfaced properly on the first real call
+
+
+def schedule_warmup(provider: str, api_key: str = "") -> bool:
+    """Start the background warm-up once per (provider, api_key). Returns True if started."""
+    key = (provider, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest())
+    with _warmup_lock:
+        if key in _warmed:
+            _warmed.move_to_end(key)
+            return False
+        _warmed[key] = None
+        while len(_warmed) > MAX_WARMED:
+            _warmed.popitem(last=False)
+    threading.Thread(target=_warm_up, args=(provider, api_key), name="qd-warmup", daemon=True).start()
+    return True
+
+
+def measure_import_ms(module: str) -> float:
+    """Import ``module`` in a fresh interpreter and return the cold import time in ms."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def check_startup_budget(budget: dict = None, runs: int = 3) -> dict:
+    """Return ``{module: (best_ms, budget_ms)}`` for every module over budget."""
+    budget = budget or STARTUP_BUDGET_MS
+    violations = {}
+    for module, limit in budget.items():
+        best = min(measure_import_ms(module) for _ in range(runs))
+        if best > limit:
+            violations[module] = (best, limit)
+    return violations
+
+
+if __name__ == "__main__":
+    over = check_startup_budget()
+    for module, (best, limit) in over.items():
+        print(f"{module}: {best:.1f} ms (budget {limit} ms)")
+    print("startup budget OK" if not over else f"{len(over)} module(s) over budget")
+    sys.exit(1 if over else 0)
@@ -0,0 +1,184 @@
+"""Batch translation of a questionnaire into other languages.
+
+Only the respondent-facing strings leave the tree: question ``text`` and
+``instruction``, scale anchors, option texts, matrix rows / columns and
+ranking items, plus section titles and descriptions. IDs, codes, routing
+and the programming / methodological notes (written for the team, not the
+respondent) stay as they are. Repeated strings (Likert labels, "Não sei")
+are sent once, in batches that run concurrently across all target
+languages, and every translation is written back into a copy of the
+original dict, so each language version has exactly the same structure and
+exports through :func:`docx_generator.generate_questionnaire_docx`.
+"""
+
+import copy
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from llm_client import call_llm_with_stats
+from prompts import TRANSLATION_PROMPT, TRANSLATION_SYSTEM_PROMPT
+from schema_repair import loads_lenient
+
+LANGUAGES = {"pt": "Português", "es": "Español", "en": "English"}
+LANGUAGE_NAMES = {"pt": "português do Brasil", "es": "espanhol latino-americano", "en": "inglês"}  # for the prompt
+SOURCE_LANGUAGE = "pt"
+BATCH_MAX_STRINGS = 80
+BATCH_MAX_CHARS = 6000
+MAX_CONCURRENT_BATCHES = 6
+
+SECTION_FIELDS = ("title", "description")
+QUESTION_FIELDS = ("text", "instruction", "anchor_min", "anchor_max")
+QUESTION_LISTS = ("options", "rows", "columns", "items", "scale_points")
+
+_LETTER_RE = re.compile(r"[^\W\d_]")
+
+
+@dataclass
+class Translation:
+    language: str
+    data: dict
+    strings: int = 0  # unique translatable strings in the questionnaire
+    requested: int = 0  # sent to the model; the rest came from the translation memory
+    batches: int = 0
+    missing: list = field(default_factory=list)  # left in the source language
+    errors: list = field(default_factory=list)
+    stats: list = field(default_factory=list)  # CallStats per model call
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.errors
+
+
+def _fields(node: dict, keys: tuple):
+    for key in keys:
+        value = node.get(key)
+        if isinstance(value, str) and _LETTER_RE.search(value):
+            yield node, key
+
+
+def _slots(data: dict):
+    """``(container, key)`` for every translatable string, in document order."""
+    for section in data.get("sections") or []:
+        if not isinstance(section, dict):
+            continue
+        yield from _fields(section, SECTION_FIELDS)
+        for q in section.get("questions") or []:
+            if not isinstance(q, dict):
+                continue
+            yield from _fields(q, QUESTION_FIELDS)
+            for key in QUESTION_LISTS:
+                values = q.get(key)
+                if not isinstance(values, list):
+                    continue
+                for i, value in enumerate(values):
+                    if isinstance(value, dict):
+                        yield from _fields(value, ("text",))
+                    elif isinstance(value, str) and _LETTER_RE.search(value):
+                        yield values, i
+
+
+def extract_strings(data: dict) -> list:
+    """Unique translatable strings, in order of first appearance."""
+    return list(dict.fromkeys(container[key] for container, key in _slots(data)))
+
+
+def apply_translations(data: dict, mapping: dict) -> dict:
+    """Copy of ``data`` with every translatable string replaced through ``mapping`` (missing ones kept)."""
+    data = copy.deepcopy(data)
+    for container, key in _slots(data):
+        container[key] = mapping.get(container[key], container[key])
+    return data
+
+
+def batches(strings: list, max_strings: int = BATCH_MAX_STRINGS, max_chars: int = BATCH_MAX_CHARS) -> list:
+    """Split ``strings`` into consecutive batches bounded by count and total length."""
+    out, current, size = [], [], 0
+    for s in strings:
+        if current and (len(current) >= max_strings or size + len(s) > max_chars):
+            out.append(current)
+            current, size = [], 0
+        current.append(s)
+        size += len(s)
+    if current:
+        out.append(current)
+    return out
+
+
+def translate_batch(provider: str, api_key: str, strings: list, target: str, source: str = SOURCE_LANGUAGE) -> tuple:
+    """Translate one batch. Returns ``(mapping, stats)``; strings the model skipped are not in ``mapping``."""
+    numbered = {str(i): s for i, s in enumerate(strings, 1)}
+    prompt = TRANSLATION_PROMPT.format(
+        source=LANGUAGE_NAMES.get(source, source), target=LANGUAGE_NAMES.get(target, target),
+        strings=json.dumps(numbered, ensure_ascii=False, indent=0),
+    )
+    text, stats = call_llm_with_stats(provider, api_key, prompt, system_prompt=TRANSLATION_SYSTEM_PROMPT)
+    answer = loads_lenient(text)
+    mapping = {}
+    for key, original in numbered.items():
+        value = answer.get(key) if isinstance(answer, dict) else None
+        if isinstance(value, str) and value.strip():
+            mapping[original] = value.strip()
+    return mapping, stats
+
+
+def _run_job(provider, api_key, target, source, batch) -> tuple:
+    """One batch plus a single retry for the strings the model skipped. Returns ``(mapping, stats, error)``."""
+    mapping, stats, error = {}, [], ""
+    pending = batch
+    for _ in range(2):
+        try:
+            found, call_stats = translate_batch(provider, api_key, pending, target, source)
+        except Exception as e:
+            error = str(e)
+            break
+        stats.append(call_stats)
+        mapping.update(found)
+        pending = [s for s in pending if s not in mapping]
+        if not pending:
+            break
+    return mapping, stats, error
+
+
+def translate_questionnaire(data: dict, targets, provider: str, api_key: str, source: str = SOURCE_LANGUAGE,
+                            memory: dict = None) -> dict:
+    """Translate ``data`` into each language in ``targets``. Returns ``{language: Translation}``.
+
+    ``memory`` maps ``(language, source string)`` to a translation; hits are
+    not sent again and new translations are added to it, so re-translating
+    after a refinement only pays for the strings that changed.
+    """
+    memory = {} if memory is None else memory
+    strings = extract_strings(data)
+    results, jobs = {}, []
+    for target in dict.fromkeys(targets):
+        results[target] = Translation(target, data=None, strings=len(strings))
+        if target == source:
+            continue
+        pending = [s for s in strings if (target, s) not in memory]
+        results[target].requested = len(pending)
+        for batch in batches(pending):
+            jobs.append((target, batch))
+            results[target].batches += 1
+
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_BATCHES, len(jobs)), thread_name_prefix="qd-translate") as pool:
+            done = list(pool.map(lambda job: _run_job(provider, api_key, job[0], source, job[1]), jobs))
+        for (target, batch), (mapping, stats, error) in zip(jobs, done):
+            result = results[target]
+            result.stats.extend(stats)
+            if error:
+                result.errors.append(error)
+            for s in batch:
+                if s in mapping:
+                    memory[(target, s)] = mapping[s]
+                else:
+                    result.missing.append(s)
+
+    for target, result in results.items():
+        if target == source:
+            result.data = copy.deepcopy(data)
+        else:
+            result.data = apply_translations(data, {s: memory[(target, s)] for s in strings if (target, s) in memory})
+    return results
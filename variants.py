@@ -0,0 +1,172 @@
+"""Parallel generation of questionnaire variants with local scoring.
+
+N variants of the same generation prompt (different temperatures and/or
+providers) are requested concurrently, so the wall time is about that of the
+slowest single call. Each result is repaired and scored locally, with no
+further model calls except a fragment repair when the JSON is broken:
+
+- LOI fit of the local estimate against ``max_loi``;
+- routing validity (:func:`routing_validator.validate_routing`);
+- question-type mix (normalized entropy of the types used);
+- rule violations from ``SYSTEM_PROMPT`` (:func:`rule_violations`, which
+  includes the :mod:`linter` findings).
+"""
+
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from linter import lint_questionnaire
+from llm_client import TEMPERATURE, CallStats, call_llm, call_llm_with_stats
+from loi_estimator import estimate_loi
+from prompts import REPAIR_PROMPT, REPAIR_SYSTEM_PROMPT, SYSTEM_PROMPT
+from questionnaire_model import Questionnaire, QuestionType
+from routing_validator import validate_routing
+from schema_repair import parse_and_repair
+
+MAX_VARIANTS = 4
+VARIANT_TEMPERATURES = (TEMPERATURE, 0.7, 0.2, 0.9)
+SCORE_WEIGHTS = {"loi": 0.35, "routing": 0.25, "rules": 0.25, "mix": 0.15}
+LOI_FLOOR_SHARE = 0.6  # below this share of max_loi the draft is probably too thin
+MAX_OPEN_SHARE = 0.2
+
+_SCREENING_RE = re.compile(r"screen|qualifica|filtro|elegib", re.IGNORECASE)
+_SCALE_KINDS = (QuestionType.SCALE_NUMERIC, QuestionType.SCALE_LIKERT)
+
+
+@dataclass
+class VariantSpec:
+    label: str
+    provider: str
+    api_key: str
+    temperature: float = TEMPERATURE
+
+
+@dataclass
+class VariantScore:
+    total: float  # 0-100
+    loi: float  # each component 0-1
+    routing: float
+    mix: float
+    rules: float
+    loi_minutes: float = 0.0
+    routing_issues: int = 0
+    violations: list = field(default_factory=list)
+
+
+@dataclass
+class Variant:
+    spec: VariantSpec
+    data: dict = None
+    fixes: list = field(default_factory=list)
+    stats: CallStats = None
+    score: VariantScore = None
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.data is not None
+
+
+def rule_violations(model: Questionnaire) -> list:
+    """Structural checks for the ``SYSTEM_PROMPT`` rules plus the linter findings. Returns messages."""
+    found = []
+    sections = model.section_list()
+    if sections:
+        first = sections[0]
+        if not _SCREENING_RE.search(f"{first.title or ''} {first.description or ''}"):
+            found.append("A primeira seção não é de screening / qualificação.")
+    questions = model.questions()
+    for sec in sections:
+        kinds = {q.kind for q in sec.question_list() if q.kind in _SCALE_KINDS}
+        if len(kinds) > 1:
+            found.append(f"{sec.id}: escalas numéricas e Likert misturadas na mesma seção.")
+    opens = sum(q.kind is QuestionType.OPEN_TEXT for q in questions)
+    if questions and opens / len(questions) > MAX_OPEN_SHARE:
+        found.append(f"{opens} perguntas abertas em {len(questions)} ({opens / len(questions):.0%}).")
+    found.extend(f.message for f in lint_questionnaire(model))
+    return found
+
+
+def _loi_fit(minutes: float, max_loi) -> float:
+    if not max_loi:
+        return 1.0
+    floor = LOI_FLOOR_SHARE * max_loi
+    if minutes > max_loi:
+        return max(0.0, 1.0 - (minutes - max_loi) / max_loi)
+    if minutes < floor:
+        return minutes / floor
+    return 1.0
+
+
+def _type_mix(model: Questionnaire) -> float:
+    """Normalized entropy of the question types, in [0, 1]."""
+    counts = {}
+    for q in model.questions():
+        # Unknown types would be a bucket the normalizer does not count.
+        if q.kind is not None:
+            counts[q.kind] = counts.get(q.kind, 0) + 1
+    n = sum(counts.values())
+    if n == 0 or len(counts) == 1:
+        return 0.0
+    entropy = -sum(c / n * math.log(c / n) for c in counts.values())
+    return entropy / math.log(min(n, len(QuestionType)))
+
+
+def score_questionnaire(data, max_loi=None) -> VariantScore:
+    """Score a questionnaire (dict or model) locally; higher is better."""
+    model = data if isinstance(data, Questionnaire) else Questionnaire.from_dict(data)
+    minutes = estimate_loi(model, max_loi=max_loi).completes_minutes
+    issues = validate_routing(model)
+    violations = rule_violations(model)
+    parts = {
+        "loi": _loi_fit(minutes, max_loi),
+        "routing": 1.0 / (1 + len(issues)),
+        "mix": _type_mix(model),
+        "rules": 1.0 / (1 + len(violations)),
+    }
+    total = 100 * sum(SCORE_WEIGHTS[k] * v for k, v in parts.items())
+    return VariantScore(round(total, 1), loi_minutes=minutes, routing_issues=len(issues), violations=violations, **parts)
+
+
+def variant_specs(n: int, provider: str, api_key: str, alt_provider: str = None, alt_key: str = "") -> list:
+    """Spread ``n`` variants over the temperatures and, with a second key, alternate providers."""
+    specs = []
+    for i in range(max(1, min(n, MAX_VARIANTS))):
+        use_alt = bool(alt_provider and alt_key) and i % 2 == 1
+        specs.append(VariantSpec(
+            label=chr(ord("A") + i),
+            provider=alt_provider if use_alt else provider,
+            api_key=alt_key if use_alt else api_key,
+            temperature=VARIANT_TEMPERATURES[i % len(VARIANT_TEMPERATURES)],
+        ))
+    return specs
+
+
+def run_variant(spec: VariantSpec, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "",
+                max_loi=None, cache_scope: str = None) -> Variant:
+    """Generate, repair and score one variant. Errors are kept on the variant, not raised."""
+    variant = Variant(spec)
+
+    def fix_fragment(fragment):
+        return call_llm(spec.provider, spec.api_key, REPAIR_PROMPT.format(fragment=fragment, error="JSON inválido"),
+                        system_prompt=REPAIR_SYSTEM_PROMPT)
+
+    try:
+        text, variant.stats = call_llm_with_stats(spec.provider, spec.api_key, prompt, system_prompt, prefix,
+                                                  spec.temperature, cache_scope=cache_scope)
+        variant.data, variant.fixes = parse_and_repair(text, fix_fragment)
+        variant.score = score_questionnaire(variant.data, max_loi)
+    except Exception as e:
+        variant.data = None
+        variant.error = str(e)
+    return variant
+
+
+def generate_variants(specs: list, prompt: str, system_prompt: str = SYSTEM_PROMPT, prefix: str = "",
+                      max_loi=None, cache_scope: str = None) -> list:
+    """Run every spec concurrently. Returns the variants, best score first (failures last)."""
+    with ThreadPoolExecutor(max_workers=len(specs), thread_name_prefix="qd-variant") as pool:
+        variants = list(pool.map(lambda spec: run_variant(spec, prompt, system_prompt, prefix, max_loi, cache_scope), specs))
+    return sorted(variants, key=lambda v: -v.score.total if v.ok else float("inf"))
@@ -0,0 +1,305 @@
+"""Versioned questionnaire history with structural sharing.
+
+Every committed version is stored as an immutable, hash-consed tree: equal
+subtrees across versions are the same object, so a refinement that touches
+three questions only adds the nodes on the paths to those questions. Undo and
+redo move a cursor; diffs skip shared subtrees by identity. Memory is bounded
+by ``max_versions`` and, optionally, ``max_nodes`` (oldest versions go first).
+Nodes are reference-counted (by parent nodes and version roots), so evicting
+a version only frees the nodes no other version shares, in time proportional
+to what it frees rather than to the whole history.
+"""
+
+import time
+from dataclasses import dataclass
+
+
+class _Frozen:
+    """Immutable dict (``kind == "d"``) or list (``kind == "l"``) node."""
+
+    __slots__ = ("kind", "items", "key", "refs")
+
+    def __init__(self, kind: str, items: tuple, key: tuple):
+        self.kind = kind
+        self.items = items  # dict: ((key, child), ...); list: (child, ...)
+        self.key = key  # hash-consing key in the pool
+        self.refs = 0  # parent nodes + version roots pointing here
+
+    def children(self):
+        return (c for _, c in self.items) if self.kind == "d" else iter(self.items)
+
+
+def _child_key(child):
+    return ("#", id(child)) if isinstance(child, _Frozen) else (type(child).__name__, child)
+
+
+class _Pool:
+    """Hash-consing table: structurally equal subtrees map to one node."""
+
+    def __init__(self):
+        self.nodes = {}
+
+    def freeze(self, value):
+        if isinstance(value, dict):
+            return self.intern("d", tuple((k, self.freeze(v)) for k, v in value.items()))
+        if isinstance(value, list):
+            return self.intern("l", tuple(self.freeze(v) for v in value))
+        return value
+
+    def intern(self, kind: str, items: tuple):
+        """The pool's node for ``items`` (children already frozen), created if new."""
+        if kind == "d":
+            key = ("d", tuple((k, _child_key(c)) for k, c in items))
+        else:
+            key = ("l", tuple(_child_key(c) for c in items))
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = _Frozen(key[0], items, key)
+            for child in node.children():
+                if isinstance(child, _Frozen):
+                    child.refs += 1
+        return node
+
+    @staticmethod
+    def retain(node):
+        if isinstance(node, _Frozen):
+            node.refs += 1
+
+    def release(self, node):
+        """Drop one reference to ``node``; free it, and recursively its children, when unused."""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if not isinstance(node, _Frozen):
+                continue
+            node.refs -= 1
+            if node.refs == 0:
+                del self.nodes[node.key]
+                stack.extend(node.children())
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+def thaw(node):
+    """Convert a frozen tree back to plain dicts and lists."""
+    if not isinstance(node, _Frozen):
+        return node
+    if node.kind == "d":
+        return {k: thaw(v) for k, v in node.items}
+    return [thaw(v) for v in node.items]
+
+
+@dataclass
+class Version:
+    id: int
+    label: str
+    created_at: float
+    root: object
+
+
+@dataclass
+class Change:
+    path: str
+    kind: str  # "added" | "removed" | "changed"
+    old: object = None
+    new: object = None
+
+
+def _id_aligned(items: tuple):
+    """Map ``id`` -> child when every element of a list is a dict with a unique id."""
+    keyed = {}
+    for child in items:
+        if not isinstance(child, _Frozen) or child.kind != "d":
+            return None
+        ident = next((v for k, v in child.items if k == "id"), None)
+        if ident is None or isinstance(ident, _Frozen) or ident in keyed:
+            return None
+        keyed[ident] = child
+    return keyed
+
+
+def diff_trees(old, new, path: str = "") -> list:
+    """List the changes between two frozen trees, skipping shared subtrees."""
+    if old is new:
+        return []
+    if isinstance(old, _Frozen) and isinstance(new, _Frozen) and old.kind == new.kind:
+        changes = []
+        if old.kind == "d":
+            old_items, new_items = dict(old.items), dict(new.items)
+            for key, value in old_items.items():
+                sub = f"{path}.{key}" if path else str(key)
+                if key not in new_items:
+                    changes.append(Change(sub, "removed", old=thaw(value)))
+                else:
+                    changes.extend(diff_trees(value, new_items[key], sub))
+            for key, value in new_items.items():
+                if key not in old_items:
+                    changes.append(Change(f"{path}.{key}" if path else str(key), "added", new=thaw(value)))
+            return changes
+        old_ids, new_ids = _id_aligned(old.items), _id_aligned(new.items)
+        if old_ids is not None and new_ids is not None:
+            for ident, value in old_ids.items():
+                sub = f"{path}[{ident}]"
+                if ident not in new_ids:
+                    changes.append(Change(sub, "removed", old=thaw(value)))
+                else:
+                    changes.extend(diff_trees(value, new_ids[ident], sub))
+            for ident, value in new_ids.items():
+                if ident not in old_ids:
+                    changes.append(Change(f"{path}[{ident}]", "added", new=thaw(value)))
+            return changes
+        for i in range(max(len(old.items), len(new.items))):
+            sub = f"{path}[{i}]"
+            if i >= len(new.items):
+                changes.append(Change(sub, "removed", old=thaw(old.items[i])))
+            elif i >= len(old.items):
+                changes.append(Change(sub, "added", new=thaw(new.items[i])))
+            else:
+                changes.extend(diff_trees(old.items[i], new.items[i], sub))
+        return changes
+    if not isinstance(old, _Frozen) and not isinstance(new, _Frozen) and type(old) is type(new) and old == new:
+        return []
+    return [Change(path, "changed", old=thaw(old), new=thaw(new))]
+
+
+class VersionHistory:
+    """Linear undo/redo history of questionnaire versions."""
+
+    def __init__(self, max_versions: int = 50, max_nodes: int = None):
+        self.max_versions = max_versions
+        self.max_nodes = max_nodes
+        self._pool = _Pool()
+        self._versions = []
+        self._cursor = -1
+        self._next_id = 1
+
+    def commit(self, data: dict, label: str = "") -> int:
+        """Store ``data`` as the newest version (dropping any redo branch). Returns its id."""
+        root = self._pool.freeze(data)
+        if self._versions and self._versions[self._cursor].root is root:
+            return self._versions[self._cursor].id
+        for dropped in self._versions[self._cursor + 1 :]:
+            self._pool.release(dropped.root)
+        del self._versions[self._cursor + 1 :]
+        self._pool.retain(root)
+        self._versions.append(Version(self._next_id, label, time.time(), root))
+        self._next_id += 1
+        self._cursor = len(self._versions) - 1
+        self._enforce_cap()
+        return self._versions[self._cursor].id
+
+    def _enforce_cap(self):
+        while len(self._versions) > max(1, self.max_versions):
+            self._drop_oldest()
+        if self.max_nodes is not None:
+            while len(self._versions) > 1 and len(self._pool) > self.max_nodes:
+                self._drop_oldest()
+
+    def _drop_oldest(self):
+        """Evict the oldest version, freeing the nodes only it used."""
+        self._pool.release(self._versions.pop(0).root)
+        self._cursor = max(0, self._cursor - 1)
+
+    def to_state(self) -> dict:
+        """JSON / msgpack-friendly snapshot: each shared node once, versions pointing into that table.
+
+        A child that is a node is written as ``[index]``; frozen trees never
+        hold plain lists, so anything else is a scalar.
+        """
+        index, nodes = {}, []
+
+        def ref(value):
+            if not isinstance(value, _Frozen):
+                return value
+            pos = index.get(id(value))
+            if pos is None:
+                if value.kind == "d":
+                    items = [[k, ref(c)] for k, c in value.items]
+                else:
+                    items = [ref(c) for c in value.items]
+                pos = index[id(value)] = len(nodes)
+                nodes.append([value.kind, items])
+            return [pos]
+
+        return {
+            "nodes": nodes,
+            "versions": [[v.id, v.label, v.created_at, ref(v.root)] for v in self._versions],
+            "cursor": self._cursor,
+            "next_id": self._next_id,
+            "max_versions": self.max_versions,
+            "max_nodes": self.max_nodes,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "VersionHistory":
+        """Rebuild a history written by :meth:`to_state`."""
+        history = cls(state.get("max_versions", 50), state.get("max_nodes"))
+        built = []
+
+        def child(value):
+            return built[value[0]] if isinstance(value, list) else value
+
+        for kind, items in state["nodes"]:  # children always come before their parents
+            if kind == "d":
+                built.append(history._pool.intern("d", tuple((k, child(c)) for k, c in items)))
+            else:
+                built.append(history._pool.intern("l", tuple(child(c) for c in items)))
+        for version_id, label, created_at, root in state["versions"]:
+            root = child(root)
+            history._pool.retain(root)
+            history._versions.append(Version(version_id, label, created_at, root))
+        history._cursor = state.get("cursor", len(history._versions) - 1)
+        history._next_id = state.get("next_id", 1)
+        return history
+
+    def _get(self, version_id: int) -> Version:
+        for version in self._versions:
+            if version.id == version_id:
+                return version
+        raise KeyError(version_id)
+
+    @property
+    def current_id(self):
+        return self._versions[self._cursor].id if self._versions else None
+
+    def current(self):
+        return thaw(self._versions[self._cursor].root) if self._versions else None
+
+    def can_undo(self) -> bool:
+        return self._cursor > 0
+
+    def can_redo(self) -> bool:
+        return 0 <= self._cursor < len(self._versions) - 1
+
+    def undo(self):
+        if self.can_undo():
+            self._cursor -= 1
+        return self.current()
+
+    def redo(self):
+        if self.can_redo():
+            self._cursor += 1
+        return self.current()
+
+    def checkout(self, version_id: int):
+        """Move the cursor to ``version_id`` and return its data."""
+        self._cursor = self._versions.index(self._get(version_id))
+        return self.current()
+
+    def get(self, version_id: int) -> dict:
+        return thaw(self._get(version_id).root)
+
+    def versions(self) -> list:
+        return list(self._versions)
+
+    def diff(self, old_id: int, new_id: int) -> list:
+        return diff_trees(self._get(old_id).root, self._get(new_id).root)
+
+    @property
+    def node_count(self) -> int:
+        """Distinct stored nodes across all versions (the memory footprint)."""
+        return len(self._pool)
+
+    def __len__(self) -> int:
+        return len(self._versions)